@@ -0,0 +1,263 @@
+"""Versioned JSON API under /api/v1
+
+Responses are built from column-only queries (no ORM objects, no
+relationship loading) and plain dicts, never Jinja. Every resource takes
+?fields=a,b,c to return only those columns (id is always included).
+Listings are keyset paged like the HTML pages: pass the "next" value of
+one page as ?after= to get the one after it, and ?limit= to size them.
+
+    {"data": [...], "next": 123}    listings, next is null on the last page
+    {"data": {...}}                 single resources
+    {"error": "..."}                errors
+"""
+
+from flask import Blueprint, current_app, g, jsonify, request
+from werkzeug.exceptions import HTTPException, NotFound
+
+from models import db, User, Garden, Plant, Follows, User_plant, Garden_plant, Saved_gardens
+from pagination import paginate
+import timeline
+
+api = Blueprint('api', __name__, url_prefix='/api/v1')
+
+MAX_LIMIT = 200
+
+PLANT_FIELDS = {
+    'id': Plant.id,
+    'name': Plant.name,
+    'binomial_name': Plant.binomial_name,
+    'image': Plant.image,
+    'description': Plant.description,
+    'sun_requirements': Plant.sun_requirements,
+    'growing_method': Plant.growing_method,
+}
+
+GARDEN_FIELDS = {
+    'id': Garden.id,
+    'user_id': Garden.user_id,
+    'username': Garden.username,
+    'name': Garden.name,
+    'description': Garden.description,
+    'cover_image': Garden.cover_image,
+}
+
+# never email or password
+USER_FIELDS = {
+    'id': User.id,
+    'username': User.username,
+    'location': User.location,
+    'image_url': User.image_url,
+}
+
+# what a garden's plant list shows for each plant
+GARDEN_PLANT_FIELDS = ('id', 'name', 'image')
+
+
+class ApiError(Exception):
+    """a client error reported as {"error": message}"""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+
+@api.errorhandler(ApiError)
+def api_error(err):
+    return jsonify(error=err.message), err.status
+
+
+@api.errorhandler(HTTPException)
+def http_error(err):
+    return jsonify(error=err.description), err.code
+
+
+def selected_fields(fields):
+    """{name: column} for the ?fields= the client asked for, all of them by default"""
+
+    requested = request.args.get('fields')
+    if not requested:
+        return fields
+
+    names = ['id'] + [name.strip() for name in requested.split(',')
+                      if name.strip() and name.strip() != 'id']
+    unknown = [name for name in names if name not in fields]
+    if unknown:
+        raise ApiError(f"Unknown fields: {', '.join(unknown)}")
+
+    return {name: fields[name] for name in dict.fromkeys(names)}
+
+
+def column_query(fields):
+    """a query for just these columns, labelled with their field names"""
+
+    return db.session.query(*[column.label(name) for name, column in fields.items()])
+
+
+def int_arg(name, default=None):
+    value = request.args.get(name)
+    if value is None:
+        return default
+
+    try:
+        return int(value)
+    except ValueError:
+        raise ApiError(f"{name} must be an integer")
+
+
+def limit_arg():
+    limit = int_arg('limit', current_app.config['PAGE_SIZE'])
+    if not 1 <= limit <= MAX_LIMIT:
+        raise ApiError(f"limit must be between 1 and {MAX_LIMIT}")
+
+    return limit
+
+
+def page_json(page):
+    return jsonify(data=[dict(row._mapping) for row in page], next=page.next_cursor)
+
+
+def page_of(query, column):
+    """one keyset page of query as {"data", "next"}"""
+
+    return page_json(paginate(query, column, after=int_arg('after'), per_page=limit_arg()))
+
+
+def one_of(query):
+    row = query.first()
+    if row is None:
+        raise NotFound()
+
+    return dict(row._mapping)
+
+
+def require_user(user_id):
+    if not db.session.query(db.exists().where(User.id == user_id)).scalar():
+        raise NotFound()
+
+
+def require_login():
+    if not g.user:
+        raise ApiError("Login required", 401)
+
+
+# plants
+
+@api.route('/plants')
+def list_plants():
+    return page_of(column_query(selected_fields(PLANT_FIELDS)), Plant.id)
+
+
+@api.route('/plants/<int:plant_id>')
+def get_plant(plant_id):
+    query = column_query(selected_fields(PLANT_FIELDS)).filter(Plant.id == plant_id)
+
+    return jsonify(data=one_of(query))
+
+
+# gardens
+
+@api.route('/gardens')
+def list_gardens():
+    return page_of(column_query(selected_fields(GARDEN_FIELDS)), Garden.id)
+
+
+@api.route('/gardens/<int:garden_id>')
+def get_garden(garden_id):
+    """a garden and, unless ?fields= leaves it out, the id, name and image of its plants"""
+
+    fields = selected_fields(dict(GARDEN_FIELDS, plants=None))
+    with_plants = 'plants' in fields
+    fields.pop('plants', None)
+
+    garden = one_of(column_query(fields).filter(Garden.id == garden_id))
+
+    if with_plants:
+        plants = (column_query({name: PLANT_FIELDS[name] for name in GARDEN_PLANT_FIELDS})
+                  .join(Garden_plant, Garden_plant.plant_id == Plant.id)
+                  .filter(Garden_plant.garden_id == garden_id)
+                  .order_by(Garden_plant.id))
+        garden['plants'] = [dict(row._mapping) for row in plants]
+
+    return jsonify(data=garden)
+
+
+# users and follows
+
+@api.route('/users/<int:user_id>')
+def get_user(user_id):
+    query = column_query(selected_fields(USER_FIELDS)).filter(User.id == user_id)
+
+    return jsonify(data=one_of(query))
+
+
+@api.route('/users/<int:user_id>/gardens')
+def list_user_gardens(user_id):
+    """gardens this user made"""
+
+    require_user(user_id)
+    query = column_query(selected_fields(GARDEN_FIELDS)).filter(Garden.user_id == user_id)
+
+    return page_of(query, Garden.id)
+
+
+@api.route('/users/<int:user_id>/following')
+def list_following(user_id):
+    """users this user follows"""
+
+    require_user(user_id)
+    query = (column_query(selected_fields(USER_FIELDS))
+             .join(Follows, Follows.user_following == User.id)
+             .filter(Follows.user_followed == user_id))
+
+    return page_of(query, User.id)
+
+
+@api.route('/users/<int:user_id>/followers')
+def list_followers(user_id):
+    """users following this user"""
+
+    require_user(user_id)
+    query = (column_query(selected_fields(USER_FIELDS))
+             .join(Follows, Follows.user_followed == User.id)
+             .filter(Follows.user_following == user_id))
+
+    return page_of(query, User.id)
+
+
+# the logged in user's saved items
+
+@api.route('/me')
+def get_me():
+    require_login()
+
+    return get_user(g.user.id)
+
+
+@api.route('/me/plants')
+def list_saved_plants():
+    require_login()
+    query = (column_query(selected_fields(PLANT_FIELDS))
+             .join(User_plant, User_plant.plant_id == Plant.id)
+             .filter(User_plant.user_id == g.user.id))
+
+    return page_of(query, Plant.id)
+
+
+@api.route('/me/saved-gardens')
+def list_saved_gardens():
+    require_login()
+    query = (column_query(selected_fields(GARDEN_FIELDS))
+             .join(Saved_gardens, Saved_gardens.garden_id == Garden.id)
+             .filter(Saved_gardens.user_saved == g.user.id))
+
+    return page_of(query, Garden.id)
+
+
+@api.route('/me/feed')
+def list_feed():
+    """activity of the users the logged in user follows, newest first"""
+
+    require_login()
+
+    return page_json(timeline.feed_page(g.user.id, after=int_arg('after'), per_page=limit_arg()))
@@ -0,0 +1,52 @@
+"""Template time for a page of plant cards, cold and warm fragment cache
+
+run like: python benchmarks/bench_cards.py --cards 100
+
+Renders plants/search-plants.html with unsaved Plant objects, so no
+database is needed, first with an empty fragment cache and then again
+with every card cached.
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import g, render_template
+
+from app import app
+from fragments import fragment_cache
+from models import Plant
+
+
+def render_ms(plants, repeat):
+    with app.test_request_context('/plants/search/bench'):
+        g.user = None
+        start = time.perf_counter()
+        for _ in range(repeat):
+            render_template('plants/search-plants.html', plants=plants)
+        return 1000 * (time.perf_counter() - start) / repeat
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--cards', type=int, default=100)
+    parser.add_argument('--repeat', type=int, default=50, help='renders per measurement')
+    args = parser.parse_args(argv)
+
+    plants = [Plant(id=n, version=1, name=f'Plant {n}', image=f'/static/plant-{n}.jpg')
+              for n in range(args.cards)]
+
+    cold = 0
+    for _ in range(args.repeat):
+        fragment_cache.clear()
+        cold += render_ms(plants, 1)
+    warm = render_ms(plants, args.repeat)
+
+    print(f'{args.cards} cards: {cold / args.repeat:.2f}ms cold, {warm:.2f}ms warm')
+
+
+if __name__ == '__main__':
+    main()
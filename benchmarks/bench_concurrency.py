@@ -0,0 +1,167 @@
+"""Upstream calls a single gunicorn worker keeps in flight, per worker class
+
+run like:
+    python benchmarks/bench_concurrency.py
+    python benchmarks/bench_concurrency.py --worker-classes gevent --routes weather --requests 500
+
+For each worker class a one-worker gunicorn (gunicorn.conf.py, prod
+profile) is started against a mock_upstream.MockUpstream, and --requests
+logged in clients at once each ask for something nobody asked for
+before, so every request waits on an upstream call:
+
+    search   /plants/search/<new search>       OpenFarm crop search
+    details  /plants/<new plant>               OpenFarm lookup, then stored
+    weather  /weather, every user somewhere new  weatherapi forecast
+
+Reports the wall time, requests per second and the most upstream calls
+the mock was answering at once.
+
+--database only needs the tables, they are created if missing.
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from mock_upstream import MockUpstream, NEW_CROP_PREFIX
+
+BENCH_SECRET_KEY = 'bench-concurrency'
+
+# name: path, {run} and {n} make it new for every request
+ROUTES = {
+    'search': '/plants/search/bench-{run}-{n}',
+    'details': '/plants/' + NEW_CROP_PREFIX + '{run}-{n}',
+    'weather': '/weather',
+}
+
+
+def build_app(database):
+    from config import ProductionConfig
+    from app import create_app
+    from models import db
+
+    class Bench(ProductionConfig):
+        SQLALCHEMY_DATABASE_URI = database
+        SECRET_KEY = BENCH_SECRET_KEY
+        PRECOMPILE_TEMPLATES = False
+
+    app = create_app(Bench)
+    with app.app_context():
+        db.create_all()
+
+    return app
+
+
+def seed_users(app, run, count):
+    """count users, each in a location of their own. returns their session cookies"""
+
+    from models import db, User
+
+    with app.app_context():
+        users = [User(username=f'bench-{run}-{n}', email=f'bench-{run}-{n}@example.com',
+                      password='-', location=f'bench-{run}-{n}')
+                 for n in range(count)]
+        db.session.add_all(users)
+        db.session.commit()
+
+        # signed like a login would, without paying for bcrypt
+        serializer = app.session_interface.get_signing_serializer(app)
+        return [serializer.dumps({'current_user': user.id}) for user in users]
+
+
+def start_gunicorn(worker_class, port, database, upstream, clients):
+    env = dict(os.environ,
+               WORKER_CLASS=worker_class,
+               WEB_CONCURRENCY='1',
+               PORT=str(port),
+               DATABASE_URL=database,
+               SECRET_KEY=BENCH_SECRET_KEY,
+               OPENFARM_URL=upstream.openfarm_url,
+               WEATHER_URL=upstream.weather_url,
+               # one keep-alive connection per call in flight
+               HTTP_POOL_SIZE=str(clients),
+               TEMPLATE_CACHE_DIR=tempfile.mkdtemp(),
+               PROMETHEUS_MULTIPROC_DIR=tempfile.mkdtemp())
+
+    server = subprocess.Popen([sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py',
+                               "app:create_app('prod')"],
+                              cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    base_url = f'http://127.0.0.1:{port}'
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            requests.get(f'{base_url}/metrics', timeout=1)
+            return server, base_url
+        except requests.ConnectionError:
+            time.sleep(0.2)
+
+    server.kill()
+    raise RuntimeError(f'gunicorn with {worker_class} workers did not start')
+
+
+def burst(base_url, path, cookies):
+    """a request per cookie at once, each for something new. returns (seconds, failures)"""
+
+    run = uuid.uuid4().hex[:8]
+
+    def fetch(n):
+        resp = requests.get(base_url + path.format(run=run, n=n), cookies={'session': cookies[n]},
+                            allow_redirects=False, timeout=600)
+        return resp.status_code
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=len(cookies)) as pool:
+        statuses = list(pool.map(fetch, range(len(cookies))))
+
+    return time.perf_counter() - start, sum(status != 200 for status in statuses)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--database', default='postgresql:///garden-bench')
+    parser.add_argument('--worker-classes', nargs='+', default=['sync', 'gevent'])
+    parser.add_argument('--routes', nargs='+', choices=list(ROUTES), default=list(ROUTES))
+    parser.add_argument('--requests', type=int, default=100, help='concurrent requests')
+    parser.add_argument('--upstream-latency-ms', type=float, default=1000)
+    parser.add_argument('--port', type=int, default=8765)
+    args = parser.parse_args(argv)
+
+    app = build_app(args.database)
+    upstream = MockUpstream(latency_ms=args.upstream_latency_ms).start()
+
+    print(f'{args.requests} concurrent requests, upstream answering in {args.upstream_latency_ms:.0f}ms')
+    print(f'{"worker":<8} {"route":<8} {"seconds":>8} {"req/s":>8} {"failed":>6} '
+          f'{"peak upstream in flight":>24}')
+    try:
+        for worker_class in args.worker_classes:
+            server, base_url = start_gunicorn(worker_class, args.port, args.database,
+                                              upstream, args.requests)
+            try:
+                for route in args.routes:
+                    # new users for every burst, so their forecasts aren't cached yet
+                    cookies = seed_users(app, uuid.uuid4().hex[:8], args.requests)
+                    upstream.peak_in_flight = 0
+                    seconds, failed = burst(base_url, ROUTES[route], cookies)
+
+                    print(f'{worker_class:<8} {route:<8} {seconds:>8.2f} '
+                          f'{args.requests / seconds:>8.1f} {failed:>6} {upstream.peak_in_flight:>24}')
+            finally:
+                server.terminate()
+                server.wait()
+    finally:
+        upstream.stop()
+
+
+if __name__ == '__main__':
+    main()
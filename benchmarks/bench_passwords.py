@@ -0,0 +1,55 @@
+"""Logins per second for each bcrypt work factor
+
+run like: python benchmarks/bench_passwords.py --rounds 10 11 12 13 --workers 2
+
+Each login is one verify on the PasswordHasher pool, the same path
+User.authenticate takes. Use it to pick BCRYPT_LOG_ROUNDS and
+PASSWORD_HASH_WORKERS for the hardware the app runs on.
+"""
+
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from passwords import PasswordHasher
+
+
+def logins_per_second(rounds, workers, clients, duration):
+    hasher = PasswordHasher(workers=workers, max_pending=clients, rounds=rounds)
+    hashed = hasher.hash('password', rounds)
+
+    def client():
+        count = 0
+        deadline = time.perf_counter() + duration
+        while time.perf_counter() < deadline:
+            hasher.verify(hashed, 'password')
+            count += 1
+        return count
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as pool:
+        logins = sum(pool.map(lambda _: client(), range(clients)))
+
+    return logins / (time.perf_counter() - start)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rounds', type=int, nargs='+', default=[10, 11, 12, 13])
+    parser.add_argument('--workers', type=int, default=2, help='hashing pool size')
+    parser.add_argument('--clients', type=int, default=8, help='concurrent login attempts')
+    parser.add_argument('--duration', type=float, default=3, help='seconds per cost setting')
+    args = parser.parse_args(argv)
+
+    print(f'{"rounds":>6}  {"logins/sec":>10}  {"ms/login":>8}')
+    for rounds in args.rounds:
+        rate = logins_per_second(rounds, args.workers, args.clients, args.duration)
+        print(f'{rounds:>6}  {rate:>10.1f}  {1000 * args.workers / rate:>8.1f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,308 @@
+"""Throughput and latency of the hot routes, against stand-in upstream APIs
+
+run like:
+    python benchmarks/load_test.py
+    python benchmarks/load_test.py --routes home garden --concurrency 16 --duration 20
+    python benchmarks/load_test.py --save-baseline
+    python benchmarks/load_test.py --compare        exits 1 on a regression
+
+The app runs in this process with the prod profile on its own database
+(dropped and re-seeded, so never point --database at real data). OpenFarm
+and weatherapi.com are replaced by mock_upstream.MockUpstream, which
+replays fixtures/ after --upstream-latency-ms. Each route is hammered by
+--concurrency logged in clients for --duration seconds.
+
+Routes marked (local) or (cached) are served from the database and the
+app's caches after their first request. The (upstream) ones ask for a
+plant nobody asked for before on every request (mock_upstream answers
+names starting with new-), so each one waits on an OpenFarm call.
+
+--save-baseline writes benchmarks/baselines.json, which is not checked
+in: numbers from another machine mean little. It records the machine and
+the run's settings next to the numbers, and --compare refuses to compare
+against a baseline taken with different ones, or when there is no
+baseline for a route it measured (exit 2).
+"""
+
+import argparse
+import itertools
+import json
+import logging
+import os
+import platform
+import sys
+import tempfile
+import threading
+import time
+
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mock_upstream import MockUpstream, FIXTURES
+
+BASELINES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baselines.json')
+PASSWORD = 'password'
+
+# name: (method, path) - {garden}/{user} are filled in after seeding,
+# {seq} with a new number for every request
+ROUTES = {
+    'home': ('GET', '/'),
+    'plant search (cached)': ('GET', '/plants/search/basil'),
+    'plant search (upstream)': ('GET', '/plants/search/new-search-{seq}'),
+    'plant details (local)': ('GET', '/plants/Tomato'),
+    'plant details (upstream)': ('GET', '/plants/new-plant-{seq}'),
+    'garden': ('GET', '/gardens/{garden}'),
+    'profile': ('GET', '/users/{user}'),
+    'weather': ('GET', '/weather'),
+    'login': ('POST', '/login'),
+}
+
+
+def build_app(args, upstream):
+    from config import ProductionConfig
+    from app import create_app
+
+    class Bench(ProductionConfig):
+        SQLALCHEMY_DATABASE_URI = args.database
+        TEMPLATE_CACHE_DIR = tempfile.mkdtemp()
+        WTF_CSRF_ENABLED = False
+        BCRYPT_LOG_ROUNDS = args.bcrypt_rounds
+        OPENFARM_URL = upstream.openfarm_url
+        WEATHER_URL = upstream.weather_url
+
+    return create_app(Bench)
+
+
+def seed(app, users, migrations=True):
+    """plants from the fixture, users with a garden of every plant, everyone following user 1"""
+
+    from import_plants import import_crops, load_fixture
+    from migrate import run_migrations
+    from models import db, User, Plant, Garden, Garden_plant, Follows
+
+    with app.app_context():
+        db.drop_all()
+        db.engine.execute("DROP TABLE IF EXISTS schema_migrations")
+        db.create_all()
+        if migrations:
+            run_migrations(db.engine)
+
+        import_crops(load_fixture(os.path.join(FIXTURES, 'openfarm_crops.json')))
+
+        accounts = [User.signup(f'bench-user-{n}', f'bench{n}@example.com', PASSWORD, None, 'Baltimore')
+                    for n in range(users)]
+        db.session.commit()
+
+        plant_ids = [plant_id for plant_id, in db.session.query(Plant.id)]
+        for user in accounts:
+            garden = Garden(user_id=user.id, username=user.username, name='bench garden')
+            db.session.add(garden)
+            db.session.flush()
+            db.session.add_all([Garden_plant(garden_id=garden.id, plant_id=plant_id)
+                                for plant_id in plant_ids])
+            if user is not accounts[0]:
+                db.session.add(Follows(user_followed=user.id, user_following=accounts[0].id))
+        db.session.commit()
+
+        return {'user': accounts[0].id,
+                'garden': db.session.query(Garden.id).order_by(Garden.id).first()[0],
+                'usernames': [user.username for user in accounts]}
+
+
+def serve(app):
+    """run app on a threaded local server, returns (base url, server)"""
+
+    from werkzeug.serving import make_server
+
+    # one log line per request would measure the terminal
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f'http://127.0.0.1:{server.server_port}', server
+
+
+def login(base_url, username):
+    session = requests.Session()
+    resp = session.post(f'{base_url}/login', data={'username': username, 'password': PASSWORD},
+                        allow_redirects=False)
+    if resp.status_code != 302:
+        raise RuntimeError(f'could not log in {username}: {resp.status_code}')
+    return session
+
+
+def percentile(ordered, pct):
+    """nearest-rank percentile of an already sorted list"""
+
+    if not ordered:
+        return 0.0
+    rank = max(0, min(len(ordered) - 1, round(pct / 100 * len(ordered)) - 1))
+    return ordered[rank]
+
+
+def run_route(base_url, method, path, usernames, concurrency, duration):
+    """hammer one route, returns its stats. clients log in before the clock starts"""
+
+    latencies = []
+    errors = []
+    lock = threading.Lock()
+    ready = threading.Barrier(concurrency + 1)
+    done = {}
+    seq = itertools.count()
+
+    def client(n):
+        username = usernames[n % len(usernames)]
+        session = login(base_url, username) if method == 'GET' else requests.Session()
+        data = {'username': username, 'password': PASSWORD} if method == 'POST' else None
+        mine, failed = [], 0
+
+        ready.wait()
+        while time.perf_counter() < done['deadline']:
+            start = time.perf_counter()
+            with lock:
+                url = base_url + path.format(seq=next(seq))
+            resp = session.request(method, url, data=data, allow_redirects=False)
+            mine.append(time.perf_counter() - start)
+            if resp.status_code >= 400:
+                failed += 1
+
+        with lock:
+            latencies.extend(mine)
+            errors.append(failed)
+
+    threads = [threading.Thread(target=client, args=(n,)) for n in range(concurrency)]
+    for thread in threads:
+        thread.start()
+
+    done['deadline'] = time.perf_counter() + duration + 60
+    ready.wait()
+    started = time.perf_counter()
+    done['deadline'] = started + duration
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        'requests': len(latencies),
+        'errors': sum(errors),
+        'rps': round(len(latencies) / elapsed, 1),
+        'p50_ms': round(1000 * percentile(latencies, 50), 2),
+        'p95_ms': round(1000 * percentile(latencies, 95), 2),
+        'p99_ms': round(1000 * percentile(latencies, 99), 2),
+    }
+
+
+def environment(args):
+    """what the numbers depend on besides the code: the machine and the run's settings"""
+
+    return {
+        'machine': platform.machine(),
+        'processor': platform.processor(),
+        'cpus': os.cpu_count(),
+        'platform': platform.platform(),
+        'python': platform.python_version(),
+        'concurrency': args.concurrency,
+        'duration': args.duration,
+        'users': args.users,
+        'migrations': not args.no_migrations,
+        'bcrypt_rounds': args.bcrypt_rounds,
+        'upstream_latency_ms': args.upstream_latency_ms,
+        'upstream_jitter_ms': args.upstream_jitter_ms,
+    }
+
+
+def compare(results, baselines, tolerance):
+    """routes whose p95 grew or throughput fell by more than tolerance"""
+
+    regressions = []
+    for name, stats in results.items():
+        base = baselines[name]
+        if stats['p95_ms'] > base['p95_ms'] * (1 + tolerance):
+            regressions.append(f"{name}: p95 {stats['p95_ms']}ms vs baseline {base['p95_ms']}ms")
+        if stats['rps'] < base['rps'] * (1 - tolerance):
+            regressions.append(f"{name}: {stats['rps']} req/s vs baseline {base['rps']} req/s")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--database', default='postgresql:///garden-bench',
+                        help='dropped and re-seeded, never your real database')
+    parser.add_argument('--routes', nargs='+', choices=list(ROUTES), default=list(ROUTES))
+    parser.add_argument('--concurrency', type=int, default=8, help='clients per route')
+    parser.add_argument('--duration', type=float, default=10, help='seconds per route')
+    parser.add_argument('--users', type=int, default=8, help='users to seed')
+    parser.add_argument('--no-migrations', action='store_true',
+                        help='only create_all, for servers without pg_trgm')
+    parser.add_argument('--bcrypt-rounds', type=int, default=12, help='work factor for seeded passwords')
+    parser.add_argument('--upstream-latency-ms', type=float, default=150)
+    parser.add_argument('--upstream-jitter-ms', type=float, default=50)
+    parser.add_argument('--save-baseline', action='store_true', help=f'write results to {BASELINES}')
+    parser.add_argument('--compare', action='store_true', help='exit 1 if a route regressed')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='allowed change before --compare fails')
+    args = parser.parse_args(argv)
+
+    upstream = MockUpstream(latency_ms=args.upstream_latency_ms, jitter_ms=args.upstream_jitter_ms).start()
+    app = build_app(args, upstream)
+    ids = seed(app, args.users, migrations=not args.no_migrations)
+    base_url, server = serve(app)
+
+    results = {}
+    print(f'{"route":<24} {"requests":>8} {"errors":>6} {"req/s":>8} {"p50 ms":>8} {"p95 ms":>8} {"p99 ms":>8}')
+    try:
+        for name in args.routes:
+            method, path = ROUTES[name]
+            stats = run_route(base_url, method, path.format(seq='{seq}', **ids), ids['usernames'],
+                              args.concurrency, args.duration)
+            results[name] = stats
+            print(f'{name:<24} {stats["requests"]:>8} {stats["errors"]:>6} {stats["rps"]:>8} '
+                  f'{stats["p50_ms"]:>8} {stats["p95_ms"]:>8} {stats["p99_ms"]:>8}')
+    finally:
+        server.shutdown()
+        upstream.stop()
+
+    print(f'upstream calls: {upstream.requests}')
+
+    env = environment(args)
+    saved = None
+    if os.path.exists(BASELINES):
+        with open(BASELINES) as f:
+            saved = json.load(f)
+
+    if args.save_baseline:
+        if saved is None or saved.get('environment') != env:
+            # baselines from another machine or other settings are replaced, not mixed in
+            saved = {'environment': env, 'routes': {}}
+        saved['routes'].update(results)
+        with open(BASELINES, 'w') as f:
+            json.dump(saved, f, indent=2, sort_keys=True)
+            f.write('\n')
+        print(f'saved baselines to {BASELINES}')
+
+    if args.compare:
+        if saved is None:
+            print(f'no baselines in {BASELINES}, record them with --save-baseline')
+            sys.exit(2)
+
+        differs = sorted(key for key in env if saved.get('environment', {}).get(key) != env[key])
+        if differs:
+            print(f'baselines were recorded with different {", ".join(differs)}, '
+                  f're-record them with --save-baseline')
+            sys.exit(2)
+
+        missing = [name for name in results if name not in saved['routes']]
+        if missing:
+            print(f'no baseline for {", ".join(missing)}, record them with --save-baseline')
+            sys.exit(2)
+
+        regressions = compare(results, saved['routes'], args.tolerance)
+        for regression in regressions:
+            print(f'REGRESSION {regression}')
+        if regressions:
+            sys.exit(1)
+        print('no regressions')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,168 @@
+"""Local stand-in for the OpenFarm and weatherapi.com APIs
+
+run like: python benchmarks/mock_upstream.py --port 8001 --latency-ms 150
+
+then point the app at it:
+    OPENFARM_URL=http://localhost:8001/api/v1/crops/
+    WEATHER_URL=http://localhost:8001/v1/forecast.json
+
+Replays the recorded responses in fixtures/ after a configurable delay,
+so load tests see realistic upstream payloads and timing without the
+network. Crop searches for names starting with new- find a crop of that
+name, so a load test can keep asking for plants the app hasn't stored.
+load_test.py starts one of these itself.
+"""
+
+import argparse
+import json
+import os
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+
+FIXTURES = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'fixtures')
+
+# weatherapi's answer for a location it can't find
+UNKNOWN_LOCATION = {'error': {'code': 1006, 'message': 'No matching location found.'}}
+
+# filters starting with this always find a crop named exactly the filter,
+# standing in for crops the app hasn't stored yet
+NEW_CROP_PREFIX = 'new-'
+
+
+def load(name):
+    with open(os.path.join(FIXTURES, name)) as f:
+        return json.load(f)
+
+
+class Server(ThreadingHTTPServer):
+    daemon_threads = True
+    # hundreds of clients may connect at once
+    request_queue_size = 1024
+
+
+class MockUpstream:
+    """replays fixtures over HTTP on a background thread. tracks how many
+    requests it is answering at once, and the most it has seen"""
+
+    def __init__(self, port=0, latency_ms=0, jitter_ms=0):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.crops = load('openfarm_crops.json')['data']
+        self.forecast = load('weatherapi_forecast.json')
+        self.requests = 0
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self._lock = threading.Lock()
+
+        self.server = Server(('127.0.0.1', port), self.handler())
+        self._thread = None
+
+    @property
+    def url(self):
+        return f'http://127.0.0.1:{self.server.server_address[1]}'
+
+    @property
+    def openfarm_url(self):
+        return f'{self.url}/api/v1/crops/'
+
+    @property
+    def weather_url(self):
+        return f'{self.url}/v1/forecast.json'
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def delay(self):
+        delay = self.latency_ms + random.uniform(-self.jitter_ms, self.jitter_ms)
+        if delay > 0:
+            time.sleep(delay / 1000)
+
+    def crops_response(self, query):
+        """crops whose name contains the filter, or one page of the catalog"""
+
+        if 'filter' in query:
+            search = query['filter'][0].strip('<>').lower()
+            if search.startswith(NEW_CROP_PREFIX):
+                template = self.crops[0]['attributes']
+                return 200, {'data': [{'attributes': dict(template, name=search)}]}
+            return 200, {'data': [crop for crop in self.crops
+                                  if search in crop['attributes']['name'].lower()]}
+
+        page = int(query.get('page', ['1'])[0])
+        return 200, {'data': self.crops if page == 1 else []}
+
+    def forecast_response(self, query):
+        location = query.get('q', [''])[0]
+        if not location or location.lower() == 'nowhere':
+            return 400, UNKNOWN_LOCATION
+
+        forecast = dict(self.forecast, location=dict(self.forecast['location'], name=location.title()))
+        return 200, forecast
+
+    def handler(self):
+        upstream = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                with upstream._lock:
+                    upstream.requests += 1
+                    upstream.in_flight += 1
+                    upstream.peak_in_flight = max(upstream.peak_in_flight, upstream.in_flight)
+                try:
+                    self.respond()
+                finally:
+                    with upstream._lock:
+                        upstream.in_flight -= 1
+
+            def respond(self):
+                url = urlsplit(self.path)
+                query = parse_qs(url.query)
+
+                if url.path.startswith('/api/v1/crops'):
+                    status, body = upstream.crops_response(query)
+                elif url.path == '/v1/forecast.json':
+                    status, body = upstream.forecast_response(query)
+                else:
+                    status, body = 404, {'error': 'not found'}
+
+                upstream.delay()
+                data = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--port', type=int, default=8001)
+    parser.add_argument('--latency-ms', type=float, default=0, help='delay before every response')
+    parser.add_argument('--jitter-ms', type=float, default=0, help='random +/- added to the delay')
+    args = parser.parse_args(argv)
+
+    upstream = MockUpstream(args.port, args.latency_ms, args.jitter_ms)
+    print(f'OPENFARM_URL={upstream.openfarm_url}')
+    print(f'WEATHER_URL={upstream.weather_url}')
+    try:
+        upstream.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
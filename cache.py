@@ -0,0 +1,188 @@
+"""In-process caches shared by the app's upstream clients"""
+
+import threading
+import time
+from collections import OrderedDict
+
+
+class SingleFlight:
+    """Coalesces concurrent calls for the same key.
+
+    The first caller runs the function, callers arriving while it runs
+    wait for it and share its result or exception instead of repeating
+    the work. Nothing is kept once the call returns.
+    """
+
+    class _Call:
+        def __init__(self):
+            self.done = threading.Event()
+            self.value = None
+            self.error = None
+
+    def __init__(self):
+        self.shared = 0
+
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, fn):
+        """fn()'s result, from this call or from the one already running for key"""
+
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = self._Call()
+            else:
+                self.shared += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.value
+
+        try:
+            call.value = fn()
+            return call.value
+        except Exception as exc:
+            call.error = exc
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+
+class TTLCache:
+    """Bounded LRU cache whose entries expire after `ttl` seconds.
+
+    Expired entries are kept for another `stale_ttl` seconds. During that
+    window `get_or_load` returns the stale value immediately and refreshes
+    it once in a background thread, so callers never wait on the loader
+    for a key that was cached recently.
+    """
+
+    def __init__(self, maxsize=256, ttl=300, stale_ttl=0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+
+        self._data = OrderedDict()
+        self._refreshing = set()
+        self._loads = SingleFlight()
+        self._lock = threading.Lock()
+
+    def configure(self, maxsize=None, ttl=None, stale_ttl=None):
+        """Change size or lifetimes, e.g. from app config"""
+
+        with self._lock:
+            if maxsize is not None:
+                self.maxsize = maxsize
+            if ttl is not None:
+                self.ttl = ttl
+            if stale_ttl is not None:
+                self.stale_ttl = stale_ttl
+            self._evict()
+
+    def get(self, key, default=None):
+        """Return a fresh cached value for key, or default"""
+
+        with self._lock:
+            entry = self._data.get(key)
+            if entry and time.monotonic() < entry[1]:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+            return default
+
+    def set(self, key, value, ttl=None):
+        """Store value under key for ttl (or the default ttl) seconds"""
+
+        expires = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (value, expires)
+            self._data.move_to_end(key)
+            self._evict()
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def get_or_load(self, key, loader):
+        """Return the cached value for key, calling loader() on a miss.
+
+        Stale entries are returned as-is while loader() refreshes them in
+        the background. Concurrent misses for one key share a single
+        loader() call. Exceptions from loader() propagate on a miss and
+        are swallowed (keeping the stale value) during a refresh.
+        """
+
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry:
+                value, expires = entry
+                if now < expires:
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                if now < expires + self.stale_ttl:
+                    self._data.move_to_end(key)
+                    self.stale_hits += 1
+                    if key not in self._refreshing:
+                        self._refreshing.add(key)
+                        threading.Thread(target=self._refresh,
+                                         args=(key, loader),
+                                         daemon=True).start()
+                    return value
+            self.misses += 1
+
+        return self._loads.do(key, lambda: self._load(key, loader))
+
+    def stats(self):
+        """hit/miss counters and current size"""
+
+        with self._lock:
+            size = len(self._data)
+        lookups = self.hits + self.stale_hits + self.misses
+        return {
+            'hits': self.hits,
+            'stale_hits': self.stale_hits,
+            'misses': self.misses,
+            'hit_ratio': (self.hits + self.stale_hits) / lookups if lookups else 0.0,
+            'size': size,
+            'maxsize': self.maxsize,
+        }
+
+    def __len__(self):
+        return len(self._data)
+
+    def _load(self, key, loader):
+        value = loader()
+        self.set(key, value)
+        return value
+
+    def _refresh(self, key, loader):
+        try:
+            self.set(key, loader())
+        except Exception:
+            # keep serving the stale value until it ages out
+            pass
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
+
+    def _evict(self):
+        # caller holds the lock
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
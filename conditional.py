@@ -0,0 +1,130 @@
+"""Conditional GET for the garden, plant and profile pages
+
+A page's ETag is a hash of the version counters of the rows it shows
+(see models.bump_version) and of the viewer, whose saved items and
+gardens decide which buttons render. All of them come back from one
+query of primary key and index lookups, so a browser revalidating an
+unchanged page gets a 304 without the page's own queries or template.
+"""
+
+import hashlib
+import time
+
+from flask import current_app, g, request, session
+
+from models import db, User, Plant, Garden, Garden_plant, User_plant, Saved_gardens
+
+
+def init_app(app):
+    """Tag responses for the pages that asked to be tagged"""
+
+    app.config.setdefault('ETAG_SALT', '')
+    app.after_request(tag_response)
+
+
+def row_version(model, column, value):
+    return db.select(model.version).where(column == value).scalar_subquery()
+
+
+def total_version(model, join, *criteria):
+    """'count:sum' of the versions of model rows reached through join.
+    versions only go up, so any bump, added or removed row changes it;
+    the newest version alone misses bumps to the older rows"""
+
+    query = (db.select(db.func.concat(db.func.count(), ':', db.func.sum(model.version)))
+             .select_from(model))
+    if join:
+        query = query.join(*join)
+    return query.where(*criteria).scalar_subquery()
+
+
+def viewer_version():
+    viewer_id = g.user.id if g.user else None
+    return viewer_id, row_version(User, User.id, viewer_id)
+
+
+def garden_versions(garden_id):
+    """what garden_details shows, None if there is no such garden"""
+
+    viewer_id, viewer = viewer_version()
+    garden, plants, viewer = db.session.query(
+        row_version(Garden, Garden.id, garden_id),
+        total_version(Plant, (Garden_plant, Garden_plant.plant_id == Plant.id),
+                      Garden_plant.garden_id == garden_id),
+        viewer).one()
+
+    if garden is None:
+        return None
+
+    # similar gardens are cached this long (see similar.py)
+    similar = int(time.time()) // current_app.config['SIMILAR_CACHE_TTL']
+
+    return ('garden', garden_id, garden, plants, viewer_id, viewer, similar)
+
+
+def plant_versions(plant_name):
+    """what plant_details shows, None if the plant isn't saved locally yet"""
+
+    viewer_id, viewer = viewer_version()
+    plant, viewer = db.session.query(row_version(Plant, Plant.name, plant_name), viewer).one()
+
+    if plant is None:
+        return None
+
+    # the add-to-garden form carries a CSRF token, re-render before it can expire
+    limit = current_app.config.get('WTF_CSRF_TIME_LIMIT', 3600)
+    window = int(time.time()) // limit if limit else None
+    # and the suggestions are only cached this long (see recommend.py)
+    suggestions = int(time.time()) // current_app.config['SUGGESTION_CACHE_TTL']
+
+    return ('plant', plant_name, plant, viewer_id, viewer, window, suggestions)
+
+
+def profile_versions(user_id):
+    """what user_profile shows, None if there is no such user"""
+
+    viewer_id, viewer = viewer_version()
+    user, gardens, inspirations, plants, viewer = db.session.query(
+        row_version(User, User.id, user_id),
+        total_version(Garden, (), Garden.user_id == user_id),
+        total_version(Garden, (Saved_gardens, Saved_gardens.garden_id == Garden.id),
+                      Saved_gardens.user_saved == user_id),
+        total_version(Plant, (User_plant, User_plant.plant_id == Plant.id),
+                      User_plant.user_id == user_id),
+        viewer).one()
+
+    if user is None:
+        return None
+    return ('profile', user_id, user, gardens, inspirations, plants, viewer_id, viewer)
+
+
+def etag(versions):
+    salt = current_app.config['ETAG_SALT']
+    return hashlib.sha1(repr((salt, versions)).encode()).hexdigest()
+
+
+def not_modified(versions):
+    """a 304 if the browser already has the page for these versions, otherwise
+    None and the rendered page gets tagged with them"""
+
+    # flashed messages aren't part of the tag, a page showing one must render
+    if versions is None or session.get('_flashes'):
+        return None
+
+    g.etag = etag(versions)
+    if request.if_none_match.contains(g.etag):
+        return current_app.response_class(status=304)
+
+    return None
+
+
+def tag_response(response):
+    tag = g.get('etag')
+
+    if tag and response.status_code in (200, 304):
+        response.set_etag(tag)
+        # the page depends on who's looking: browsers may keep it but must revalidate
+        response.cache_control.private = True
+        response.cache_control.no_cache = True
+
+    return response
@@ -0,0 +1,121 @@
+"""Settings for each way the app runs
+
+create_app() takes one of these profiles by name, or APP_CONFIG picks it:
+
+    dev   (default) local development, with the debug toolbar
+    test  the garden-test database, CSRF off, nothing precompiled
+    prod  Heroku: no toolbar, templates precompiled at boot
+"""
+
+import os
+import tempfile
+
+import openfarm
+import weather
+
+
+def database_url(default):
+    # Heroku still hands out postgres:// urls, SQLAlchemy 1.4 wants postgresql://
+    url = os.environ.get('DATABASE_URL')
+    return url.replace("postgres://", "postgresql://") if url else default
+
+
+class Config:
+    SQLALCHEMY_DATABASE_URI = database_url('postgresql:///garden')
+    SQLALCHEMY_TRACK_MODIFICATIONS = False
+    SQLALCHEMY_ECHO = False
+    # connections each worker may hold: kept open, and opened on top of those when busy
+    SQLALCHEMY_ENGINE_OPTIONS = {
+        'pool_size': int(os.environ.get('DB_POOL_SIZE', 5)),
+        'max_overflow': int(os.environ.get('DB_MAX_OVERFLOW', 10)),
+    }
+    # use secret key in production or default to our dev one
+    SECRET_KEY = os.environ.get('SECRET_KEY', 'shh')
+    # load the debug toolbar (dev only)
+    DEBUG_TOOLBAR = False
+    DEBUG_TB_INTERCEPT_REDIRECTS = False
+    # compile every template at boot, keeping the bytecode in TEMPLATE_CACHE_DIR across restarts
+    PRECOMPILE_TEMPLATES = False
+    TEMPLATE_CACHE_DIR = os.environ.get('TEMPLATE_CACHE_DIR',
+                                        os.path.join(tempfile.gettempdir(), 'garden-templates'))
+    # database connections each worker opens before taking requests, see warm_pool
+    POOL_WARM_SIZE = int(os.environ.get('POOL_WARM_SIZE', 2))
+    # upstream APIs, or local stand-ins for them (benchmarks/mock_upstream.py)
+    OPENFARM_URL = os.environ.get('OPENFARM_URL', openfarm.OPENFARM_URL)
+    WEATHER_URL = os.environ.get('WEATHER_URL', weather.WEATHER_URL)
+    # OpenFarm crop lookups are cached in memory: size, fresh ttl and stale window (seconds)
+    CROP_CACHE_SIZE = int(os.environ.get('CROP_CACHE_SIZE', 512))
+    CROP_CACHE_TTL = int(os.environ.get('CROP_CACHE_TTL', 60 * 60))
+    CROP_CACHE_STALE_TTL = int(os.environ.get('CROP_CACHE_STALE_TTL', 24 * 60 * 60))
+    # names OpenFarm has no crop for aren't looked up again for this long (seconds)
+    CROP_MISS_TTL = int(os.environ.get('CROP_MISS_TTL', 24 * 60 * 60))
+    # plant search is served locally unless it finds fewer than PLANT_SEARCH_MIN_LOCAL plants
+    PLANT_SEARCH_LIMIT = int(os.environ.get('PLANT_SEARCH_LIMIT', 50))
+    PLANT_SEARCH_MIN_LOCAL = int(os.environ.get('PLANT_SEARCH_MIN_LOCAL', 3))
+    # forecasts are cached per location in the db for every worker to share
+    WEATHER_API_KEY = os.environ.get('WEATHER_API_KEY', weather.WEATHER_API_KEY)
+    WEATHER_CACHE_TTL = int(os.environ.get('WEATHER_CACHE_TTL', 30 * 60))
+    # outbound calls: timeouts in seconds, retries on idempotent failures, per-host circuit breaker
+    HTTP_CONNECT_TIMEOUT = float(os.environ.get('HTTP_CONNECT_TIMEOUT', 3.05))
+    HTTP_READ_TIMEOUT = float(os.environ.get('HTTP_READ_TIMEOUT', 10))
+    HTTP_RETRIES = int(os.environ.get('HTTP_RETRIES', 2))
+    # keep-alive connections kept per upstream host, raise it with gevent workers
+    HTTP_POOL_SIZE = int(os.environ.get('HTTP_POOL_SIZE', 10))
+    CIRCUIT_FAILURE_THRESHOLD = int(os.environ.get('CIRCUIT_FAILURE_THRESHOLD', 5))
+    CIRCUIT_RESET_TIMEOUT = int(os.environ.get('CIRCUIT_RESET_TIMEOUT', 30))
+    # a worker's claim on an upstream fetch (models.fetch_once) lapses after this
+    # many seconds, longer than a fetch with all its retries
+    FETCH_CLAIM_TTL = int(os.environ.get('FETCH_CLAIM_TTL', 60))
+    # snapshots of the logged in user are cached per worker for this many seconds
+    USER_CACHE_TTL = int(os.environ.get('USER_CACHE_TTL', 60))
+    # listings are paged with keyset cursors, PAGE_SIZE rows at a time
+    PAGE_SIZE = int(os.environ.get('PAGE_SIZE', 50))
+    # username searches return at most this many users, best match first
+    USER_SEARCH_LIMIT = int(os.environ.get('USER_SEARCH_LIMIT', 50))
+    # bcrypt work factor, and how many hashes may run or wait at once
+    BCRYPT_LOG_ROUNDS = int(os.environ.get('BCRYPT_LOG_ROUNDS', 12))
+    PASSWORD_HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS', 2))
+    PASSWORD_HASH_MAX_PENDING = int(os.environ.get('PASSWORD_HASH_MAX_PENDING', 16))
+    # part of every page ETag, change it to make browsers refetch pages after a template change
+    ETAG_SALT = os.environ.get('ETAG_SALT', os.environ.get('HEROKU_SLUG_COMMIT', ''))
+    # rendered plant and garden cards are cached per worker, keyed by row version
+    FRAGMENT_CACHE_SIZE = int(os.environ.get('FRAGMENT_CACHE_SIZE', 5000))
+    FRAGMENT_CACHE_TTL = int(os.environ.get('FRAGMENT_CACHE_TTL', 60 * 60))
+    # activity is copied into the timelines of at most this many followers, bigger accounts' is pulled
+    FEED_FANOUT_LIMIT = int(os.environ.get('FEED_FANOUT_LIMIT', 1000))
+    # how much of a user's recent activity a new follower's timeline starts with
+    FEED_BACKFILL = int(os.environ.get('FEED_BACKFILL', 20))
+    # plant suggestions: how many to show, and how long each worker caches them
+    SUGGESTION_COUNT = int(os.environ.get('SUGGESTION_COUNT', 6))
+    SUGGESTION_CACHE_SIZE = int(os.environ.get('SUGGESTION_CACHE_SIZE', 5000))
+    SUGGESTION_CACHE_TTL = int(os.environ.get('SUGGESTION_CACHE_TTL', 5 * 60))
+    # similar gardens: how many to show, and how long each worker caches them
+    SIMILAR_GARDEN_COUNT = int(os.environ.get('SIMILAR_GARDEN_COUNT', 6))
+    SIMILAR_CACHE_SIZE = int(os.environ.get('SIMILAR_CACHE_SIZE', 5000))
+    SIMILAR_CACHE_TTL = int(os.environ.get('SIMILAR_CACHE_TTL', 5 * 60))
+    # when set, /metrics wants an "Authorization: Bearer <token>" header
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+    # most plants one bulk add/remove request may name
+    BULK_PLANTS_MAX = int(os.environ.get('BULK_PLANTS_MAX', 200))
+
+
+class DevelopmentConfig(Config):
+    DEBUG_TOOLBAR = True
+
+
+class TestingConfig(Config):
+    TESTING = True
+    SQLALCHEMY_DATABASE_URI = database_url('postgresql:///garden-test')
+    WTF_CSRF_ENABLED = False
+    POOL_WARM_SIZE = 0
+
+
+class ProductionConfig(Config):
+    PRECOMPILE_TEMPLATES = True
+
+
+profiles = {
+    'dev': DevelopmentConfig,
+    'test': TestingConfig,
+    'prod': ProductionConfig,
+}
@@ -41,4 +41,4 @@ class AddGardenForm(FlaskForm):
 class AddPlantToGardenForm(FlaskForm):
     """Drop down form that adds plant to garden"""
 
-    garden = SelectField('', validate_choice=False)
\ No newline at end of file
+    garden = SelectField('', coerce=int, validate_choice=False)
\ No newline at end of file
@@ -0,0 +1,67 @@
+"""Cached HTML for plant and garden cards
+
+Templates render a grid of cards with {{ plant_cards(plants) }} and
+{{ garden_cards(gardens) }}. Each card's HTML is rendered once from its
+partial (plants/plant-card.html, gardens/garden-card.html) and reused for
+every page and every user until it ages out. Keys carry the row's
+version counter (see models.bump_version), so a changed plant or garden
+simply gets a new key. A warm card costs one cache lookup: the loop runs
+in Python, not through a Jinja call per card.
+
+Anything a card shows must be in its key. Cards for OpenFarm results that
+aren't saved locally have no id or version and render uncached.
+"""
+
+from flask import current_app
+from markupsafe import Markup
+
+from cache import TTLCache
+
+fragment_cache = TTLCache(maxsize=5000, ttl=60 * 60)
+
+
+def init_app(app):
+    """Size the fragment cache and make the card helpers available to templates"""
+
+    app.config.setdefault('FRAGMENT_CACHE_SIZE', 5000)
+    app.config.setdefault('FRAGMENT_CACHE_TTL', 60 * 60)
+
+    fragment_cache.configure(maxsize=app.config['FRAGMENT_CACHE_SIZE'],
+                             ttl=app.config['FRAGMENT_CACHE_TTL'])
+    app.jinja_env.globals.update(plant_cards=plant_cards, garden_cards=garden_cards)
+
+
+def cached_fragment(key, template, **context):
+    """template rendered with context, from the cache when key has been rendered before"""
+
+    html = fragment_cache.get(key) if key else None
+
+    if html is None:
+        html = Markup(current_app.jinja_env.get_template(template).render(**context))
+        if key:
+            fragment_cache.set(key, html)
+
+    return html
+
+
+def plant_cards(plants, delete=False):
+    """a card for each plant, delete=True adds the unsave button"""
+
+    cards = []
+    for plant in plants:
+        key = None
+        if not isinstance(plant, dict):
+            key = ('plant', plant.id, plant.version, delete)
+        cards.append(cached_fragment(key, 'plants/plant-card.html', plant=plant, delete=delete))
+
+    return Markup('\n').join(cards)
+
+
+def garden_cards(gardens, delete=None):
+    """a card for each garden. delete='garden' adds the owner's delete button,
+    delete='inspiration' the button removing a saved garden"""
+
+    return Markup('\n').join(
+        cached_fragment(('garden', garden.id, garden.version, garden.cover_image, delete),
+                        'gardens/garden-card.html', garden=garden, delete=delete)
+        for garden in gardens)
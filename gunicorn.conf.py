@@ -0,0 +1,89 @@
+"""gunicorn settings, see the Procfile
+
+The app is built once in the master (preload_app) and forked, so workers
+start with every module imported and every template compiled. Each
+worker then opens its own database connections before taking requests.
+
+WORKER_CLASS picks the worker type:
+
+    sync    (default) one request at a time per worker
+    gevent  WORKER_CONNECTIONS requests at once per worker, each a greenlet.
+            For routes that mostly wait on OpenFarm or weatherapi: a worker
+            keeps hundreds of upstream calls in flight instead of one.
+
+gevent workers need the standard library and psycopg2 patched before
+anything else is imported, so that happens here, ahead of preload.
+SQLAlchemy sessions are per greenlet (Flask-SQLAlchemy scopes them with
+greenlet.getcurrent). OpenFarm and weatherapi calls hand their database
+connection back before calling out and don't hold one while waiting on
+another worker's fetch (models.release_connection, models.fetch_once), so
+the number of upstream calls in flight isn't capped by DB_POOL_SIZE.
+
+Workers share their metrics through files in PROMETHEUS_MULTIPROC_DIR,
+which has to be set before prometheus_client is imported, so here. Old
+workers' samples are cleared at every start: the default directory under
+the temp dir is recreated, while in one the operator set only the *.db
+files prometheus_client wrote are removed.
+"""
+
+import glob
+import os
+import shutil
+import tempfile
+import time
+
+worker_class = os.environ.get('WORKER_CLASS', 'sync')
+worker_connections = int(os.environ.get('WORKER_CONNECTIONS', 1000))
+
+if worker_class == 'gevent':
+    from gevent import monkey
+    monkey.patch_all()
+
+    from psycogreen.gevent import patch_psycopg
+    patch_psycopg()
+
+if 'PROMETHEUS_MULTIPROC_DIR' in os.environ:
+    metrics_dir = os.environ['PROMETHEUS_MULTIPROC_DIR']
+    os.makedirs(metrics_dir, exist_ok=True)
+    for path in glob.glob(os.path.join(metrics_dir, '*.db')):
+        os.remove(path)
+else:
+    metrics_dir = os.path.join(tempfile.gettempdir(), 'garden-metrics')
+    os.environ['PROMETHEUS_MULTIPROC_DIR'] = metrics_dir
+    shutil.rmtree(metrics_dir, ignore_errors=True)
+    os.makedirs(metrics_dir)
+
+bind = f"0.0.0.0:{os.environ.get('PORT', 8000)}"
+workers = int(os.environ.get('WEB_CONCURRENCY', 2))
+preload_app = True
+
+started = time.perf_counter()
+
+
+def when_ready(server):
+    app = server.app.wsgi()
+    server.log.info("master ready in %.0fms, create_app took %.0fms",
+                    1000 * (time.perf_counter() - started), 1000 * app.config['BOOT_SECONDS'])
+
+
+def post_fork(server, worker):
+    from app import warm_pool
+    from models import db
+
+    start = time.perf_counter()
+    app = worker.app.wsgi()
+
+    # connections must never be shared across processes
+    with app.app_context():
+        db.engine.dispose()
+    warm_pool(app)
+
+    server.log.info("worker %s warmed %s connections in %.0fms",
+                    worker.pid, app.config['POOL_WARM_SIZE'], 1000 * (time.perf_counter() - start))
+
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+
+    # drop the dead worker's gauges, its counters and histograms keep counting
+    multiprocess.mark_process_dead(worker.pid)
@@ -0,0 +1,194 @@
+"""Shared outbound HTTP client for the OpenFarm and weatherapi.com calls
+
+One requests.Session keeps a keep-alive connection pool per host. Every
+call has connect/read timeouts, idempotent GETs are retried with backoff,
+and each host has a circuit breaker: after enough consecutive failures
+calls fail fast with UpstreamUnavailable until the reset timeout passes.
+"""
+
+import threading
+import time
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from metrics import upstream_errors, upstream_seconds
+
+
+class UpstreamUnavailable(Exception):
+    """the upstream failed, timed out, or its circuit is open"""
+
+
+class CircuitBreaker:
+    """closed -> open after failure_threshold consecutive failures,
+    open -> half-open after reset_timeout seconds, letting one trial call through"""
+
+    def __init__(self, failure_threshold=5, reset_timeout=30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._trial = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return 'closed'
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return 'half-open'
+        return 'open'
+
+    def allow(self):
+        """may a call go through now?"""
+
+        with self._lock:
+            state = self.state
+            if state == 'closed':
+                return True
+            if state == 'half-open' and not self._trial:
+                self._trial = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._trial = False
+            if self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+
+
+class HTTPClient:
+    """GET json from upstream APIs through pooled, time-bounded connections"""
+
+    def __init__(self):
+        self.connect_timeout = 3.05
+        self.read_timeout = 10
+        self.failure_threshold = 5
+        self.reset_timeout = 30
+        self._breakers = {}
+        self._lock = threading.Lock()
+        self.session = self._make_session(retries=2, backoff=0.3, pool_size=10)
+
+    def configure(self, connect_timeout=None, read_timeout=None, retries=2, backoff=0.3,
+                  pool_size=10, failure_threshold=None, reset_timeout=None):
+        """apply app config, replacing the session and resetting the breakers"""
+
+        if connect_timeout is not None:
+            self.connect_timeout = connect_timeout
+        if read_timeout is not None:
+            self.read_timeout = read_timeout
+        if failure_threshold is not None:
+            self.failure_threshold = failure_threshold
+        if reset_timeout is not None:
+            self.reset_timeout = reset_timeout
+
+        self.session.close()
+        self.session = self._make_session(retries, backoff, pool_size)
+        with self._lock:
+            self._breakers.clear()
+
+    def breaker(self, host):
+        with self._lock:
+            if host not in self._breakers:
+                self._breakers[host] = CircuitBreaker(self.failure_threshold, self.reset_timeout)
+            return self._breakers[host]
+
+    def get_json(self, url, params=None, upstream=None):
+        """GET url and decode its json body.
+
+        4xx responses are returned as-is since the APIs put useful errors in
+        the body. Timeouts, connection errors and 5xx responses that survive
+        the retries count against the host's circuit and raise UpstreamUnavailable.
+        Calls are timed and failures counted under upstream, the host by default.
+        """
+
+        host = urlsplit(url).netloc
+        upstream = upstream or host
+        breaker = self.breaker(host)
+
+        if not breaker.allow():
+            upstream_errors.labels(upstream, 'circuit_open').inc()
+            raise UpstreamUnavailable(f'{host} circuit is open')
+
+        start = time.perf_counter()
+        try:
+            try:
+                resp = self.session.get(url, params=params,
+                                        timeout=(self.connect_timeout, self.read_timeout))
+            finally:
+                upstream_seconds.labels(upstream).observe(time.perf_counter() - start)
+            if resp.status_code >= 500:
+                raise UpstreamUnavailable(f'{host} returned {resp.status_code}')
+            data = resp.json()
+
+        except (requests.RequestException, ValueError, UpstreamUnavailable) as exc:
+            upstream_errors.labels(upstream, failure_reason(exc)).inc()
+            breaker.record_failure()
+            if isinstance(exc, UpstreamUnavailable):
+                raise
+            raise UpstreamUnavailable(f'{host}: {exc}') from exc
+
+        breaker.record_success()
+        return data
+
+    def _make_session(self, retries, backoff, pool_size):
+        retry = Retry(total=retries,
+                      connect=retries,
+                      read=retries,
+                      status=retries,
+                      backoff_factor=backoff,
+                      status_forcelist=(502, 503, 504),
+                      allowed_methods=frozenset(['GET', 'HEAD']),
+                      raise_on_status=False)
+        adapter = HTTPAdapter(pool_connections=10, pool_maxsize=pool_size, max_retries=retry)
+
+        session = requests.Session()
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        return session
+
+
+def failure_reason(exc):
+    if isinstance(exc, requests.Timeout):
+        return 'timeout'
+    if isinstance(exc, requests.ConnectionError):
+        return 'connection'
+    if isinstance(exc, UpstreamUnavailable):
+        return 'server_error'
+    if isinstance(exc, requests.RequestException):
+        return 'request'
+    return 'bad_json'
+
+
+client = HTTPClient()
+
+
+def init_app(app):
+    """Read timeout, retry, pool and circuit breaker settings from app config"""
+
+    app.config.setdefault('HTTP_CONNECT_TIMEOUT', 3.05)
+    app.config.setdefault('HTTP_READ_TIMEOUT', 10)
+    app.config.setdefault('HTTP_RETRIES', 2)
+    app.config.setdefault('HTTP_RETRY_BACKOFF', 0.3)
+    app.config.setdefault('HTTP_POOL_SIZE', 10)
+    app.config.setdefault('CIRCUIT_FAILURE_THRESHOLD', 5)
+    app.config.setdefault('CIRCUIT_RESET_TIMEOUT', 30)
+    app.config.setdefault('FETCH_CLAIM_TTL', 60)
+
+    client.configure(connect_timeout=app.config['HTTP_CONNECT_TIMEOUT'],
+                     read_timeout=app.config['HTTP_READ_TIMEOUT'],
+                     retries=app.config['HTTP_RETRIES'],
+                     backoff=app.config['HTTP_RETRY_BACKOFF'],
+                     pool_size=app.config['HTTP_POOL_SIZE'],
+                     failure_threshold=app.config['CIRCUIT_FAILURE_THRESHOLD'],
+                     reset_timeout=app.config['CIRCUIT_RESET_TIMEOUT'])
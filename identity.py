@@ -0,0 +1,77 @@
+"""Cached snapshots of the logged in user for g.user
+
+Every request needs the current user's id, username, location and image
+for the nav bar, but few need their saved plants, gardens or follows.
+Snapshots of those four columns are cached per worker for USER_CACHE_TTL
+seconds; the full User row only loads when a route touches anything else.
+
+Each worker has its own cache, so snapshots are keyed by the user's id and
+the version their session recorded at login or at their last profile edit.
+An edit moves the session to a new key that no worker has cached, while the
+user's other sessions (another browser) can see the old snapshot for up to
+USER_CACHE_TTL seconds.
+"""
+
+from cache import TTLCache
+from models import db, Membership, User
+
+user_cache = TTLCache(maxsize=10000, ttl=60)
+
+
+def init_app(app):
+    """Size the user cache from app config"""
+
+    app.config.setdefault('USER_CACHE_SIZE', 10000)
+    app.config.setdefault('USER_CACHE_TTL', 60)
+
+    user_cache.configure(maxsize=app.config['USER_CACHE_SIZE'],
+                         ttl=app.config['USER_CACHE_TTL'])
+
+
+class CurrentUser(Membership):
+    """The logged in user's basic fields.
+
+    Membership checks (is_saved() etc.) only need the id. Any other
+    attribute (plants, gardens, ...) is looked up on the full User, which
+    is loaded from the database on first use.
+    """
+
+    def __init__(self, id, username, location, image_url):
+        self.id = id
+        self.username = username
+        self.location = location
+        self.image_url = image_url
+        self._user = None
+
+    @property
+    def orm(self):
+        """the full User row for this request"""
+
+        if self._user is None:
+            self._user = User.query.get(self.id)
+        return self._user
+
+    def __getattr__(self, name):
+        # only called for attributes not set in __init__
+        if name.startswith('__'):
+            raise AttributeError(name)
+        return getattr(self.orm, name)
+
+    def __repr__(self):
+        return f'<CurrentUser {self.id} {self.username}>'
+
+
+def load_snapshot(user_id):
+    row = (db.session
+           .query(User.id, User.username, User.location, User.image_url)
+           .filter(User.id == user_id)
+           .first())
+    return tuple(row) if row else None
+
+
+def get_current_user(user_id, version=None):
+    """CurrentUser for user_id, or None if there is no such user.
+    version is the one the user's session recorded"""
+
+    snapshot = user_cache.get_or_load((user_id, version), lambda: load_snapshot(user_id))
+    return CurrentUser(*snapshot) if snapshot else None
@@ -0,0 +1,131 @@
+"""Bulk import the OpenFarm crop catalog into the plants table
+
+run like:
+    python import_plants.py
+    python import_plants.py --url http://localhost:8001/api/v1/crops/
+    python import_plants.py --fixture fixtures/openfarm_crops.json
+
+Pages of the crops API are fetched a few at a time on a thread pool and
+written with batched upserts on Plant.name, mapped the same way
+plant_details maps a single crop. Re-running refreshes existing plants.
+"""
+
+import argparse
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from sqlalchemy.dialects.postgresql import insert
+
+from http_client import client
+from models import db, Plant
+from openfarm import OPENFARM_URL, plant_fields
+
+
+def fetch_page(url, page):
+    """the crop records on one page of the crops API"""
+
+    return client.get_json(url, params={'page': page}, upstream='openfarm').get('data', [])
+
+
+def fetch_catalog(url, concurrency=8, max_pages=None):
+    """yield every crop record, with up to `concurrency` pages in flight at once.
+    stops at the first empty page"""
+
+    first = 1
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        while max_pages is None or first <= max_pages:
+            last = first + concurrency - 1
+            if max_pages is not None:
+                last = min(last, max_pages)
+
+            for records in pool.map(lambda page: fetch_page(url, page), range(first, last + 1)):
+                if not records:
+                    return
+                yield from records
+
+            first = last + 1
+
+
+def load_fixture(path):
+    """crop records from a saved API response, or a list of them"""
+
+    with open(path) as f:
+        pages = json.load(f)
+
+    if isinstance(pages, dict):
+        pages = [pages]
+
+    return [record for page in pages for record in page['data']]
+
+
+DETAIL_COLUMNS = ('binomial_name', 'description', 'growing_method', 'image')
+
+
+def upsert_plants(rows):
+    """insert or refresh plants by name in one statement. plants whose details
+    didn't change are left alone so their pages stay cached"""
+
+    stmt = insert(Plant).values(rows)
+    current = db.tuple_(*[getattr(Plant, column) for column in DETAIL_COLUMNS])
+    incoming = db.tuple_(*[stmt.excluded[column] for column in DETAIL_COLUMNS])
+
+    set_ = {column: stmt.excluded[column] for column in DETAIL_COLUMNS}
+    set_['version'] = Plant.version + 1
+
+    db.session.execute(stmt.on_conflict_do_update(
+        index_elements=[Plant.name],
+        set_=set_,
+        where=current.is_distinct_from(incoming)))
+
+
+def import_crops(records, batch_size=500):
+    """write crop records to the plants table in batches, returns the number written"""
+
+    batch = {}
+    written = 0
+
+    for record in records:
+        fields = plant_fields(record['attributes'])
+        # a statement can't upsert the same name twice, the last copy wins
+        batch[fields['name']] = fields
+
+        if len(batch) >= batch_size:
+            upsert_plants(list(batch.values()))
+            db.session.commit()
+            written += len(batch)
+            batch = {}
+
+    if batch:
+        upsert_plants(list(batch.values()))
+        db.session.commit()
+        written += len(batch)
+
+    return written
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--url', default=OPENFARM_URL, help='crops API or a local stub of it')
+    parser.add_argument('--fixture', help='import a saved JSON response instead of calling the API')
+    parser.add_argument('--concurrency', type=int, default=8, help='pages fetched at once')
+    parser.add_argument('--max-pages', type=int, help='stop after this many pages')
+    parser.add_argument('--batch-size', type=int, default=500, help='plants per upsert')
+    args = parser.parse_args(argv)
+
+    from app import app
+
+    start = time.perf_counter()
+    with app.app_context():
+        if args.fixture:
+            records = load_fixture(args.fixture)
+        else:
+            records = fetch_catalog(args.url, args.concurrency, args.max_pages)
+
+        written = import_crops(records, args.batch_size)
+
+    print(f'imported {written} plants in {time.perf_counter() - start:.1f}s')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,167 @@
+"""Prometheus metrics, served at /metrics
+
+    http_request_duration_seconds{endpoint, method, status}   histogram
+    db_queries_per_request{endpoint}                          histogram
+    db_query_seconds_per_request{endpoint}                    histogram
+    upstream_request_duration_seconds{upstream}               histogram
+    upstream_errors_total{upstream, reason}                   counter
+    db_pool_connections{state}                                gauge, checked_out or open
+    cache_lookups_total{cache, result}                        counter, hit, stale or miss
+
+A cache's hit ratio is
+    sum(rate(cache_lookups_total{result!="miss"}[5m])) by (cache)
+      / sum(rate(cache_lookups_total[5m])) by (cache)
+
+Under gunicorn every worker writes its samples to PROMETHEUS_MULTIPROC_DIR
+(gunicorn.conf.py sets it before the app is imported) and whichever worker
+answers the scrape adds them all up. Without it, e.g. under flask run or
+the tests, metrics live in this process only.
+
+Recording is a few counter increments per request and a perf_counter()
+pair per query, cheap enough to leave on in production.
+"""
+
+import os
+import threading
+import time
+
+from flask import current_app, g, has_request_context, request
+from prometheus_client import (CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry,
+                               Counter, Gauge, Histogram, generate_latest, multiprocess)
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import Pool
+
+request_seconds = Histogram('http_request_duration_seconds', 'Time to answer a request',
+                            ['endpoint', 'method', 'status'])
+db_queries = Histogram('db_queries_per_request', 'SQL statements run by a request', ['endpoint'],
+                       buckets=(0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89))
+db_seconds = Histogram('db_query_seconds_per_request', 'Time a request spent in SQL', ['endpoint'],
+                       buckets=(.001, .0025, .005, .01, .025, .05, .1, .25, .5, 1, 2.5))
+upstream_seconds = Histogram('upstream_request_duration_seconds',
+                             'Time for a call to OpenFarm or weatherapi, retries included', ['upstream'])
+upstream_errors = Counter('upstream_errors_total', 'Failed calls to an upstream API',
+                          ['upstream', 'reason'])
+pool_connections = Gauge('db_pool_connections', 'Database connections held by the pool', ['state'],
+                         multiprocess_mode='livesum')
+cache_lookups = Counter('cache_lookups_total', 'Lookups in an app cache', ['cache', 'result'])
+
+# TTLCache counters last copied into cache_lookups, see sync_caches
+watched_caches = {}
+_synced = {}
+_sync_lock = threading.Lock()
+
+
+def init_app(app, caches=None):
+    """Time every request and serve /metrics. caches is {name: TTLCache}
+    for the in-process caches whose hits and misses should be exported"""
+
+    app.config.setdefault('METRICS_TOKEN', None)
+
+    watched_caches.update(caches or {})
+
+    app.before_request(start_request)
+    app.after_request(record_request)
+    app.add_url_rule('/metrics', 'metrics', metrics_page)
+
+
+def start_request():
+    g.request_started = time.perf_counter()
+    g.db_queries = 0
+    g.db_seconds = 0.0
+
+
+def record_request(response):
+    started = g.get('request_started')
+    if started is None:
+        return response
+
+    endpoint = request.endpoint or 'unmatched'
+    request_seconds.labels(endpoint, request.method, response.status_code).observe(
+        time.perf_counter() - started)
+    db_queries.labels(endpoint).observe(g.db_queries)
+    db_seconds.labels(endpoint).observe(g.db_seconds)
+    sync_caches()
+
+    return response
+
+
+def sync_caches():
+    """add what each watched TTLCache counted since the last sync to cache_lookups"""
+
+    with _sync_lock:
+        for name, cache in watched_caches.items():
+            counts = {'hit': cache.hits, 'stale': cache.stale_hits, 'miss': cache.misses}
+            last = _synced.get(name, {})
+            for result, count in counts.items():
+                # a cleared or rebuilt cache starts counting again from 0
+                delta = count - last.get(result, 0)
+                if delta > 0:
+                    cache_lookups.labels(name, result).inc(delta)
+            _synced[name] = counts
+
+
+def metrics_page():
+    token = current_app.config['METRICS_TOKEN']
+    if token and request.headers.get('Authorization') != f'Bearer {token}':
+        return 'Unauthorized', 401
+
+    sync_caches()
+
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+
+    return generate_latest(registry), 200, {'Content-Type': CONTENT_TYPE_LATEST}
+
+
+# SQL statements, counted against the request that ran them
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info['query_started'].pop()
+
+    if has_request_context() and 'db_queries' in g:
+        g.db_queries += 1
+        g.db_seconds += elapsed
+
+
+@event.listens_for(Engine, 'handle_error')
+def handle_error(context):
+    # a failed statement never reaches after_cursor_execute
+    if context.connection is not None and context.connection.info.get('query_started'):
+        context.connection.info['query_started'].pop()
+
+
+# connection pool usage
+
+@event.listens_for(Pool, 'connect')
+def pool_connect(dbapi_connection, connection_record):
+    pool_connections.labels('open').inc()
+
+
+@event.listens_for(Pool, 'close')
+def pool_close(dbapi_connection, connection_record):
+    pool_connections.labels('open').dec()
+
+
+@event.listens_for(Pool, 'close_detached')
+def pool_close_detached(dbapi_connection):
+    pool_connections.labels('open').dec()
+
+
+@event.listens_for(Pool, 'checkout')
+def pool_checkout(dbapi_connection, connection_record, connection_proxy):
+    pool_connections.labels('checked_out').inc()
+
+
+@event.listens_for(Pool, 'checkin')
+def pool_checkin(dbapi_connection, connection_record):
+    pool_connections.labels('checked_out').dec()
@@ -0,0 +1,80 @@
+"""Apply the SQL files in migrations/ that have not been run yet
+
+run like: python migrate.py
+
+Files run in name order, one statement at a time in autocommit mode so
+they may use CREATE INDEX CONCURRENTLY. Write them to be safe to re-run.
+"""
+
+import os
+
+from sqlalchemy import text
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'migrations')
+
+
+def split_statements(sql):
+    """split a file on the semicolons that end a line, ignoring $$ bodies and comments"""
+
+    statements = []
+    current = []
+    in_body = False
+
+    for line in sql.splitlines():
+        if not current and line.strip().startswith('--'):
+            continue
+        current.append(line)
+        if line.count('$$') % 2:
+            in_body = not in_body
+        if not in_body and line.rstrip().endswith(';'):
+            statement = '\n'.join(current).strip()
+            if statement.rstrip(';').strip():
+                statements.append(statement)
+            current = []
+
+    if '\n'.join(current).strip():
+        statements.append('\n'.join(current).strip())
+
+    return statements
+
+
+def pending_migrations(conn):
+    conn.execute(text("""CREATE TABLE IF NOT EXISTS schema_migrations (
+                             filename TEXT PRIMARY KEY,
+                             applied_at TIMESTAMPTZ NOT NULL DEFAULT now())"""))
+    applied = {row[0] for row in conn.execute(text("SELECT filename FROM schema_migrations"))}
+
+    return [name for name in sorted(os.listdir(MIGRATIONS_DIR))
+            if name.endswith('.sql') and name not in applied]
+
+
+def apply_migration(conn, name):
+    """run every statement in one migration file on an autocommit connection"""
+
+    with open(os.path.join(MIGRATIONS_DIR, name)) as f:
+        statements = split_statements(f.read())
+
+    for statement in statements:
+        conn.exec_driver_sql(statement)
+
+
+def run_migrations(engine):
+    """apply pending migrations, returns the filenames that ran"""
+
+    ran = []
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        for name in pending_migrations(conn):
+            apply_migration(conn, name)
+            conn.execute(text("INSERT INTO schema_migrations (filename) VALUES (:name)"),
+                         {'name': name})
+            ran.append(name)
+
+    return ran
+
+
+if __name__ == '__main__':
+    from app import app
+    from models import db
+
+    for name in run_migrations(db.get_engine(app)):
+        print(f'applied {name}')
@@ -0,0 +1,23 @@
+-- full-text and trigram search over plants
+-- the trigram indexes back ILIKE '%...%' and similarity() lookups
+
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+ALTER TABLE plants ADD COLUMN IF NOT EXISTS search_vector tsvector
+    GENERATED ALWAYS AS (
+        setweight(to_tsvector('english', coalesce(name, '')), 'A') ||
+        setweight(to_tsvector('english', coalesce(binomial_name, '')), 'B') ||
+        setweight(to_tsvector('english', coalesce(description, '')), 'C')
+    ) STORED;
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_plants_search_vector
+    ON plants USING gin (search_vector);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_plants_name_trgm
+    ON plants USING gin (name gin_trgm_ops);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_plants_binomial_name_trgm
+    ON plants USING gin (binomial_name gin_trgm_ops);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_plants_description_trgm
+    ON plants USING gin (description gin_trgm_ops);
@@ -0,0 +1,7 @@
+-- shared weather forecast cache, see weather.py
+
+CREATE TABLE IF NOT EXISTS forecasts (
+    location TEXT PRIMARY KEY,
+    payload JSONB NOT NULL,
+    fetched_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
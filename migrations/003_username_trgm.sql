@@ -0,0 +1,6 @@
+-- case-insensitive substring and fuzzy username search, see search.search_users
+
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_users_username_trgm
+    ON users USING gin (username gin_trgm_ops);
@@ -0,0 +1,127 @@
+-- one row per pair in every join table, plus indexes for reverse lookups
+--
+-- runs against a live database: duplicates are deleted (keeping the oldest
+-- row) and the unique indexes are built CONCURRENTLY, then attached as
+-- constraints. If a duplicate sneaks in between the delete and the index
+-- build the build fails; its invalid index is dropped and re-running
+-- `python migrate.py` picks up from there.
+
+-- follows (user_followed, user_following)
+
+DELETE FROM follows dup USING follows keep
+    WHERE dup.user_followed = keep.user_followed
+      AND dup.user_following = keep.user_following
+      AND dup.id > keep.id;
+
+DO $$
+BEGIN
+    IF EXISTS (SELECT 1 FROM pg_index JOIN pg_class ON pg_class.oid = pg_index.indexrelid
+               WHERE pg_class.relname = 'uq_follows_user_followed_user_following' AND NOT pg_index.indisvalid) THEN
+        DROP INDEX uq_follows_user_followed_user_following;
+    END IF;
+END
+$$;
+
+CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS uq_follows_user_followed_user_following
+    ON follows (user_followed, user_following);
+
+DO $$
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM pg_constraint WHERE conname = 'uq_follows_user_followed_user_following') THEN
+        ALTER TABLE follows ADD CONSTRAINT uq_follows_user_followed_user_following UNIQUE USING INDEX uq_follows_user_followed_user_following;
+    END IF;
+END
+$$;
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_follows_user_following
+    ON follows (user_following);
+
+-- user_plants (user_id, plant_id)
+
+DELETE FROM user_plants dup USING user_plants keep
+    WHERE dup.user_id = keep.user_id
+      AND dup.plant_id = keep.plant_id
+      AND dup.id > keep.id;
+
+DO $$
+BEGIN
+    IF EXISTS (SELECT 1 FROM pg_index JOIN pg_class ON pg_class.oid = pg_index.indexrelid
+               WHERE pg_class.relname = 'uq_user_plants_user_id_plant_id' AND NOT pg_index.indisvalid) THEN
+        DROP INDEX uq_user_plants_user_id_plant_id;
+    END IF;
+END
+$$;
+
+CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS uq_user_plants_user_id_plant_id
+    ON user_plants (user_id, plant_id);
+
+DO $$
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM pg_constraint WHERE conname = 'uq_user_plants_user_id_plant_id') THEN
+        ALTER TABLE user_plants ADD CONSTRAINT uq_user_plants_user_id_plant_id UNIQUE USING INDEX uq_user_plants_user_id_plant_id;
+    END IF;
+END
+$$;
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_user_plants_plant_id
+    ON user_plants (plant_id);
+
+-- garden_plants (garden_id, plant_id)
+
+DELETE FROM garden_plants dup USING garden_plants keep
+    WHERE dup.garden_id = keep.garden_id
+      AND dup.plant_id = keep.plant_id
+      AND dup.id > keep.id;
+
+DO $$
+BEGIN
+    IF EXISTS (SELECT 1 FROM pg_index JOIN pg_class ON pg_class.oid = pg_index.indexrelid
+               WHERE pg_class.relname = 'uq_garden_plants_garden_id_plant_id' AND NOT pg_index.indisvalid) THEN
+        DROP INDEX uq_garden_plants_garden_id_plant_id;
+    END IF;
+END
+$$;
+
+CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS uq_garden_plants_garden_id_plant_id
+    ON garden_plants (garden_id, plant_id);
+
+DO $$
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM pg_constraint WHERE conname = 'uq_garden_plants_garden_id_plant_id') THEN
+        ALTER TABLE garden_plants ADD CONSTRAINT uq_garden_plants_garden_id_plant_id UNIQUE USING INDEX uq_garden_plants_garden_id_plant_id;
+    END IF;
+END
+$$;
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_garden_plants_plant_id
+    ON garden_plants (plant_id);
+
+-- saved_gardens (user_saved, garden_id)
+
+DELETE FROM saved_gardens dup USING saved_gardens keep
+    WHERE dup.user_saved = keep.user_saved
+      AND dup.garden_id = keep.garden_id
+      AND dup.id > keep.id;
+
+DO $$
+BEGIN
+    IF EXISTS (SELECT 1 FROM pg_index JOIN pg_class ON pg_class.oid = pg_index.indexrelid
+               WHERE pg_class.relname = 'uq_saved_gardens_user_saved_garden_id' AND NOT pg_index.indisvalid) THEN
+        DROP INDEX uq_saved_gardens_user_saved_garden_id;
+    END IF;
+END
+$$;
+
+CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS uq_saved_gardens_user_saved_garden_id
+    ON saved_gardens (user_saved, garden_id);
+
+DO $$
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM pg_constraint WHERE conname = 'uq_saved_gardens_user_saved_garden_id') THEN
+        ALTER TABLE saved_gardens ADD CONSTRAINT uq_saved_gardens_user_saved_garden_id UNIQUE USING INDEX uq_saved_gardens_user_saved_garden_id;
+    END IF;
+END
+$$;
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_saved_gardens_garden_id
+    ON saved_gardens (garden_id);
@@ -0,0 +1,11 @@
+-- version counters behind the ETags on garden, plant and profile pages, see conditional.py
+-- (adding a column with a constant default doesn't rewrite the table)
+
+ALTER TABLE users ADD COLUMN IF NOT EXISTS version INTEGER NOT NULL DEFAULT 1;
+
+ALTER TABLE plants ADD COLUMN IF NOT EXISTS version INTEGER NOT NULL DEFAULT 1;
+
+ALTER TABLE gardens ADD COLUMN IF NOT EXISTS version INTEGER NOT NULL DEFAULT 1;
+
+-- profile pages look up a user's gardens
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_gardens_user_id ON gardens (user_id);
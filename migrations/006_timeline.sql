@@ -0,0 +1,25 @@
+-- activity feeds, see timeline.py
+-- (new tables, so plain CREATE INDEX is fine)
+
+CREATE TABLE IF NOT EXISTS activities (
+    id SERIAL PRIMARY KEY,
+    actor_id INTEGER NOT NULL REFERENCES users (id) ON DELETE CASCADE,
+    verb TEXT NOT NULL,
+    garden_id INTEGER REFERENCES gardens (id) ON DELETE CASCADE,
+    plant_id INTEGER REFERENCES plants (id) ON DELETE CASCADE,
+    fanned_out BOOLEAN NOT NULL DEFAULT true,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+CREATE INDEX IF NOT EXISTS ix_activities_actor_id_id ON activities (actor_id, id);
+
+CREATE INDEX IF NOT EXISTS ix_activities_pulled ON activities (id) WHERE NOT fanned_out;
+
+CREATE TABLE IF NOT EXISTS timeline_entries (
+    user_id INTEGER NOT NULL REFERENCES users (id) ON DELETE CASCADE,
+    activity_id INTEGER NOT NULL REFERENCES activities (id) ON DELETE CASCADE,
+    actor_id INTEGER NOT NULL,
+    PRIMARY KEY (user_id, activity_id)
+);
+
+CREATE INDEX IF NOT EXISTS ix_timeline_entries_activity_id ON timeline_entries (activity_id);
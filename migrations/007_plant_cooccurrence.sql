@@ -0,0 +1,11 @@
+-- plant pair scores behind the plant suggestions, see recommend.py
+-- (fill it once with `python recommend.py`, it is kept current after that)
+
+CREATE TABLE IF NOT EXISTS plant_cooccurrence (
+    plant_id INTEGER NOT NULL REFERENCES plants (id) ON DELETE CASCADE,
+    other_id INTEGER NOT NULL REFERENCES plants (id) ON DELETE CASCADE,
+    score INTEGER NOT NULL,
+    PRIMARY KEY (plant_id, other_id)
+);
+
+CREATE INDEX IF NOT EXISTS ix_plant_cooccurrence_plant_id_score ON plant_cooccurrence (plant_id, score DESC);
@@ -0,0 +1,16 @@
+-- MinHash signatures and LSH buckets behind similar gardens, see similar.py
+-- (fill them once with `python similar.py`, they are kept current after that)
+
+CREATE TABLE IF NOT EXISTS garden_signatures (
+    garden_id INTEGER PRIMARY KEY REFERENCES gardens (id) ON DELETE CASCADE,
+    signature INTEGER[] NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS lsh_buckets (
+    band SMALLINT NOT NULL,
+    bucket BIGINT NOT NULL,
+    garden_id INTEGER NOT NULL REFERENCES gardens (id) ON DELETE CASCADE,
+    PRIMARY KEY (band, bucket, garden_id)
+);
+
+CREATE INDEX IF NOT EXISTS ix_lsh_buckets_garden_id ON lsh_buckets (garden_id);
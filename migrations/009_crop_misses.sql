@@ -0,0 +1,6 @@
+-- plant names OpenFarm has no crop for, see openfarm.find_plant
+
+CREATE TABLE IF NOT EXISTS crop_misses (
+    name TEXT PRIMARY KEY,
+    checked_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
@@ -0,0 +1,4 @@
+-- nothing matches descriptions with ILIKE or similarity(), they are
+-- searched through search_vector, so their trigram index only slowed writes
+
+DROP INDEX CONCURRENTLY IF EXISTS ix_plants_description_trgm;
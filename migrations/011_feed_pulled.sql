@@ -0,0 +1,14 @@
+-- feeds pull only from followed accounts whose activities aren't fanned
+-- out, one range scan each, see timeline.py
+
+ALTER TABLE users ADD COLUMN IF NOT EXISTS feed_pulled BOOLEAN NOT NULL DEFAULT false;
+
+UPDATE users SET feed_pulled = true
+WHERE NOT feed_pulled AND id IN (SELECT actor_id FROM activities WHERE NOT fanned_out);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_users_feed_pulled ON users (id) WHERE feed_pulled;
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_activities_pulled_actor_id_id
+    ON activities (actor_id, id) WHERE NOT fanned_out;
+
+DROP INDEX CONCURRENTLY IF EXISTS ix_activities_pulled;
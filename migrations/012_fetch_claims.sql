@@ -0,0 +1,7 @@
+-- upstream fetches a worker is running, so others wait for their result,
+-- see models.fetch_once
+
+CREATE TABLE IF NOT EXISTS fetch_claims (
+    key TEXT PRIMARY KEY,
+    claimed_until TIMESTAMPTZ NOT NULL
+);
@@ -1,5 +1,12 @@
+import time
+from datetime import timedelta
+
+from flask import g, has_app_context
 from flask_sqlalchemy import SQLAlchemy
 from flask_bcrypt import Bcrypt
+from sqlalchemy.dialects.postgresql import ARRAY, TSVECTOR, JSONB, insert
+
+from passwords import hasher
 
 db = SQLAlchemy()
 bcrypt = Bcrypt()
@@ -8,15 +15,96 @@ class Follows(db.Model):
     """a join table for a users garden and all the plants the garden has"""
 
     __tablename__ = 'follows'
+    __table_args__ = (
+        db.UniqueConstraint('user_followed', 'user_following',
+                            name='uq_follows_user_followed_user_following'),
+        db.Index('ix_follows_user_following', 'user_following'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     user_followed = db.Column(db.Integer, db.ForeignKey("users.id"))
     user_following = db.Column(db.Integer, db.ForeignKey("users.id"))
 
-class User(db.Model):
+class Membership:
+    """Saved/following checks for User and identity.CurrentUser.
+
+    Single checks are indexed EXISTS queries. Pages with many cards ask
+    for a whole page of ids at once (followed_user_ids), one IN query per
+    collection, and later checks for those ids are answered from that
+    result without another query. Answers are kept on g, so they last one
+    request and add_link/remove_link drop the ones they change.
+    """
+
+    def _membership_columns(self, kind):
+        """(owner column, member column) of the join table for kind"""
+
+        return {
+            'plants': (User_plant.user_id, User_plant.plant_id),
+            'gardens': (Saved_gardens.user_saved, Saved_gardens.garden_id),
+            'follows': (Follows.user_followed, Follows.user_following),
+        }[kind]
+
+    def _known_members(self, kind):
+        if not has_app_context():
+            return {}
+        return g.setdefault('memberships', {}).setdefault(self.id, {}).setdefault(kind, {})
+
+    def member_ids(self, kind, ids):
+        """the subset of ids in this user's kind collection, in at most one query"""
+
+        ids = set(ids)
+        known = self._known_members(kind)
+        missing = [member_id for member_id in ids if member_id not in known]
+
+        if missing:
+            owner, member = self._membership_columns(kind)
+            found = {row[0] for row in (db.session
+                                        .query(member)
+                                        .filter(owner == self.id, member.in_(missing)))}
+            for member_id in missing:
+                known[member_id] = member_id in found
+
+        return {member_id for member_id in ids if known[member_id]}
+
+    def is_member(self, kind, member_id):
+        known = self._known_members(kind)
+
+        if member_id not in known:
+            owner, member = self._membership_columns(kind)
+            known[member_id] = db.session.query(
+                db.exists().where(db.and_(owner == self.id, member == member_id))).scalar()
+
+        return known[member_id]
+
+    def followed_user_ids(self, user_ids):
+        """which of these users does this user follow?"""
+
+        return self.member_ids('follows', user_ids)
+
+    def is_saved(self, plant_id):
+        """does this user have this plant saved?"""
+
+        return self.is_member('plants', plant_id)
+
+    def is_saved_garden(self, garden_id):
+        """does this user have this garden saved?"""
+
+        return self.is_member('gardens', garden_id)
+
+    def is_following(self, user):
+        """does this user follow this user? takes a User or an id"""
+
+        return self.is_member('follows', getattr(user, 'id', user))
+
+
+class User(Membership, db.Model):
     """User"""
 
     __tablename__ = 'users'
+    __table_args__ = (
+        # the few accounts whose activities are pulled, see timeline.py
+        db.Index('ix_users_feed_pulled', 'id', postgresql_where=db.text('feed_pulled')),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.Text, nullable=False, unique=True)
@@ -24,6 +112,10 @@ class User(db.Model):
     password = db.Column(db.Text, nullable=False)
     location = db.Column(db.String, nullable=False)
     image_url = db.Column(db.Text, default="/static/7100-1_1.jpg")
+    # bumped when the profile, saved items, follows or own garden list change
+    version = db.Column(db.Integer, nullable=False, default=1, server_default='1')
+    # set once any of their activities wasn't copied to followers' timelines
+    feed_pulled = db.Column(db.Boolean, nullable=False, default=False, server_default='false')
 
     gardens = db.relationship('Garden', secondary='saved_gardens', backref='users')
     plants = db.relationship('Plant', secondary='user_plants', backref='users')
@@ -31,30 +123,11 @@ class User(db.Model):
                                         primaryjoin=Follows.user_followed == id, 
                                         secondaryjoin=Follows.user_following == id)
     
-    def is_saved(self, plant_id):
-        """does this user have this plant saved?"""
-
-        found_plant_list = [plant for plant in self.plants if plant.id == plant_id]
-        return len(found_plant_list) == 1
-    
-    def is_saved_garden(self, garden_id):
-        """does this user have this plant saved?"""
-
-        found_garden_list = [garden for garden in self.gardens if garden.id == garden_id]
-        return len(found_garden_list) == 1
-
-    def is_following(self, user_id):
-        """does this user follow this user?"""
-
-        followed_user = [user for user in self.followed_users if user == user_id]
-        return len(followed_user) == 1
-
-
     @classmethod
     def signup(cls, username, email, password, image_url, location):
         """Hashes password and saves user"""
 
-        hashed_password = bcrypt.generate_password_hash(password).decode('UTF-8')
+        hashed_password = hasher.hash(password)
 
         user = User(
             username=username,
@@ -74,8 +147,12 @@ class User(db.Model):
         user = cls.query.filter_by(username=username).first()
 
         if user:
-            user_exist = bcrypt.check_password_hash(user.password, password)
+            user_exist = hasher.verify(user.password, password)
             if user_exist:
+                # upgrade hashes made before the work factor was raised
+                if hasher.needs_rehash(user.password):
+                    user.password = hasher.hash(password)
+                    db.session.commit()
                 return user
         return False
 
@@ -83,6 +160,9 @@ class Plant(db.Model):
     """Plant"""
 
     __tablename__ = 'plants'
+    __table_args__ = (
+        db.Index('ix_plants_search_vector', 'search_vector', postgresql_using='gin'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.Text, nullable=False, unique=True)
@@ -91,17 +171,31 @@ class Plant(db.Model):
     description = db.Column(db.Text, nullable=True)
     sun_requirements = db.Column(db.Text, nullable=True)
     growing_method = db.Column(db.Text, nullable=True)
+    # bumped when the import refreshes this plant
+    version = db.Column(db.Integer, nullable=False, default=1, server_default='1')
+
+    # maintained by postgres, names weigh more than binomial names and descriptions
+    search_vector = db.deferred(db.Column(TSVECTOR, db.Computed(
+        "setweight(to_tsvector('english', coalesce(name, '')), 'A') || "
+        "setweight(to_tsvector('english', coalesce(binomial_name, '')), 'B') || "
+        "setweight(to_tsvector('english', coalesce(description, '')), 'C')",
+        persisted=True)))
 
 class Garden(db.Model):
     """Garden"""
 
     __tablename__ = 'gardens'
+    __table_args__ = (
+        db.Index('ix_gardens_user_id', 'user_id'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey("users.id"))
     username = db.Column(db.Text, db.ForeignKey("users.username"))
     name = db.Column(db.Text, nullable=False)
     description = db.Column(db.Text, nullable=True)
+    # bumped when plants are added to or removed from the garden
+    version = db.Column(db.Integer, nullable=False, default=1, server_default='1')
     
     plants = db.relationship('Plant', secondary='garden_plants', backref='gardens')
 
@@ -110,6 +204,10 @@ class User_plant(db.Model):
     """join table for a user and all of their plants"""
 
     __tablename__ = 'user_plants'
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'plant_id', name='uq_user_plants_user_id_plant_id'),
+        db.Index('ix_user_plants_plant_id', 'plant_id'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey("users.id", ondelete="cascade"))
@@ -119,6 +217,10 @@ class Garden_plant(db.Model):
     """a join table for a users garden and all the plants the garden has"""
 
     __tablename__ = 'garden_plants'
+    __table_args__ = (
+        db.UniqueConstraint('garden_id', 'plant_id', name='uq_garden_plants_garden_id_plant_id'),
+        db.Index('ix_garden_plants_plant_id', 'plant_id'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     garden_id = db.Column(db.Integer, db.ForeignKey("gardens.id", ondelete="cascade"))
@@ -128,12 +230,307 @@ class Saved_gardens(db.Model):
     """a join table for a user and gardens they saved belonging to other users"""
 
     __tablename__ = 'saved_gardens'
+    __table_args__ = (
+        db.UniqueConstraint('user_saved', 'garden_id', name='uq_saved_gardens_user_saved_garden_id'),
+        db.Index('ix_saved_gardens_garden_id', 'garden_id'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     garden_id = db.Column(db.Integer, db.ForeignKey("gardens.id", ondelete="cascade"))
     user_saved = db.Column(db.Integer, db.ForeignKey("users.id", ondelete="cascade"))
 
 
+class Plant_cooccurrence(db.Model):
+    """how often two plants are saved by the same user or grown in the same garden, see recommend.py"""
+
+    __tablename__ = 'plant_cooccurrence'
+    __table_args__ = (
+        db.Index('ix_plant_cooccurrence_plant_id_score', 'plant_id', db.text('score DESC')),
+    )
+
+    plant_id = db.Column(db.Integer, db.ForeignKey("plants.id", ondelete="cascade"), primary_key=True)
+    other_id = db.Column(db.Integer, db.ForeignKey("plants.id", ondelete="cascade"), primary_key=True)
+    score = db.Column(db.Integer, nullable=False)
+
+
+class Garden_signature(db.Model):
+    """MinHash signature of a garden's plant ids, see similar.py"""
+
+    __tablename__ = 'garden_signatures'
+
+    garden_id = db.Column(db.Integer, db.ForeignKey("gardens.id", ondelete="cascade"), primary_key=True)
+    signature = db.Column(ARRAY(db.Integer), nullable=False)
+
+
+class Lsh_bucket(db.Model):
+    """a garden in the bucket of one band of its signature, see similar.py"""
+
+    __tablename__ = 'lsh_buckets'
+    __table_args__ = (
+        db.Index('ix_lsh_buckets_garden_id', 'garden_id'),
+    )
+
+    band = db.Column(db.SmallInteger, primary_key=True)
+    bucket = db.Column(db.BigInteger, primary_key=True)
+    garden_id = db.Column(db.Integer, db.ForeignKey("gardens.id", ondelete="cascade"), primary_key=True)
+
+
+# image of a garden's first plant, loaded with the garden in one query
+# so garden cards don't need the garden's whole plant list
+Garden.cover_image = db.column_property(
+    db.select(Plant.image)
+    .join(Garden_plant, Garden_plant.plant_id == Plant.id)
+    .where(Garden_plant.garden_id == Garden.id)
+    .order_by(Garden_plant.id)
+    .limit(1)
+    .scalar_subquery())
+
+
+class Forecast(db.Model):
+    """weatherapi.com responses cached per location, shared by every app worker"""
+
+    __tablename__ = 'forecasts'
+
+    location = db.Column(db.Text, primary_key=True)
+    payload = db.Column(JSONB, nullable=False)
+    fetched_at = db.Column(db.DateTime(timezone=True), nullable=False, server_default=db.func.now())
+
+
+class Fetch_claim(db.Model):
+    """an upstream fetch one app worker is running, the others wait for its
+    result instead of repeating it. see fetch_once"""
+
+    __tablename__ = 'fetch_claims'
+
+    key = db.Column(db.Text, primary_key=True)
+    claimed_until = db.Column(db.DateTime(timezone=True), nullable=False)
+
+
+class Crop_miss(db.Model):
+    """plant names OpenFarm had no crop for, not asked again for a while, see openfarm.find_plant"""
+
+    __tablename__ = 'crop_misses'
+
+    name = db.Column(db.Text, primary_key=True)
+    checked_at = db.Column(db.DateTime(timezone=True), nullable=False, server_default=db.func.now())
+
+
+class Activity(db.Model):
+    """something a user did that shows up in their followers' feeds, see timeline.py"""
+
+    __tablename__ = 'activities'
+    __table_args__ = (
+        db.Index('ix_activities_actor_id_id', 'actor_id', 'id'),
+        # the few activities read by pulling instead of from timeline_entries, per actor
+        db.Index('ix_activities_pulled_actor_id_id', 'actor_id', 'id',
+                 postgresql_where=db.text('NOT fanned_out')),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    actor_id = db.Column(db.Integer, db.ForeignKey("users.id", ondelete="cascade"), nullable=False)
+    verb = db.Column(db.Text, nullable=False)
+    garden_id = db.Column(db.Integer, db.ForeignKey("gardens.id", ondelete="cascade"))
+    plant_id = db.Column(db.Integer, db.ForeignKey("plants.id", ondelete="cascade"))
+    # false when the actor had too many followers to copy it into their timelines
+    fanned_out = db.Column(db.Boolean, nullable=False, default=True, server_default='true')
+    created_at = db.Column(db.DateTime(timezone=True), nullable=False, server_default=db.func.now())
+
+
+class Timeline_entry(db.Model):
+    """a follower's copy of an activity, their feed is a range of these"""
+
+    __tablename__ = 'timeline_entries'
+    __table_args__ = (
+        db.Index('ix_timeline_entries_activity_id', 'activity_id'),
+    )
+
+    user_id = db.Column(db.Integer, db.ForeignKey("users.id", ondelete="cascade"), primary_key=True)
+    activity_id = db.Column(db.Integer, db.ForeignKey("activities.id", ondelete="cascade"),
+                            primary_key=True)
+    # who did it, so unfollowing can drop their entries
+    actor_id = db.Column(db.Integer, nullable=False)
+
+
+def bump_version(model, row_id):
+    """mark a User, Plant or Garden as changed so cached copies of its pages go stale"""
+
+    bump_versions(model, [row_id])
+
+
+def bump_versions(model, row_ids):
+    """bump_version for a list, or a select, of ids"""
+
+    db.session.execute(db.update(model)
+                       .where(model.id.in_(row_ids))
+                       .values(version=model.version + 1)
+                       .execution_options(synchronize_session=False))
+
+
+def forget_memberships(user_id):
+    """drop the membership answers this request remembered for user_id"""
+
+    if has_app_context():
+        g.get('memberships', {}).pop(user_id, None)
+
+
+# single statement join table writes, no relationship collections are loaded
+
+# the column holding the user whose pages a link shows up on
+LINK_OWNERS = {
+    User_plant: 'user_id',
+    Saved_gardens: 'user_saved',
+    Follows: 'user_followed',
+}
+
+
+def add_link(model, **pair):
+    """INSERT a join table row unless the pair exists. True if a row was added"""
+
+    stmt = insert(model).values(**pair).on_conflict_do_nothing().returning(model.id)
+    changed = db.session.execute(stmt).first() is not None
+
+    if changed:
+        owner = pair[LINK_OWNERS[model]]
+        bump_version(User, owner)
+        forget_memberships(owner)
+    return changed
+
+
+def remove_link(model, **pair):
+    """DELETE a join table row. True if there was one"""
+
+    stmt = db.delete(model).where(*[getattr(model, column) == value
+                                    for column, value in pair.items()])
+    changed = db.session.execute(stmt).rowcount > 0
+
+    if changed:
+        owner = pair[LINK_OWNERS[model]]
+        bump_version(User, owner)
+        forget_memberships(owner)
+    return changed
+
+
+def add_garden_plant(user_id, garden_id, plant_id):
+    """add a plant to a garden, only if user_id owns the garden. True if a row was added"""
+
+    owned = db.select(db.literal(garden_id), db.literal(plant_id)).where(
+        db.exists().where(db.and_(Garden.id == garden_id, Garden.user_id == user_id)))
+
+    stmt = (insert(Garden_plant)
+            .from_select(['garden_id', 'plant_id'], owned)
+            .on_conflict_do_nothing()
+            .returning(Garden_plant.id))
+    changed = db.session.execute(stmt).first() is not None
+
+    if changed:
+        bump_version(Garden, garden_id)
+    return changed
+
+
+def add_garden_plants(garden_id, plant_ids):
+    """add many plants to a garden in one INSERT. returns the plant ids that were added"""
+
+    if not plant_ids:
+        return set()
+
+    stmt = (insert(Garden_plant)
+            .values([{'garden_id': garden_id, 'plant_id': plant_id} for plant_id in plant_ids])
+            .on_conflict_do_nothing()
+            .returning(Garden_plant.plant_id))
+    added = {row.plant_id for row in db.session.execute(stmt)}
+
+    if added:
+        bump_version(Garden, garden_id)
+    return added
+
+
+def remove_garden_plants(garden_id, plant_ids):
+    """remove many plants from a garden in one DELETE. returns the plant ids that were removed"""
+
+    if not plant_ids:
+        return set()
+
+    stmt = (db.delete(Garden_plant)
+            .where(Garden_plant.garden_id == garden_id, Garden_plant.plant_id.in_(plant_ids))
+            .returning(Garden_plant.plant_id))
+    removed = {row.plant_id for row in db.session.execute(stmt)}
+
+    if removed:
+        bump_version(Garden, garden_id)
+    return removed
+
+
+def find_plants(plant_ids=(), names=()):
+    """(id, name) rows for the plants matching any of the ids or names, in one query"""
+
+    return (db.session.query(Plant.id, Plant.name)
+            .filter(db.or_(Plant.id.in_(plant_ids), Plant.name.in_(names)))
+            .all())
+
+
+def release_connection():
+    """hand the session's connection back to the pool while we wait on
+    something slow, like an upstream API. the next query checks one out
+    again. nothing is committed, so there must be no unsaved changes.
+    loaded objects are detached but keep their loaded attributes, so load
+    anything a page needs from them before calling this"""
+
+    if has_app_context():
+        session = db.session
+        if session.new or session.dirty or session.deleted:
+            raise RuntimeError('release_connection() would drop unsaved changes')
+        session.close()
+
+
+def claim_fetch(key, lease):
+    """claim key's fetch for lease seconds, unless another worker's claim on
+    it is still live. True if we got it. commits"""
+
+    stmt = insert(Fetch_claim).values(key=key, claimed_until=db.func.now() + timedelta(seconds=lease))
+    claimed = db.session.execute(
+        stmt.on_conflict_do_update(index_elements=[Fetch_claim.key],
+                                   set_={'claimed_until': stmt.excluded.claimed_until},
+                                   where=Fetch_claim.claimed_until < db.func.now())
+        .returning(Fetch_claim.key)).first() is not None
+    db.session.commit()
+
+    return claimed
+
+
+def fetch_once(key, stored, fetch, store, lease=60):
+    """stored() if it isn't None, otherwise fetch() it and store() the result,
+    which fetch_once returns. only one worker fetches a key at a time: the
+    others wait for its result, polling stored(), and take over if its
+    claim outlives lease seconds. no database connection is held while
+    fetch() runs or while waiting"""
+
+    delay = 0.05
+    while True:
+        value = stored()
+        if value is not None:
+            return value
+        if claim_fetch(key, lease):
+            break
+        # another worker is fetching it
+        release_connection()
+        time.sleep(delay)
+        delay = min(delay * 2, 1)
+
+    try:
+        value = store(fetch())
+    except Exception:
+        # let a waiting worker try instead
+        db.session.rollback()
+        db.session.execute(db.delete(Fetch_claim).where(Fetch_claim.key == key))
+        db.session.commit()
+        raise
+
+    db.session.execute(db.delete(Fetch_claim).where(Fetch_claim.key == key))
+    db.session.commit()
+
+    return value
+
+
 def connect_db(app):
     """Connect to database."""
 
@@ -0,0 +1,167 @@
+"""Client for the OpenFarm crops API
+
+Plant pages for names that aren't saved locally yet add them from
+OpenFarm (find_plant). However many requests ask for a new name at once,
+OpenFarm is called for it once: requests in one worker share a single
+lookup, and workers take turns through models.fetch_once, the later ones
+finding the plant the first one stored. No database connection is held
+during the call or while waiting for another worker's. Names OpenFarm
+has no crop for are stored in crop_misses and not asked for again for
+CROP_MISS_TTL seconds.
+"""
+
+from datetime import timedelta
+
+from flask import current_app
+from sqlalchemy import func
+from sqlalchemy.dialects.postgresql import insert
+
+from cache import SingleFlight, TTLCache
+from http_client import client
+from models import db, Crop_miss, Plant, fetch_once, release_connection
+
+OPENFARM_URL = 'https://openfarm.cc/api/v1/crops/'
+
+# OpenFarm's placeholder image for crops without a photo
+ERROR_IMAGE = "/assets/baren_field_square-4a827e5f09156962937eb100e4484f87e1e788f28a7c9daefe2a9297711a562a.jpg"
+
+# crop search results keyed by normalized filter string
+crop_cache = TTLCache()
+
+# find_plant lookups running in this worker, by plant name
+plant_lookups = SingleFlight()
+
+
+def init_app(app):
+    """Read OpenFarm settings from app config and size the crop cache"""
+
+    app.config.setdefault('OPENFARM_URL', OPENFARM_URL)
+    app.config.setdefault('CROP_CACHE_SIZE', 512)
+    app.config.setdefault('CROP_CACHE_TTL', 60 * 60)
+    app.config.setdefault('CROP_CACHE_STALE_TTL', 24 * 60 * 60)
+    app.config.setdefault('CROP_MISS_TTL', 24 * 60 * 60)
+
+    crop_cache.configure(maxsize=app.config['CROP_CACHE_SIZE'],
+                         ttl=app.config['CROP_CACHE_TTL'],
+                         stale_ttl=app.config['CROP_CACHE_STALE_TTL'])
+
+
+def normalize_filter(search):
+    """'  Cherry   Tomato ' and 'cherry tomato' share one cache entry"""
+
+    return ' '.join(search.split()).lower()
+
+
+def fetch_crops(url, search):
+    """call the crops API directly, bypassing the cache.
+    raises http_client.UpstreamUnavailable when OpenFarm is down"""
+
+    return client.get_json(url, params={'filter': f'<{search}>'}, upstream='openfarm')
+
+
+def search_crops(search):
+    """crop API results for search, served from the cache when possible"""
+
+    search = normalize_filter(search)
+    url = current_app.config['OPENFARM_URL']
+
+    def load():
+        # nobody else can use our database connection while OpenFarm answers
+        release_connection()
+        return fetch_crops(url, search)
+
+    return crop_cache.get_or_load(search, load)
+
+
+def exact_match(results, name):
+    """attributes of the crop in search results named exactly name, or None"""
+
+    for result in results['data']:
+        if result['attributes']['name'] == name:
+            return result['attributes']
+    return None
+
+
+def local_plant_id(name):
+    return db.session.query(Plant.id).filter(Plant.name == name).scalar()
+
+
+def recent_miss(name, ttl):
+    """whether OpenFarm had no crop named name less than ttl seconds ago"""
+
+    return db.session.query(
+        db.session.query(Crop_miss)
+        .filter(Crop_miss.name == name,
+                Crop_miss.checked_at > func.now() - timedelta(seconds=ttl))
+        .exists()).scalar()
+
+
+def lookup_plant(name, url, miss_ttl, lease):
+    """id of the Plant named name, added from OpenFarm unless some worker
+    looked name up already. None when OpenFarm has no such crop"""
+
+    search = normalize_filter(name)
+
+    def stored():
+        # a 1-tuple, so a known miss isn't mistaken for nothing stored
+        plant_id = local_plant_id(name)
+        if plant_id or recent_miss(name, miss_ttl):
+            return (plant_id,)
+        return None
+
+    def fetch():
+        results = crop_cache.get(search)
+        if results is None:
+            results = fetch_crops(url, search)
+            crop_cache.set(search, results)
+        return results
+
+    def store(results):
+        attributes = exact_match(results, name)
+        if not attributes:
+            db.session.execute(insert(Crop_miss)
+                               .values(name=name)
+                               .on_conflict_do_update(index_elements=[Crop_miss.name],
+                                                      set_={'checked_at': func.now()}))
+            return (None,)
+
+        # import_plants may have added it meanwhile, that row wins
+        db.session.execute(insert(Plant)
+                           .values(**plant_fields(attributes))
+                           .on_conflict_do_nothing(index_elements=[Plant.name]))
+        db.session.execute(db.delete(Crop_miss).where(Crop_miss.name == name))
+        return (local_plant_id(name),)
+
+    plant_id, = fetch_once(f'plant:{name}', stored, fetch, store, lease)
+    return plant_id
+
+
+def find_plant(name):
+    """the Plant named exactly name, added from OpenFarm the first time it's
+    asked for. None when OpenFarm has no such crop.
+    raises http_client.UpstreamUnavailable when OpenFarm is down"""
+
+    config = current_app.config
+
+    # don't hold a database connection while waiting on another request's lookup
+    release_connection()
+    plant_id = plant_lookups.do(name, lambda: lookup_plant(name, config['OPENFARM_URL'],
+                                                           config['CROP_MISS_TTL'],
+                                                           config['FETCH_CLAIM_TTL']))
+
+    return Plant.query.get(plant_id) if plant_id else None
+
+
+def plant_fields(attributes):
+    """Plant column values for a crop record's attributes"""
+
+    if attributes['main_image_path'] == ERROR_IMAGE:
+        image = '/static/unknown-image.webp'
+    else:
+        image = attributes['main_image_path']
+
+    return {'name': attributes['name'],
+            'binomial_name': attributes['binomial_name'],
+            'description': attributes['description'],
+            'growing_method': attributes['sowing_method'],
+            'image': image}
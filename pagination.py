@@ -0,0 +1,39 @@
+"""Keyset (cursor) pagination for listings
+
+Pages are ordered by a unique column and continue from the last value
+seen ("WHERE column > cursor LIMIT n") rather than with OFFSET, so every
+page costs one index range scan no matter how deep it is.
+"""
+
+
+class Page:
+    """one page of results and the cursor for the page after it (None on the last page)"""
+
+    def __init__(self, items, next_cursor):
+        self.items = items
+        self.next_cursor = next_cursor
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+
+def paginate(query, column, after=None, per_page=50, descending=False):
+    """the page of query that follows cursor `after`, ordered by unique `column`"""
+
+    if after is not None:
+        query = query.filter(column < after if descending else column > after)
+
+    items = (query
+             .order_by(column.desc() if descending else column)
+             .limit(per_page + 1)
+             .all())
+
+    next_cursor = None
+    if len(items) > per_page:
+        items = items[:per_page]
+        next_cursor = getattr(items[-1], column.key)
+
+    return Page(items, next_cursor)
@@ -0,0 +1,107 @@
+"""Password hashing off the request thread
+
+bcrypt hash and verify calls run on a small thread pool (bcrypt releases
+the GIL while it works) with at most PASSWORD_HASH_MAX_PENDING calls
+queued or running. Past that callers get HashingBusy right away instead
+of piling up behind a login burst, as do calls still waiting when the
+timeout runs out. Under gevent workers the pool is gevent's pool of real
+threads, so hashing never stalls the worker's other greenlets.
+
+New hashes use BCRYPT_LOG_ROUNDS and older, cheaper hashes are upgraded
+the next time their owner logs in.
+"""
+
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+
+from flask_bcrypt import generate_password_hash, check_password_hash
+
+
+def make_pool(workers):
+    try:
+        from gevent import monkey
+    except ImportError:
+        monkey = None
+
+    if monkey and monkey.is_module_patched('threading'):
+        # patched threads are greenlets, bcrypt would block the whole worker
+        from gevent.threadpool import ThreadPoolExecutor as NativeThreadPoolExecutor
+        return NativeThreadPoolExecutor(max_workers=workers)
+
+    return ThreadPoolExecutor(max_workers=workers, thread_name_prefix='bcrypt')
+
+
+class HashingBusy(Exception):
+    """too many password hashes are already queued"""
+
+
+class PasswordHasher:
+    """bcrypt hash/verify on a bounded worker pool"""
+
+    def __init__(self, workers=2, max_pending=16, rounds=12, timeout=30):
+        self.rounds = rounds
+        self.timeout = timeout
+        self._pool = make_pool(workers)
+        self._pending = threading.BoundedSemaphore(max_pending)
+
+    def configure(self, workers=None, max_pending=None, rounds=None, timeout=None):
+        if rounds is not None:
+            self.rounds = rounds
+        if timeout is not None:
+            self.timeout = timeout
+        if workers is not None:
+            self._pool.shutdown(wait=False)
+            self._pool = make_pool(workers)
+        if max_pending is not None:
+            self._pending = threading.BoundedSemaphore(max_pending)
+
+    def _run(self, fn, *args):
+        pending = self._pending
+        if not pending.acquire(blocking=False):
+            raise HashingBusy()
+
+        try:
+            future = self._pool.submit(fn, *args)
+        except Exception:
+            pending.release()
+            raise
+
+        future.add_done_callback(lambda _: pending.release())
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeout:
+            # the hash keeps its pending slot until it finishes
+            raise HashingBusy()
+
+    def hash(self, password, rounds=None):
+        """bcrypt hash of password at the configured cost"""
+
+        return self._run(generate_password_hash, password, rounds or self.rounds).decode('UTF-8')
+
+    def verify(self, hashed, password):
+        """does password match the stored hash?"""
+
+        return self._run(check_password_hash, hashed, password)
+
+    def needs_rehash(self, hashed):
+        """was hashed made with a lower cost than we use now? ($2b$<cost>$...)"""
+
+        try:
+            return int(hashed.split('$')[2]) < self.rounds
+        except (IndexError, ValueError):
+            return True
+
+
+hasher = PasswordHasher()
+
+
+def init_app(app):
+    """Read the work factor and pool limits from app config"""
+
+    app.config.setdefault('BCRYPT_LOG_ROUNDS', 12)
+    app.config.setdefault('PASSWORD_HASH_WORKERS', 2)
+    app.config.setdefault('PASSWORD_HASH_MAX_PENDING', 16)
+
+    hasher.configure(workers=app.config['PASSWORD_HASH_WORKERS'],
+                     max_pending=app.config['PASSWORD_HASH_MAX_PENDING'],
+                     rounds=app.config['BCRYPT_LOG_ROUNDS'])
@@ -0,0 +1,221 @@
+"""Plant suggestions: "users who saved this also saved"
+
+plant_cooccurrence holds a score for every pair of plants that go
+together: how many users saved both, plus how many gardens have both.
+It is symmetric, (a, b) and (b, a) carry the same score.
+
+Saves, unsaves and garden plant changes adjust the pairs they touch with
+one upsert in the same transaction (record_user_plants and
+record_garden_plants), so the table never needs rebuilding to stay
+current. Running
+
+    python recommend.py
+
+rebuilds it from user_plants and garden_plants anyway, as a sparse
+baskets x plants matrix A whose co-occurrence counts are A.T @ A. Do it
+once after the migration and whenever you want to rule out drift.
+
+Suggestions are read through the (plant_id, score) index and kept in
+suggestion_cache for SUGGESTION_CACHE_TTL seconds, so a page asking for
+them again costs one dict lookup.
+"""
+
+import argparse
+import time
+from collections import namedtuple
+
+from flask import current_app
+from sqlalchemy import text
+
+from cache import TTLCache
+from models import db, Plant, Plant_cooccurrence, User_plant
+
+# what a plant card needs, cached instead of Plant rows, which belong to one session
+Suggestion = namedtuple('Suggestion', ['id', 'name', 'image', 'version'])
+
+suggestion_cache = TTLCache(maxsize=5000, ttl=5 * 60)
+
+# score every pair between the changed plants and the rest of the basket,
+# and among the changed plants themselves, by :delta. the basket is read
+# after the change, so removed plants are no longer in it
+ADJUST_PAIRS = """
+WITH changed AS (
+    SELECT DISTINCT unnest(CAST(:changed AS INTEGER[])) AS id
+), others AS (
+    {basket}
+    EXCEPT
+    SELECT id FROM changed
+), pairs AS (
+    SELECT c.id AS plant_id, o.id AS other_id FROM changed c CROSS JOIN others o
+    UNION ALL
+    SELECT o.id, c.id FROM changed c CROSS JOIN others o
+    UNION ALL
+    SELECT a.id, b.id FROM changed a JOIN changed b ON a.id <> b.id
+)
+INSERT INTO plant_cooccurrence (plant_id, other_id, score)
+SELECT plant_id, other_id, :delta * count(*)
+FROM pairs
+GROUP BY plant_id, other_id
+-- a fixed order, so concurrent saves lock rows in the same order
+ORDER BY plant_id, other_id
+ON CONFLICT (plant_id, other_id) DO UPDATE
+SET score = plant_cooccurrence.score + EXCLUDED.score
+"""
+
+USER_BASKET = "SELECT plant_id AS id FROM user_plants WHERE user_id = :basket"
+GARDEN_BASKET = "SELECT plant_id AS id FROM garden_plants WHERE garden_id = :basket"
+
+
+def init_app(app):
+    """Read suggestion settings from app config and size the cache"""
+
+    app.config.setdefault('SUGGESTION_COUNT', 6)
+    app.config.setdefault('SUGGESTION_CACHE_SIZE', 5000)
+    app.config.setdefault('SUGGESTION_CACHE_TTL', 5 * 60)
+
+    suggestion_cache.configure(maxsize=app.config['SUGGESTION_CACHE_SIZE'],
+                               ttl=app.config['SUGGESTION_CACHE_TTL'])
+
+
+def adjust_pairs(basket, basket_id, plant_ids, delta):
+    if not plant_ids:
+        return
+
+    db.session.execute(text(ADJUST_PAIRS.format(basket=basket)),
+                       {'changed': sorted(plant_ids), 'basket': basket_id, 'delta': delta})
+
+
+def record_user_plants(user_id, plant_ids, delta):
+    """after user_id saved (delta=1) or unsaved (delta=-1) plant_ids"""
+
+    adjust_pairs(USER_BASKET, user_id, plant_ids, delta)
+    suggestion_cache.delete(('user', user_id))
+
+
+def record_garden_plants(garden_id, plant_ids, delta):
+    """after plant_ids were added to (delta=1) or removed from (delta=-1) garden_id"""
+
+    adjust_pairs(GARDEN_BASKET, garden_id, plant_ids, delta)
+
+
+def load_suggestions(query):
+    """Suggestions for (plant id, score) rows, best first"""
+
+    ranked = query.subquery()
+    rows = (db.session
+            .query(Plant.id, Plant.name, Plant.image, Plant.version)
+            .join(ranked, ranked.c.plant_id == Plant.id)
+            .order_by(ranked.c.score.desc(), Plant.id)
+            .all())
+
+    return [Suggestion(*row) for row in rows]
+
+
+def suggestions_for_plant(plant_id):
+    """plants most often saved or planted with plant_id"""
+
+    count = current_app.config['SUGGESTION_COUNT']
+
+    def load():
+        return load_suggestions(
+            db.session.query(Plant_cooccurrence.other_id.label('plant_id'),
+                             Plant_cooccurrence.score)
+            .filter(Plant_cooccurrence.plant_id == plant_id, Plant_cooccurrence.score > 0)
+            .order_by(Plant_cooccurrence.score.desc(), Plant_cooccurrence.other_id)
+            .limit(count))
+
+    return suggestion_cache.get_or_load(('plant', plant_id), load)
+
+
+def suggestions_for_user(user_id):
+    """plants that go best with everything user_id saved, leaving out what they saved"""
+
+    count = current_app.config['SUGGESTION_COUNT']
+
+    def load():
+        saved = db.select(User_plant.plant_id).where(User_plant.user_id == user_id)
+        score = db.func.sum(Plant_cooccurrence.score)
+
+        return load_suggestions(
+            db.session.query(Plant_cooccurrence.other_id.label('plant_id'), score.label('score'))
+            .filter(Plant_cooccurrence.plant_id.in_(saved),
+                    Plant_cooccurrence.other_id.notin_(saved),
+                    Plant_cooccurrence.score > 0)
+            .group_by(Plant_cooccurrence.other_id)
+            .order_by(score.desc(), Plant_cooccurrence.other_id)
+            .limit(count))
+
+    return suggestion_cache.get_or_load(('user', user_id), load)
+
+
+def cooccurrence_matrix(baskets):
+    """(plant ids, sparse plants x plants counts) for (basket, plant id) pairs.
+    the diagonal is left out"""
+
+    import numpy as np
+    from scipy import sparse
+
+    pairs = np.array(baskets, dtype=np.int64).reshape(-1, 2)
+    basket_ids, basket_index = np.unique(pairs[:, 0], return_inverse=True)
+    plant_ids, plant_index = np.unique(pairs[:, 1], return_inverse=True)
+
+    incidence = sparse.csr_matrix(
+        (np.ones(len(pairs), dtype=np.int32), (basket_index, plant_index)),
+        shape=(len(basket_ids), len(plant_ids)))
+
+    counts = (incidence.T @ incidence).tocoo()
+    off_diagonal = counts.row != counts.col
+
+    return plant_ids, sparse.coo_matrix(
+        (counts.data[off_diagonal], (counts.row[off_diagonal], counts.col[off_diagonal])),
+        shape=counts.shape)
+
+
+def rebuild(batch_size=10000):
+    """replace plant_cooccurrence with counts computed from scratch, returns the number of pairs"""
+
+    # writers wait until we commit, then apply their changes on top of ours
+    db.session.execute(text("LOCK TABLE plant_cooccurrence IN SHARE ROW EXCLUSIVE MODE"))
+
+    # users and gardens are separate baskets: keep their ids apart
+    baskets = db.session.execute(text("""
+        SELECT 2 * user_id, plant_id FROM user_plants
+        UNION ALL
+        SELECT 2 * garden_id + 1, plant_id FROM garden_plants""")).fetchall()
+
+    db.session.execute(text("DELETE FROM plant_cooccurrence"))
+
+    written = 0
+    if baskets:
+        plant_ids, counts = cooccurrence_matrix(baskets)
+        rows = list(zip(plant_ids[counts.row].tolist(), plant_ids[counts.col].tolist(),
+                        counts.data.tolist()))
+
+        for start in range(0, len(rows), batch_size):
+            db.session.execute(Plant_cooccurrence.__table__.insert(),
+                               [{'plant_id': plant_id, 'other_id': other_id, 'score': score}
+                                for plant_id, other_id, score in rows[start:start + batch_size]])
+        written = len(rows)
+
+    db.session.commit()
+    suggestion_cache.clear()
+
+    return written
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Rebuild plant_cooccurrence from the saved and garden plants')
+    parser.add_argument('--batch-size', type=int, default=10000, help='pairs per insert')
+    args = parser.parse_args(argv)
+
+    from app import app
+
+    start = time.perf_counter()
+    with app.app_context():
+        written = rebuild(args.batch_size)
+
+    print(f'wrote {written} plant pairs in {time.perf_counter() - start:.1f}s')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+"""Local search over the plants and users tables"""
+
+from sqlalchemy import func, or_, case, text
+
+from models import db, Plant, User
+
+_extensions = {}
+
+
+def has_extension(name):
+    """is the postgres extension installed? checked once per process"""
+
+    if name not in _extensions:
+        _extensions[name] = db.session.execute(
+            text("SELECT 1 FROM pg_extension WHERE extname = :name"),
+            {'name': name}).first() is not None
+    return _extensions[name]
+
+
+def like_pattern(search):
+    """%search% with LIKE wildcards in the search escaped"""
+
+    escaped = search.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    return f'%{escaped}%'
+
+
+def search_plants(search, limit=50):
+    """Plants matching search, best match first.
+
+    Full-text matches on the weighted search_vector are ranked by ts_rank,
+    with exact and substring name matches first. When pg_trgm is installed
+    near-miss spellings match too, ranked by name similarity.
+    """
+
+    search = ' '.join(search.split())
+    query = func.websearch_to_tsquery('english', search)
+    pattern = like_pattern(search)
+
+    matches = [Plant.search_vector.op('@@')(query),
+               Plant.name.ilike(pattern),
+               Plant.binomial_name.ilike(pattern)]
+    ranking = [case((func.lower(Plant.name) == search.lower(), 0),
+                    (Plant.name.ilike(pattern), 1),
+                    else_=2),
+               func.ts_rank(Plant.search_vector, query).desc()]
+
+    if has_extension('pg_trgm'):
+        matches.append(Plant.name.op('%')(search))
+        ranking.append(func.similarity(Plant.name, search).desc())
+
+    return (Plant
+            .query
+            .filter(or_(*matches))
+            .order_by(*ranking, Plant.name)
+            .limit(limit)
+            .all())
+
+
+def search_users(search, limit=50):
+    """Users whose username contains search in any case, best match first.
+
+    Exact matches rank first, then the rest by trigram similarity. When
+    pg_trgm is installed near-miss spellings match too, and its GIN index
+    on username serves both the ILIKE and the similarity lookups. Without
+    it shorter (closer) usernames rank first.
+    """
+
+    search = search.strip()
+    pattern = like_pattern(search)
+
+    matches = [User.username.ilike(pattern)]
+    ranking = [case((func.lower(User.username) == search.lower(), 0), else_=1)]
+
+    if has_extension('pg_trgm'):
+        matches.append(User.username.op('%')(search))
+        ranking.append(func.similarity(User.username, search).desc())
+    else:
+        ranking.append(func.length(User.username))
+
+    return (User
+            .query
+            .filter(or_(*matches))
+            .order_by(*ranking, User.username)
+            .limit(limit)
+            .all())
@@ -2,6 +2,10 @@
 
 from models import db, Follows, User, Plant, Garden, User_plant, Garden_plant, Saved_gardens
 from app import app
+from migrate import run_migrations
 
 db.drop_all()
-db.create_all()
\ No newline at end of file
+# migrations are re-applied on top of the fresh tables
+db.engine.execute("DROP TABLE IF EXISTS schema_migrations")
+db.create_all()
+run_migrations(db.engine)
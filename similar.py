@@ -0,0 +1,205 @@
+"""Similar gardens: MinHash signatures of each garden's plants in an LSH index
+
+A garden is the set of its plant ids. Its signature is SIGNATURE_SIZE
+MinHash values, the smallest (a * plant_id + b) mod PRIME over its plants
+for each of SIGNATURE_SIZE fixed (a, b) pairs. Two gardens agree on a
+position with probability equal to their Jaccard similarity.
+
+The signature is cut into BANDS bands. Each band is hashed to a bucket in
+lsh_buckets, keyed (band, bucket). Gardens sharing any bucket are
+candidates, and most pairs of gardens never share one. With 16 bands of 4
+rows, gardens that are half alike become candidates about 65% of the
+time, 80% alike almost always, 20% alike under 3% of the time.
+
+A lookup reads this garden's BANDS buckets and at most
+CANDIDATES_PER_BUCKET gardens from each, then ranks the candidates by how
+much of their stored signature matches. Its cost doesn't grow with the
+number of gardens. index_garden() runs whenever a garden's plants change.
+`python similar.py` indexes every garden, once after the migration.
+"""
+
+import argparse
+import hashlib
+import random
+import struct
+import time
+from collections import namedtuple
+
+from flask import current_app
+from sqlalchemy.dialects.postgresql import insert
+
+from cache import TTLCache
+from models import db, Garden, Garden_plant, Garden_signature, Lsh_bucket
+
+PRIME = (1 << 31) - 1
+SIGNATURE_SIZE = 64
+BANDS = 16
+ROWS = SIGNATURE_SIZE // BANDS
+CANDIDATES_PER_BUCKET = 100
+
+# the (a, b) of each MinHash function. changing them (or SIGNATURE_SIZE or
+# BANDS) means re-running `python similar.py`
+_random = random.Random(20211001)
+HASHES = [(_random.randrange(1, PRIME), _random.randrange(0, PRIME)) for _ in range(SIGNATURE_SIZE)]
+
+# what a garden card needs, cached instead of Garden rows, which belong to one session
+SimilarGarden = namedtuple('SimilarGarden', ['id', 'name', 'cover_image', 'version', 'similarity'])
+
+similar_cache = TTLCache(maxsize=5000, ttl=5 * 60)
+
+
+def init_app(app):
+    """Read similar garden settings from app config and size the cache"""
+
+    app.config.setdefault('SIMILAR_GARDEN_COUNT', 6)
+    app.config.setdefault('SIMILAR_CACHE_SIZE', 5000)
+    app.config.setdefault('SIMILAR_CACHE_TTL', 5 * 60)
+
+    similar_cache.configure(maxsize=app.config['SIMILAR_CACHE_SIZE'],
+                            ttl=app.config['SIMILAR_CACHE_TTL'])
+
+
+def signature(plant_ids):
+    """MinHash signature of a non-empty set of plant ids"""
+
+    return [min((a * plant_id + b) % PRIME for plant_id in plant_ids) for a, b in HASHES]
+
+
+def band_buckets(sig):
+    """(band, bucket) for each band of a signature. buckets are stable 64 bit
+    hashes of the band's values, so every process agrees on them"""
+
+    buckets = []
+    for band in range(BANDS):
+        values = sig[band * ROWS:(band + 1) * ROWS]
+        digest = hashlib.blake2b(struct.pack(f'<{ROWS}I', *values), digest_size=8).digest()
+        buckets.append((band, struct.unpack('<q', digest)[0]))
+
+    return buckets
+
+
+def estimated_similarity(sig, other):
+    """share of positions where two signatures agree, estimates their gardens' Jaccard similarity"""
+
+    return sum(a == b for a, b in zip(sig, other)) / len(sig)
+
+
+def index_garden(garden_id):
+    """recompute garden_id's signature and buckets from its current plants.
+    commits with the caller's transaction, which has already bumped the
+    garden's version: that row lock keeps two changes from indexing at once"""
+
+    plant_ids = [plant_id for plant_id, in
+                 db.session.query(Garden_plant.plant_id).filter(Garden_plant.garden_id == garden_id)]
+
+    db.session.execute(db.delete(Lsh_bucket).where(Lsh_bucket.garden_id == garden_id))
+
+    if not plant_ids:
+        # an empty garden is like nothing
+        db.session.execute(db.delete(Garden_signature).where(Garden_signature.garden_id == garden_id))
+        return
+
+    sig = signature(plant_ids)
+    stmt = insert(Garden_signature).values(garden_id=garden_id, signature=sig)
+    db.session.execute(stmt.on_conflict_do_update(index_elements=[Garden_signature.garden_id],
+                                                  set_={'signature': stmt.excluded.signature}))
+    db.session.execute(insert(Lsh_bucket).values([{'band': band, 'bucket': bucket, 'garden_id': garden_id}
+                                                  for band, bucket in band_buckets(sig)]))
+
+
+def candidates(garden_id, limit):
+    """gardens sharing a bucket with garden_id, those sharing the most first"""
+
+    mine = db.aliased(Lsh_bucket)
+    other = db.aliased(Lsh_bucket)
+
+    # no more than CANDIDATES_PER_BUCKET from any one bucket, however crowded
+    neighbours = (db.select(other.garden_id)
+                  .where(other.band == mine.band,
+                         other.bucket == mine.bucket,
+                         other.garden_id != garden_id)
+                  .limit(CANDIDATES_PER_BUCKET)
+                  .lateral())
+
+    shared = db.func.count()
+    return [candidate for candidate, in
+            db.session.execute(db.select(neighbours.c.garden_id)
+                               .select_from(mine)
+                               .join(neighbours, db.true())
+                               .where(mine.garden_id == garden_id)
+                               .group_by(neighbours.c.garden_id)
+                               .order_by(shared.desc(), neighbours.c.garden_id)
+                               .limit(limit))]
+
+
+def similar_gardens(garden_id):
+    """the gardens whose plants are most like garden_id's, most similar first"""
+
+    count = current_app.config['SIMILAR_GARDEN_COUNT']
+
+    def load():
+        found = candidates(garden_id, limit=count * 4)
+        if not found:
+            return []
+
+        rows = (db.session
+                .query(Garden.id, Garden.name, Garden.cover_image, Garden.version,
+                       Garden_signature.signature)
+                .join(Garden_signature, Garden_signature.garden_id == Garden.id)
+                .filter(Garden.id.in_(found + [garden_id]))
+                .all())
+        mine = next((row.signature for row in rows if row.id == garden_id), None)
+        if mine is None:
+            return []
+
+        ranked = [SimilarGarden(row.id, row.name, row.cover_image, row.version,
+                                estimated_similarity(mine, row.signature))
+                  for row in rows if row.id != garden_id]
+        ranked.sort(key=lambda garden: (-garden.similarity, garden.id))
+
+        return ranked[:count]
+
+    return similar_cache.get_or_load(garden_id, load)
+
+
+def index_all(batch_size=1000):
+    """index every garden, returns how many were indexed"""
+
+    indexed = 0
+    after = 0
+    while True:
+        garden_ids = [garden_id for garden_id, in
+                      db.session.query(Garden.id)
+                      .filter(Garden.id > after)
+                      .order_by(Garden.id)
+                      .limit(batch_size)]
+        if not garden_ids:
+            break
+
+        for garden_id in garden_ids:
+            index_garden(garden_id)
+        db.session.commit()
+
+        indexed += len(garden_ids)
+        after = garden_ids[-1]
+
+    similar_cache.clear()
+    return indexed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Index every garden for similar garden lookups')
+    parser.add_argument('--batch-size', type=int, default=1000, help='gardens per transaction')
+    args = parser.parse_args(argv)
+
+    from app import app
+
+    start = time.perf_counter()
+    with app.app_context():
+        indexed = index_all(args.batch_size)
+
+    print(f'indexed {indexed} gardens in {time.perf_counter() - start:.1f}s')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+# run these tests like: python -m unittest test_api.py
+
+
+import os
+from unittest import TestCase
+
+from models import db, User, Plant, Garden, Garden_plant, Follows, User_plant
+
+os.environ['DATABASE_URL'] = "postgresql:///garden-test"
+os.environ['APP_CONFIG'] = 'test'
+
+from app import app
+from identity import user_cache
+
+
+class ApiTestCase(TestCase):
+    """tests for the /api/v1 JSON API"""
+
+    def setUp(self):
+        db.drop_all()
+        db.create_all()
+        user_cache.clear()
+
+        self.client = app.test_client()
+
+        u1 = User.signup("test1", "test1@test.com", "password", None, 'Baltimore')
+        u1.id = 1111
+        u2 = User.signup("test2", "test2@test.com", "password", None, 'location')
+        u2.id = 2222
+        db.session.commit()
+
+        db.session.add_all([Plant(name='Sunflower', image='sun.jpg', id=1),
+                            Plant(name='Tomato', image='tomato.jpg', id=2),
+                            Plant(name='Basil', id=3),
+                            Garden(user_id=1111, username='test1', name='mygarden', id=1234),
+                            Follows(user_followed=1111, user_following=2222)])
+        db.session.commit()
+        db.session.add_all([Garden_plant(garden_id=1234, plant_id=2),
+                            Garden_plant(garden_id=1234, plant_id=1),
+                            User_plant(user_id=1111, plant_id=3)])
+        db.session.commit()
+
+    def tearDown(self):
+        db.session.rollback()
+
+    def login(self, user_id=1111):
+        with self.client.session_transaction() as change_session:
+            change_session['current_user'] = user_id
+
+    def test_list_plants_paged(self):
+        first = self.client.get('/api/v1/plants?limit=2&fields=name').json
+        second = self.client.get(f"/api/v1/plants?limit=2&fields=name&after={first['next']}").json
+
+        self.assertEqual(first['data'], [{'id': 1, 'name': 'Sunflower'}, {'id': 2, 'name': 'Tomato'}])
+        self.assertEqual(second, {'data': [{'id': 3, 'name': 'Basil'}], 'next': None})
+
+    def test_unknown_field(self):
+        resp = self.client.get('/api/v1/plants/1?fields=name,password')
+
+        self.assertEqual(resp.status_code, 400)
+        self.assertEqual(resp.json, {'error': 'Unknown fields: password'})
+
+    def test_missing_plant(self):
+        resp = self.client.get('/api/v1/plants/99')
+
+        self.assertEqual(resp.status_code, 404)
+        self.assertIn('error', resp.json)
+
+    def test_garden_with_plants(self):
+        """a garden's plants come in the order they were added, with its cover image"""
+
+        data = self.client.get('/api/v1/gardens/1234').json['data']
+
+        self.assertEqual(data['cover_image'], 'tomato.jpg')
+        self.assertEqual(data['plants'], [{'id': 2, 'name': 'Tomato', 'image': 'tomato.jpg'},
+                                          {'id': 1, 'name': 'Sunflower', 'image': 'sun.jpg'}])
+
+        sparse = self.client.get('/api/v1/gardens/1234?fields=name').json['data']
+        self.assertEqual(sparse, {'id': 1234, 'name': 'mygarden'})
+
+    def test_user_never_exposes_email_or_password(self):
+        data = self.client.get('/api/v1/users/1111').json['data']
+
+        self.assertEqual(data['username'], 'test1')
+        self.assertNotIn('email', data)
+        self.assertNotIn('password', data)
+
+    def test_follows(self):
+        following = self.client.get('/api/v1/users/1111/following?fields=username').json
+        followers = self.client.get('/api/v1/users/2222/followers?fields=username').json
+
+        self.assertEqual(following['data'], [{'id': 2222, 'username': 'test2'}])
+        self.assertEqual(followers['data'], [{'id': 1111, 'username': 'test1'}])
+        self.assertEqual(self.client.get('/api/v1/users/99/following').status_code, 404)
+
+    def test_saved_plants_need_login(self):
+        self.assertEqual(self.client.get('/api/v1/me/plants').status_code, 401)
+
+        self.login()
+        resp = self.client.get('/api/v1/me/plants?fields=name')
+
+        self.assertEqual(resp.json['data'], [{'id': 3, 'name': 'Basil'}])
@@ -0,0 +1,132 @@
+# run these tests like: python -m unittest test_cache.py
+
+
+import time
+import threading
+from unittest import TestCase
+
+from cache import SingleFlight, TTLCache
+from openfarm import normalize_filter
+
+
+class TTLCacheTestCase(TestCase):
+    """unit tests for the in-process TTL/LRU cache"""
+
+    def test_get_or_load_counts_hits_and_misses(self):
+        cache = TTLCache(maxsize=10, ttl=60)
+        calls = []
+
+        def loader():
+            calls.append(1)
+            return 'tomato'
+
+        self.assertEqual(cache.get_or_load('tomato', loader), 'tomato')
+        self.assertEqual(cache.get_or_load('tomato', loader), 'tomato')
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(cache.stats()['hits'], 1)
+        self.assertEqual(cache.stats()['misses'], 1)
+
+    def test_concurrent_misses_share_one_load(self):
+        cache = TTLCache(maxsize=10, ttl=60)
+        release = threading.Event()
+        calls = []
+
+        def loader():
+            calls.append(1)
+            release.wait(5)
+            return 'tomato'
+
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(cache.get_or_load('tomato', loader)))
+                   for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        for _ in range(100):
+            if cache._loads.shared == 4:
+                break
+            time.sleep(0.01)
+        release.set()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(results, ['tomato'] * 5)
+        self.assertEqual(len(calls), 1)
+
+    def test_lru_eviction(self):
+        cache = TTLCache(maxsize=2, ttl=60)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.get('a')
+        cache.set('c', 3)
+
+        self.assertEqual(cache.get('a'), 1)
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('c'), 3)
+
+    def test_expired_entry_is_a_miss(self):
+        cache = TTLCache(maxsize=2, ttl=0.01)
+        cache.set('a', 1)
+        time.sleep(0.02)
+
+        self.assertIsNone(cache.get('a'))
+
+    def test_stale_entry_served_while_refreshing(self):
+        cache = TTLCache(maxsize=2, ttl=60, stale_ttl=60)
+        cache.set('a', 'old', ttl=0.01)
+        time.sleep(0.02)
+
+        refreshed = threading.Event()
+
+        def loader():
+            refreshed.set()
+            return 'new'
+
+        self.assertEqual(cache.get_or_load('a', loader), 'old')
+        self.assertTrue(refreshed.wait(1))
+        for _ in range(100):
+            if cache.get('a') == 'new':
+                break
+            time.sleep(0.01)
+
+        self.assertEqual(cache.get('a'), 'new')
+        self.assertEqual(cache.stats()['stale_hits'], 1)
+
+    def test_single_flight_shares_errors_and_forgets(self):
+        flight = SingleFlight()
+        started = threading.Event()
+        release = threading.Event()
+
+        def fail():
+            started.set()
+            release.wait(5)
+            raise ValueError('down')
+
+        errors = []
+
+        def call():
+            try:
+                flight.do('tomato', fail)
+            except ValueError as exc:
+                errors.append(exc)
+
+        leader = threading.Thread(target=call)
+        leader.start()
+        started.wait(5)
+        follower = threading.Thread(target=call)
+        follower.start()
+        for _ in range(100):
+            if flight.shared:
+                break
+            time.sleep(0.01)
+        release.set()
+        leader.join()
+        follower.join()
+
+        self.assertEqual(len(errors), 2)
+        self.assertIs(errors[0], errors[1])
+        # finished calls aren't remembered
+        self.assertEqual(flight.do('tomato', lambda: 'ok'), 'ok')
+
+    def test_normalize_filter(self):
+        self.assertEqual(normalize_filter('  Cherry   Tomato '), 'cherry tomato')
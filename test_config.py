@@ -0,0 +1,62 @@
+# run these tests like: python -m unittest test_config.py
+
+
+import os
+import tempfile
+from unittest import TestCase
+
+from models import db
+
+os.environ['DATABASE_URL'] = "postgresql:///garden-test"
+os.environ['APP_CONFIG'] = 'test'
+
+from app import app, create_app, warm_pool
+from config import ProductionConfig
+
+
+class CreateAppTestCase(TestCase):
+    """tests for the app factory and its profiles"""
+
+    def tearDown(self):
+        # create_app points the shared db at the newest app
+        db.app = app
+
+    def test_test_profile(self):
+        self.assertTrue(app.testing)
+        self.assertFalse(app.config['WTF_CSRF_ENABLED'])
+        self.assertNotIn('DEBUG_TB_ENABLED', app.config)
+
+    def test_unknown_profile(self):
+        with self.assertRaisesRegex(ValueError, "'staging'.*dev, test, prod"):
+            create_app('staging')
+
+    def test_dev_profile_loads_toolbar(self):
+        dev = create_app('dev')
+
+        self.assertIn('DEBUG_TB_ENABLED', dev.config)
+
+    def test_prod_profile_precompiles_templates(self):
+        class Prod(ProductionConfig):
+            SQLALCHEMY_DATABASE_URI = app.config['SQLALCHEMY_DATABASE_URI']
+            TEMPLATE_CACHE_DIR = tempfile.mkdtemp()
+
+        prod = create_app(Prod)
+
+        self.assertNotIn('DEBUG_TB_ENABLED', prod.config)
+        self.assertTrue(os.listdir(Prod.TEMPLATE_CACHE_DIR))
+        self.assertIn('BOOT_SECONDS', prod.config)
+
+        with prod.test_client() as client:
+            self.assertEqual(client.get('/').status_code, 200)
+
+    def test_warm_pool(self):
+        class Warm(ProductionConfig):
+            SQLALCHEMY_DATABASE_URI = app.config['SQLALCHEMY_DATABASE_URI']
+            PRECOMPILE_TEMPLATES = False
+            POOL_WARM_SIZE = 2
+
+        warm = create_app(Warm)
+        warm_pool(warm)
+
+        with warm.app_context():
+            self.assertEqual(db.engine.pool.checkedin(), 2)
@@ -0,0 +1,62 @@
+# run these tests like: python -m unittest test_fragments.py
+
+
+import os
+from unittest import TestCase
+from unittest.mock import patch
+
+from models import Plant, Garden
+
+os.environ['DATABASE_URL'] = "postgresql:///garden-test"
+os.environ['APP_CONFIG'] = 'test'
+
+from app import app
+from fragments import fragment_cache, plant_cards, garden_cards
+
+
+class FragmentCacheTestCase(TestCase):
+    """unit tests for the cached plant and garden cards"""
+
+    def setUp(self):
+        fragment_cache.clear()
+        self.ctx = app.app_context()
+        self.ctx.push()
+
+    def tearDown(self):
+        self.ctx.pop()
+
+    def test_reuses_card_for_same_version(self):
+        plant = Plant(id=1, version=1, name='Sunflower', image='sun.jpg')
+        plant_cards([plant])
+
+        plant.name = 'changed'
+        with patch.object(app.jinja_env, 'get_template') as get_template:
+            html = plant_cards([plant])
+
+        self.assertIn('Sunflower', html)
+        get_template.assert_not_called()
+
+    def test_new_version_renders_again(self):
+        plant_cards([Plant(id=1, version=1, name='Sunflower')])
+        html = plant_cards([Plant(id=1, version=2, name='Giant Sunflower')])
+
+        self.assertIn('Giant Sunflower', html)
+
+    def test_delete_button_is_part_of_the_key(self):
+        plant = Plant(id=1, version=1, name='Sunflower')
+
+        self.assertNotIn('dlt-btn', plant_cards([plant]))
+        self.assertIn('/plants/1/delete', plant_cards([plant], delete=True))
+
+    def test_openfarm_results_are_not_cached(self):
+        html = plant_cards([{'name': '<b>Kale</b>', 'image': 'kale.jpg'}])
+
+        self.assertIn('&lt;b&gt;Kale&lt;/b&gt;', html)
+        self.assertEqual(len(fragment_cache), 0)
+
+    def test_garden_card_follows_cover_image(self):
+        garden = Garden(id=1, version=1, name='mygarden')
+
+        self.assertIn('unknown-image', garden_cards([garden]))
+        garden.cover_image = 'sun.jpg'
+        self.assertIn('sun.jpg', garden_cards([garden]))
@@ -0,0 +1,73 @@
+# run these tests like: python -m unittest test_http_client.py
+
+
+import time
+from unittest import TestCase
+from unittest.mock import patch, Mock
+
+import requests
+
+from http_client import CircuitBreaker, HTTPClient, UpstreamUnavailable
+
+
+class CircuitBreakerTestCase(TestCase):
+    """unit tests for the per-host circuit breaker"""
+
+    def test_opens_after_threshold(self):
+        breaker = CircuitBreaker(failure_threshold=2, reset_timeout=60)
+        breaker.record_failure()
+        self.assertTrue(breaker.allow())
+
+        breaker.record_failure()
+        self.assertEqual(breaker.state, 'open')
+        self.assertFalse(breaker.allow())
+
+    def test_half_open_allows_one_trial(self):
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.01)
+        breaker.record_failure()
+        time.sleep(0.02)
+
+        self.assertEqual(breaker.state, 'half-open')
+        self.assertTrue(breaker.allow())
+        self.assertFalse(breaker.allow())
+
+        breaker.record_success()
+        self.assertEqual(breaker.state, 'closed')
+
+
+class HTTPClientTestCase(TestCase):
+    """the client fails fast once an upstream keeps failing"""
+
+    def setUp(self):
+        self.client = HTTPClient()
+        self.client.configure(retries=0, failure_threshold=2, reset_timeout=60)
+
+    def test_timeouts_are_passed(self):
+        resp = Mock(status_code=200)
+        resp.json.return_value = {'data': []}
+
+        with patch.object(self.client.session, 'get', return_value=resp) as get:
+            self.assertEqual(self.client.get_json('https://openfarm.cc/api/v1/crops/'), {'data': []})
+
+        self.assertEqual(get.call_args.kwargs['timeout'], (3.05, 10))
+
+    def test_client_errors_return_body(self):
+        resp = Mock(status_code=400)
+        resp.json.return_value = {'error': {'code': 1006}}
+
+        with patch.object(self.client.session, 'get', return_value=resp):
+            self.assertIn('error', self.client.get_json('http://api.weatherapi.com/v1/forecast.json'))
+
+    def test_circuit_opens_on_repeated_failures(self):
+        url = 'https://openfarm.cc/api/v1/crops/'
+
+        with patch.object(self.client.session, 'get', side_effect=requests.Timeout) as get:
+            for _ in range(2):
+                with self.assertRaises(UpstreamUnavailable):
+                    self.client.get_json(url)
+
+            with self.assertRaises(UpstreamUnavailable):
+                self.client.get_json(url)
+
+        self.assertEqual(get.call_count, 2)
+        self.assertEqual(self.client.breaker('openfarm.cc').state, 'open')
@@ -0,0 +1,75 @@
+# run these tests like: python -m unittest test_import_plants.py
+
+
+import os
+from unittest import TestCase
+from unittest.mock import patch
+
+from models import db, Plant
+
+os.environ['DATABASE_URL'] = "postgresql:///garden-test"
+os.environ['APP_CONFIG'] = 'test'
+
+from app import app
+from import_plants import fetch_catalog, import_crops, load_fixture
+
+FIXTURE = os.path.join(os.path.dirname(__file__), 'fixtures', 'openfarm_crops.json')
+
+
+class ImportPlantsTestCase(TestCase):
+    """tests for the bulk OpenFarm importer"""
+
+    def setUp(self):
+        db.drop_all()
+        db.create_all()
+
+    def tearDown(self):
+        db.session.rollback()
+
+    def test_import_fixture(self):
+        """fixture records become plants, mapped like plant_details"""
+
+        written = import_crops(load_fixture(FIXTURE), batch_size=2)
+
+        self.assertEqual(written, 5)
+        self.assertEqual(Plant.query.count(), 5)
+
+        sunflower = Plant.query.filter_by(name='Sunflower').one()
+        self.assertEqual(sunflower.binomial_name, 'Helianthus annuus')
+        self.assertEqual(sunflower.image, '/static/unknown-image.webp')
+        self.assertTrue(sunflower.growing_method.startswith('Direct seed'))
+
+    def test_import_upserts_by_name(self):
+        """re-importing refreshes existing plants instead of failing"""
+
+        db.session.add(Plant(name='Tomato', description='old'))
+        db.session.commit()
+
+        import_crops(load_fixture(FIXTURE))
+        import_crops(load_fixture(FIXTURE))
+
+        self.assertEqual(Plant.query.count(), 5)
+        tomato = Plant.query.filter_by(name='Tomato').one()
+        self.assertTrue(tomato.description.startswith('The tomato'))
+
+    def test_reimport_only_bumps_changed_plants(self):
+        import_crops(load_fixture(FIXTURE))
+        Plant.query.filter_by(name='Tomato').update({'description': 'old'})
+        db.session.commit()
+
+        import_crops(load_fixture(FIXTURE))
+
+        versions = dict(db.session.query(Plant.name, Plant.version))
+        self.assertEqual(versions['Tomato'], 2)
+        self.assertEqual(versions['Sunflower'], 1)
+
+    def test_fetch_catalog_stops_at_empty_page(self):
+        records = load_fixture(FIXTURE)
+        pages = {1: records[:2], 2: records[2:4], 3: records[4:]}
+
+        with patch('import_plants.fetch_page', side_effect=lambda url, page: pages.get(page, [])) as fetch_page:
+            fetched = list(fetch_catalog('http://stub/api/v1/crops/', concurrency=2))
+
+        self.assertEqual([record['attributes']['name'] for record in fetched],
+                         [record['attributes']['name'] for record in records])
+        self.assertEqual(fetch_page.call_count, 4)
@@ -0,0 +1,92 @@
+# run these tests like: python -m unittest test_metrics.py
+
+
+import os
+from unittest import TestCase
+from unittest.mock import patch, Mock
+
+import requests
+from prometheus_client import REGISTRY
+
+from models import db, User
+
+os.environ['DATABASE_URL'] = "postgresql:///garden-test"
+os.environ['APP_CONFIG'] = 'test'
+
+from app import app
+from http_client import HTTPClient, UpstreamUnavailable
+from identity import user_cache
+
+
+def sample(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0
+
+
+class MetricsTestCase(TestCase):
+    """tests for the /metrics endpoint and what it records"""
+
+    def setUp(self):
+        db.drop_all()
+        db.create_all()
+        user_cache.clear()
+
+        self.client = app.test_client()
+
+        u1 = User.signup("test1", "test1@test.com", "password", None, 'Baltimore')
+        u1.id = 1111
+        db.session.commit()
+
+    def tearDown(self):
+        db.session.rollback()
+        app.config['METRICS_TOKEN'] = None
+
+    def test_request_latency_and_queries(self):
+        count = sample('http_request_duration_seconds_count',
+                       endpoint='views.user_profile', method='GET', status='200')
+        queries = sample('db_queries_per_request_sum', endpoint='views.user_profile')
+
+        self.client.get('/users/1111')
+
+        self.assertEqual(sample('http_request_duration_seconds_count',
+                                endpoint='views.user_profile', method='GET', status='200'), count + 1)
+        self.assertGreater(sample('db_queries_per_request_sum', endpoint='views.user_profile'), queries)
+
+    def test_cache_lookups(self):
+        with self.client.session_transaction() as change_session:
+            change_session['current_user'] = 1111
+        misses = sample('cache_lookups_total', cache='users', result='miss')
+        hits = sample('cache_lookups_total', cache='users', result='hit')
+
+        self.client.get('/users/1111')
+        self.client.get('/users/1111')
+
+        self.assertEqual(sample('cache_lookups_total', cache='users', result='miss'), misses + 1)
+        self.assertEqual(sample('cache_lookups_total', cache='users', result='hit'), hits + 1)
+
+    def test_upstream_errors(self):
+        client = HTTPClient()
+        client.configure(retries=0, failure_threshold=5)
+        timeouts = sample('upstream_errors_total', upstream='openfarm', reason='timeout')
+
+        with patch.object(client.session, 'get', side_effect=requests.Timeout()):
+            with self.assertRaises(UpstreamUnavailable):
+                client.get_json('https://openfarm.cc/api/v1/crops/', upstream='openfarm')
+
+        self.assertEqual(sample('upstream_errors_total', upstream='openfarm', reason='timeout'),
+                         timeouts + 1)
+        self.assertGreater(sample('upstream_request_duration_seconds_count', upstream='openfarm'), 0)
+
+    def test_metrics_page(self):
+        self.client.get('/')
+        resp = self.client.get('/metrics')
+
+        self.assertEqual(resp.status_code, 200)
+        self.assertIn(b'http_request_duration_seconds_bucket', resp.data)
+        self.assertIn(b'db_pool_connections{state="checked_out"}', resp.data)
+
+    def test_metrics_token(self):
+        app.config['METRICS_TOKEN'] = 'secret'
+
+        self.assertEqual(self.client.get('/metrics').status_code, 401)
+        resp = self.client.get('/metrics', headers={'Authorization': 'Bearer secret'})
+        self.assertEqual(resp.status_code, 200)
@@ -0,0 +1,64 @@
+# run these tests like: python -m unittest test_migrate.py
+
+
+import os
+from unittest import TestCase
+
+from sqlalchemy import exc, text
+
+from models import db, User, Plant, Garden, User_plant, Garden_plant
+
+os.environ['DATABASE_URL'] = "postgresql:///garden-test"
+os.environ['APP_CONFIG'] = 'test'
+
+from app import app
+from migrate import apply_migration, split_statements
+
+
+class JoinTableMigrationTestCase(TestCase):
+    """the join table migration dedupes rows and adds the constraints"""
+
+    def setUp(self):
+        db.drop_all()
+        db.create_all()
+
+        db.session.add_all([User(id=1, username='testing1', email='t@test.com', password='x', location='here'),
+                            Plant(id=1, name='Tomato')])
+        db.session.commit()
+        db.session.add(Garden(id=1, user_id=1, name='garden'))
+        db.session.commit()
+
+    def tearDown(self):
+        db.session.rollback()
+
+    def test_duplicates_rejected(self):
+        db.session.add_all([User_plant(user_id=1, plant_id=1), User_plant(user_id=1, plant_id=1)])
+
+        with self.assertRaises(exc.IntegrityError):
+            db.session.commit()
+
+    def test_migration_dedupes_existing_rows(self):
+        engine = db.get_engine(app)
+
+        # an old database: no constraints and duplicate rows
+        with engine.begin() as conn:
+            conn.execute(text("ALTER TABLE garden_plants DROP CONSTRAINT uq_garden_plants_garden_id_plant_id"))
+            conn.execute(text("DROP INDEX ix_garden_plants_plant_id"))
+            for _ in range(3):
+                conn.execute(text("INSERT INTO garden_plants (garden_id, plant_id) VALUES (1, 1)"))
+
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            apply_migration(conn, '004_join_table_constraints.sql')
+            # safe to re-run
+            apply_migration(conn, '004_join_table_constraints.sql')
+
+        self.assertEqual(Garden_plant.query.count(), 1)
+        db.session.add(Garden_plant(garden_id=1, plant_id=1))
+        with self.assertRaises(exc.IntegrityError):
+            db.session.commit()
+
+    def test_split_statements_keeps_do_blocks(self):
+        sql = "SELECT 1;\nDO $$\nBEGIN\n    PERFORM 1;\nEND\n$$;\n-- done\n"
+
+        self.assertEqual(split_statements(sql),
+                         ['SELECT 1;', 'DO $$\nBEGIN\n    PERFORM 1;\nEND\n$$;'])
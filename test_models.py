@@ -2,12 +2,19 @@
 
 
 import os
+import threading
+import time
 from unittest import TestCase
-from sqlalchemy import exc
+from unittest.mock import Mock
+from flask import g
+from sqlalchemy import exc, text
 
-from models import db, User, Plant, Garden
+from models import (db, User, Plant, Garden, Forecast, Fetch_claim, Follows,
+                    add_link, remove_link, fetch_once)
+from passwords import hasher
 
 os.environ['DATABASE_URL'] = "postgresql:///garden-test"
+os.environ['APP_CONFIG'] = 'test'
 
 
 from app import app
@@ -121,6 +128,17 @@ class UserModelTestCase(TestCase):
     def test_wrong_password(self):
         self.assertFalse(User.authenticate(self.u1.username, "badpassword"))
 
+    def test_rehash_on_login(self):
+        """a hash with an outdated cost is upgraded on login"""
+
+        self.u1.password = hasher.hash("password1", rounds=4)
+        db.session.commit()
+
+        self.assertTrue(User.authenticate(self.u1.username, "password1"))
+        user = User.query.get(self.uid1)
+        self.assertFalse(hasher.needs_rehash(user.password))
+        self.assertTrue(User.authenticate(self.u1.username, "password1"))
+
 
     def test_add_garden(self):
         """Tests if user adding a garden works"""
@@ -155,7 +173,109 @@ class UserModelTestCase(TestCase):
 
         self.assertTrue(self.u1.is_following(self.u2))
         self.assertFalse(self.u2.is_following(self.u1))
+        self.assertTrue(self.u1.is_following(self.uid2))
+
+    def test_member_ids(self):
+        """one query answers membership for a whole page of plants"""
+
+        plants = [Plant(name=f'plant{i}') for i in range(5)]
+        db.session.add_all(plants)
+        self.u1.plants.extend(plants[:2])
+        db.session.commit()
+
+        ids = [plant.id for plant in plants]
+        self.assertEqual(self.u1.member_ids('plants', ids), set(ids[:2]))
+        self.assertTrue(self.u1.is_saved(ids[0]))
+        self.assertFalse(self.u1.is_saved(ids[4]))
+        self.assertEqual(self.u2.member_ids('plants', ids), set())
+
+    def test_links_forget_memberships(self):
+        """answers remembered for a request follow the links it changes"""
+
+        with app.test_request_context():
+            self.assertFalse(self.u1.is_following(self.uid2))
+
+            add_link(Follows, user_followed=self.uid1, user_following=self.uid2)
+            self.assertTrue(self.u1.is_following(self.uid2))
+
+            remove_link(Follows, user_followed=self.uid1, user_following=self.uid2)
+            self.assertFalse(self.u1.is_following(self.uid2))
+
+        with app.test_request_context():
+            # a new request starts with nothing remembered
+            self.assertEqual(g.get('memberships'), None)
+
+    def test_is_saved_garden(self):
+        garden = Garden(user_id=self.uid2, name='garden')
+        db.session.add(garden)
+        self.u1.gardens.append(garden)
+        db.session.commit()
+
+        self.assertTrue(self.u1.is_saved_garden(garden.id))
+        self.assertFalse(self.u2.is_saved_garden(garden.id))
+
+
+class FetchOnceTestCase(TestCase):
+    """one worker fetches, the others wait for its result"""
+
+    def setUp(self):
+        db.drop_all()
+        db.create_all()
+
+    def tearDown(self):
+        db.session.rollback()
+
+    def stored(self):
+        return db.session.query(Forecast.payload).filter(Forecast.location == 'here').scalar()
+
+    def store(self, payload):
+        db.session.add(Forecast(location='here', payload=payload))
+        return payload
+
+    def claim(self, seconds):
+        """a claim by some other worker, lapsing in seconds"""
+
+        db.session.execute(text("INSERT INTO fetch_claims (key, claimed_until) "
+                                "VALUES ('here', now() + make_interval(secs => :seconds))"),
+                           {'seconds': seconds})
+        db.session.commit()
+
+    def test_fetch_and_store_once(self):
+        fetch = Mock(return_value={'sunny': True})
+
+        self.assertEqual(fetch_once('here', self.stored, fetch, self.store), {'sunny': True})
+        self.assertEqual(fetch_once('here', self.stored, fetch, self.store), {'sunny': True})
+
+        fetch.assert_called_once()
+        self.assertEqual(Fetch_claim.query.count(), 0)
+
+    def test_wait_for_another_workers_fetch(self):
+        self.claim(60)
+
+        def other_worker():
+            time.sleep(0.2)
+            with app.app_context(), db.engine.begin() as conn:
+                conn.execute(text("""INSERT INTO forecasts (location, payload) VALUES ('here', '{"rainy": true}')"""))
+                conn.execute(text("DELETE FROM fetch_claims"))
+
+        worker = threading.Thread(target=other_worker)
+        worker.start()
+        fetch = Mock()
+        result = fetch_once('here', self.stored, fetch, self.store)
+        worker.join()
+
+        self.assertEqual(result, {'rainy': True})
+        fetch.assert_not_called()
+
+    def test_take_over_a_lapsed_claim(self):
+        self.claim(-1)
+        fetch = Mock(return_value={'sunny': True})
 
+        self.assertEqual(fetch_once('here', self.stored, fetch, self.store), {'sunny': True})
+        fetch.assert_called_once()
 
+    def test_failed_fetch_gives_up_the_claim(self):
+        with self.assertRaises(ValueError):
+            fetch_once('here', self.stored, Mock(side_effect=ValueError), self.store)
 
-        
\ No newline at end of file
+        self.assertEqual(Fetch_claim.query.count(), 0)
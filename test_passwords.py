@@ -0,0 +1,81 @@
+# run these tests like: python -m unittest test_passwords.py
+
+
+import threading
+from unittest import TestCase
+from unittest.mock import patch
+
+from passwords import PasswordHasher, HashingBusy, make_pool
+
+
+class PasswordHasherTestCase(TestCase):
+    """unit tests for the bounded bcrypt pool"""
+
+    def test_hash_and_verify(self):
+        hasher = PasswordHasher(rounds=4)
+        hashed = hasher.hash('password')
+
+        self.assertTrue(hashed.startswith('$2b$04$'))
+        self.assertTrue(hasher.verify(hashed, 'password'))
+        self.assertFalse(hasher.verify(hashed, 'wrong'))
+
+    def test_needs_rehash(self):
+        hasher = PasswordHasher(rounds=5)
+
+        self.assertTrue(hasher.needs_rehash(hasher.hash('password', rounds=4)))
+        self.assertFalse(hasher.needs_rehash(hasher.hash('password')))
+
+    def test_busy_when_queue_full(self):
+        hasher = PasswordHasher(workers=1, max_pending=1, rounds=4)
+        started = threading.Event()
+        release = threading.Event()
+
+        def slow_hash(password, rounds):
+            started.set()
+            release.wait(5)
+            return b'hashed'
+
+        with patch('passwords.generate_password_hash', side_effect=slow_hash):
+            worker = threading.Thread(target=hasher.hash, args=('password',))
+            worker.start()
+            started.wait(5)
+
+            with self.assertRaises(HashingBusy):
+                hasher.hash('password')
+
+            release.set()
+            worker.join()
+
+        self.assertTrue(hasher.verify(hasher.hash('password'), 'password'))
+
+    def test_busy_when_hash_times_out(self):
+        """a hash stuck past the timeout is reported busy, not as an error"""
+
+        hasher = PasswordHasher(workers=1, max_pending=2, rounds=4, timeout=0.05)
+        release = threading.Event()
+
+        def slow_hash(password, rounds):
+            release.wait(5)
+            return b'hashed'
+
+        with patch('passwords.generate_password_hash', side_effect=slow_hash):
+            with self.assertRaises(HashingBusy):
+                hasher.hash('password')
+
+            release.set()
+
+        self.assertTrue(hasher.verify(hasher.hash('password'), 'password'))
+
+    def test_native_threads_under_gevent(self):
+        """with threading monkey-patched, bcrypt goes to gevent's pool of real threads"""
+
+        from gevent.threadpool import ThreadPoolExecutor as NativeThreadPoolExecutor
+
+        with patch('gevent.monkey.is_module_patched', return_value=True):
+            pool = make_pool(1)
+        self.assertIsInstance(pool, NativeThreadPoolExecutor)
+        pool.shutdown()
+
+        pool = make_pool(1)
+        self.assertNotIsInstance(pool, NativeThreadPoolExecutor)
+        pool.shutdown()
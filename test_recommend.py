@@ -0,0 +1,109 @@
+# run these tests like: python -m unittest test_recommend.py
+
+
+import os
+from unittest import TestCase
+
+from models import db, User, Plant, Garden, Plant_cooccurrence
+
+os.environ['DATABASE_URL'] = "postgresql:///garden-test"
+os.environ['APP_CONFIG'] = 'test'
+
+from app import app
+from identity import user_cache
+from fragments import fragment_cache
+import recommend
+
+
+def scores():
+    return {(row.plant_id, row.other_id): row.score
+            for row in Plant_cooccurrence.query if row.score}
+
+
+class RecommendTestCase(TestCase):
+    """tests for plant co-occurrence and suggestions"""
+
+    def setUp(self):
+        db.drop_all()
+        db.create_all()
+        user_cache.clear()
+        fragment_cache.clear()
+        recommend.suggestion_cache.clear()
+
+        self.client = app.test_client()
+
+        u1 = User.signup("test1", "test1@test.com", "password", None, 'Baltimore')
+        u1.id = 1111
+        u2 = User.signup("test2", "test2@test.com", "password", None, 'location')
+        u2.id = 2222
+        db.session.commit()
+
+        db.session.add_all([Plant(name='Tomato', id=1),
+                            Plant(name='Basil', id=2),
+                            Plant(name='Pepper', id=3),
+                            Plant(name='Mint', id=4),
+                            Garden(user_id=1111, username='test1', name='mygarden', id=1234)])
+        db.session.commit()
+
+    def tearDown(self):
+        db.session.rollback()
+
+    def login(self, user_id):
+        with self.client.session_transaction() as change_session:
+            change_session['current_user'] = user_id
+
+    def save(self, user_id, *plant_ids):
+        self.login(user_id)
+        for plant_id in plant_ids:
+            self.client.post(f'/plants/{plant_id}/save')
+
+    def test_cooccurrence_matrix(self):
+        plant_ids, counts = recommend.cooccurrence_matrix([(1, 10), (1, 20), (2, 10), (2, 20), (2, 30)])
+        dense = counts.toarray()
+
+        self.assertEqual(plant_ids.tolist(), [10, 20, 30])
+        self.assertEqual(dense.tolist(), [[0, 2, 1], [2, 0, 1], [1, 1, 0]])
+
+    def test_saves_match_rebuild(self):
+        """the incremental updates leave the same scores a rebuild computes"""
+
+        self.save(1111, 1, 2, 3)
+        self.save(2222, 1, 2)
+        self.client.post('/plants/2/delete')
+        self.client.post('/gardens/1234/plants', json={'plant_ids': [1, 3, 4]})
+        self.login(1111)
+        self.client.post('/gardens/1234/plants', json={'plant_ids': [1, 3, 4]})
+        self.client.post('/gardens/1234/plants/delete', json={'plant_ids': [4]})
+
+        incremental = scores()
+        self.assertEqual(incremental[(1, 3)], 2)
+        self.assertEqual(incremental[(3, 1)], 2)
+        self.assertEqual(incremental[(1, 2)], 1)
+        self.assertNotIn((1, 4), incremental)
+
+        recommend.rebuild()
+        self.assertEqual(scores(), incremental)
+
+    def test_deleting_a_garden(self):
+        self.login(1111)
+        self.client.post('/gardens/1234/plants', json={'plant_ids': [1, 3]})
+        self.assertEqual(scores(), {(1, 3): 1, (3, 1): 1})
+
+        self.client.post('/gardens/1234/delete')
+        self.assertEqual(scores(), {})
+
+    def test_suggestions(self):
+        self.save(1111, 1, 2, 3)
+        self.save(2222, 1, 2)
+
+        with app.test_request_context():
+            self.assertEqual([s.name for s in recommend.suggestions_for_plant(1)], ['Basil', 'Pepper'])
+            # test2 saved tomato and basil already
+            self.assertEqual([s.name for s in recommend.suggestions_for_user(2222)], ['Pepper'])
+
+        resp = self.client.get('/plants')
+        self.assertIn(b'You might also like', resp.data)
+        self.assertIn(b'Pepper', resp.data)
+
+        resp = self.client.get('/plants/Tomato')
+        self.assertIn(b'Gardeners who saved this also saved', resp.data)
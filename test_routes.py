@@ -2,14 +2,26 @@
 
 
 import os
+import threading
+import time
 from unittest import TestCase
 from flask import session
+from unittest.mock import patch
+from sqlalchemy import event
 
-from models import db, User, Plant, Garden
+from models import (db, User, Plant, Garden, Garden_plant, Saved_gardens, User_plant, Follows,
+                    Crop_miss, Forecast, bump_version)
 
 os.environ['DATABASE_URL'] = "postgresql:///garden-test"
+os.environ['APP_CONFIG'] = 'test'
 
 from app import app
+from http_client import UpstreamUnavailable
+from passwords import HashingBusy
+from identity import user_cache
+from fragments import fragment_cache
+import openfarm
+import search as local_search
 
 app.config['WTF_CSRF_ENABLED'] = False
 
@@ -21,6 +33,8 @@ class RoutesTestCase(TestCase):
 
         db.drop_all()
         db.create_all()
+        user_cache.clear()
+        fragment_cache.clear()
 
         self.client = app.test_client()
 
@@ -46,6 +60,7 @@ class RoutesTestCase(TestCase):
     def tearDown(self):
         resp = super().tearDown()
         db.session.rollback()
+        app.config['PLANT_SEARCH_MIN_LOCAL'] = 3
         return resp
 
     def test_homepage(self):
@@ -87,6 +102,17 @@ class RoutesTestCase(TestCase):
             self.assertEqual(resp.status_code, 302)
 
 
+    def test_login_busy(self):
+        """a login that can't get a password hash slot is told to retry"""
+
+        with app.test_client() as client:
+            with patch('models.hasher.verify', side_effect=HashingBusy):
+                resp = client.post('/login', data={'username': 'test1', 'password': 'password'})
+
+            self.assertEqual(resp.status_code, 503)
+            self.assertEqual(resp.headers['Retry-After'], '5')
+            self.assertIn('The server is busy right now', resp.get_data(as_text=True))
+
     def test_logout(self):
         """testing user logout"""
         with app.test_client() as client:
@@ -120,6 +146,87 @@ class RoutesTestCase(TestCase):
             self.assertEqual(user.image_url, "newurl")
             self.assertEqual(user.location, "newlocation")
 
+    def test_user_snapshot_cached(self):
+        """pages that only need the nav bar don't load the User row"""
+
+        with app.test_client() as client:
+            with client.session_transaction() as change_session:
+                change_session['current_user'] = self.u1_id
+
+            client.get('/gardens/save/show')
+            queries = self.count_queries(client, '/gardens/save/show')
+            user = User.query.get(self.u1_id)
+            html = client.get('/gardens/save/show').get_data(as_text=True)
+
+            self.assertIn(user.username, html)
+            self.assertEqual(queries, 1)
+
+    def test_edit_user_refreshes_snapshot(self):
+        """after a profile edit the session skips snapshots cached before it,
+        even ones only another worker would forget"""
+
+        with app.test_client() as client:
+            with client.session_transaction() as change_session:
+                change_session['current_user'] = self.u1_id
+
+            client.get('/gardens/save/show')
+            client.post('/users/profile/edit',
+                        data={"username": "renamed",
+                              "email": "test1@test.com",
+                              "location": "Baltimore",
+                              "password": "password"})
+            html = client.get('/gardens/save/show').get_data(as_text=True)
+
+            # the stale snapshot is still cached, just never looked up again
+            self.assertEqual(user_cache.get((self.u1_id, None))[1], 'test1')
+            self.assertIn('renamed', html)
+
+    def test_search_users_pages(self):
+        """user listing pages through everyone with a cursor"""
+
+        app.config['PAGE_SIZE'] = 2
+        try:
+            with app.test_client() as client:
+                seen = []
+                url = '/users/search/none'
+                while url:
+                    html = client.get(url).get_data(as_text=True)
+                    seen += [name for name in ('testuser', 'test1', 'test2', 'test3', 'test4')
+                             if f'>{name}<' in html]
+                    url = None
+                    if 'name="after"' in html:
+                        after = html.split('name="after" value="')[1].split('"')[0]
+                        url = f'/users/search/none?after={after}'
+        finally:
+            app.config['PAGE_SIZE'] = 50
+
+        self.assertEqual(sorted(seen), ['test1', 'test2', 'test3', 'test4', 'testuser'])
+
+    def test_search_users_no_match(self):
+        with app.test_client() as client:
+            html = client.get('/users/search/nobody').get_data(as_text=True)
+
+            self.assertIn('Sorry, no users found', html)
+
+    def test_search_users_ranked(self):
+        """username search ignores case and puts the exact match first"""
+
+        with app.test_client() as client:
+            html = client.get('/users/search/TEST1').get_data(as_text=True)
+
+            self.assertIn('>test1<', html)
+            with app.app_context():
+                trigrams = local_search.has_extension('pg_trgm')
+            if trigrams:
+                # near misses match too, after the exact match
+                self.assertLess(html.index('>test1<'), html.index('>test2<'))
+            else:
+                self.assertNotIn('>test2<', html)
+
+            html = client.get('/users/search/test').get_data(as_text=True)
+
+            self.assertLess(html.index('>test1<'), html.index('>testuser<'))
+
     def test_user_profile(self):
         with app.test_client() as client:
             resp = client.get(f"/users/{self.testuser_id}")
@@ -129,6 +236,156 @@ class RoutesTestCase(TestCase):
             self.assertIn("testuser", str(resp.data))
 
 
+    def test_garden_not_modified(self):
+        """an unchanged garden page is answered with a 304 after one query"""
+
+        with app.test_client() as client:
+            with client.session_transaction() as change_session:
+                change_session['current_user'] = self.u1_id
+
+            db.session.add(Garden(user_id=1111, username='test1', name='mygarden', id=1234))
+            db.session.add(Plant(name='Sunflower', id=1))
+            db.session.commit()
+
+            first = client.get('/gardens/1234')
+            etag = first.headers['ETag']
+            queries = self.count_queries(client, '/gardens/1234', status=304,
+                                         headers={'If-None-Match': etag})
+
+            self.assertEqual(queries, 1)
+            self.assertIn('no-cache', first.headers['Cache-Control'])
+
+            client.post('/plants/1/add-plant', data={'garden': 1234})
+            changed = client.get('/gardens/1234', headers={'If-None-Match': etag})
+
+            self.assertEqual(changed.status_code, 200)
+            self.assertNotEqual(changed.headers['ETag'], etag)
+
+    def test_garden_etag_follows_older_plants(self):
+        """bumping a plant that isn't the garden's newest still changes the tag"""
+
+        with app.test_client() as client:
+            with client.session_transaction() as change_session:
+                change_session['current_user'] = self.u1_id
+
+            db.session.add(Garden(user_id=1111, username='test1', name='mygarden', id=1234))
+            db.session.add(Plant(name='Sunflower', id=1, version=1))
+            db.session.add(Plant(name='Basil', id=2, version=5))
+            db.session.commit()
+            db.session.add_all([Garden_plant(garden_id=1234, plant_id=1),
+                                Garden_plant(garden_id=1234, plant_id=2)])
+            db.session.commit()
+
+            etag = client.get('/gardens/1234').headers['ETag']
+
+            bump_version(Plant, 1)
+            db.session.commit()
+            resp = client.get('/gardens/1234', headers={'If-None-Match': etag})
+
+            self.assertEqual(resp.status_code, 200)
+            self.assertNotEqual(resp.headers['ETag'], etag)
+
+    def test_profile_etag_follows_saved_plants(self):
+        with app.test_client() as client:
+            with client.session_transaction() as change_session:
+                change_session['current_user'] = self.u1_id
+
+            db.session.add(Plant(name='Sunflower', id=1))
+            db.session.commit()
+
+            etag = client.get('/users/1111').headers['ETag']
+            self.assertEqual(client.get('/users/1111', headers={'If-None-Match': etag}).status_code, 304)
+
+            client.post('/plants/1/save')
+            resp = client.get('/users/1111', headers={'If-None-Match': etag})
+
+            self.assertEqual(resp.status_code, 200)
+            self.assertIn('Sunflower', resp.get_data(as_text=True))
+
+    def test_not_modified_skipped_for_flashes(self):
+        """a pending flash message has to be rendered, not answered with a 304"""
+
+        with app.test_client() as client:
+            with client.session_transaction() as change_session:
+                change_session['current_user'] = self.u1_id
+
+            etag = client.get('/users/2222').headers['ETag']
+            with client.session_transaction() as change_session:
+                change_session['_flashes'] = [('message', 'hello')]
+
+            resp = client.get('/users/2222', headers={'If-None-Match': etag})
+
+            self.assertEqual(resp.status_code, 200)
+            self.assertIn('hello', resp.get_data(as_text=True))
+
+    def test_garden_card_follows_cover_image(self):
+        """cached garden cards are replaced once the garden changes"""
+
+        with app.test_client() as client:
+            with client.session_transaction() as change_session:
+                change_session['current_user'] = self.u1_id
+
+            db.session.add(Garden(user_id=1111, username='test1', name='mygarden', id=1234))
+            db.session.add(Plant(name='Sunflower', image='sunflower.jpg', id=1))
+            db.session.commit()
+
+            before = client.get('/?view=gardens').get_data(as_text=True)
+            client.post('/plants/1/add-plant', data={'garden': 1234})
+            after = client.get('/?view=gardens').get_data(as_text=True)
+
+            self.assertNotIn('sunflower.jpg', before)
+            self.assertIn('sunflower.jpg', after)
+
+    def count_queries(self, client, url, status=200, **kwargs):
+        """number of SQL statements run while serving url"""
+
+        statements = []
+
+        def before_cursor_execute(conn, cursor, statement, *args):
+            statements.append(statement)
+
+        engine = db.get_engine(app)
+        event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+        try:
+            resp = client.get(url, **kwargs)
+        finally:
+            event.remove(engine, 'before_cursor_execute', before_cursor_execute)
+
+        self.assertEqual(resp.status_code, status)
+        return len(statements)
+
+    def test_profile_queries_do_not_grow_with_gardens(self):
+        """profile and inspirations pages run a fixed number of queries"""
+
+        plant = Plant(name='Sunflower', image='/sunflower.jpg')
+        db.session.add(plant)
+        for i in range(2):
+            db.session.add(Garden(user_id=self.u1_id, name=f'garden{i}', plants=[plant]))
+        db.session.commit()
+        plant_id = plant.id
+
+        with app.test_client() as client:
+            with client.session_transaction() as change_session:
+                change_session['current_user'] = self.u1_id
+
+            client.get('/gardens/save/show')
+            few = self.count_queries(client, f'/users/{self.u1_id}')
+            few_saved = self.count_queries(client, '/gardens/save/show')
+
+            plant = Plant.query.get(plant_id)
+            for i in range(8):
+                garden = Garden(user_id=self.u2_id, name=f'more{i}', plants=[plant])
+                db.session.add(garden)
+                db.session.flush()
+                db.session.add(Saved_gardens(garden_id=garden.id, user_saved=self.u1_id))
+            db.session.commit()
+
+            html = client.get(f'/users/{self.u1_id}').get_data(as_text=True)
+            self.assertIn('/sunflower.jpg', html)
+
+            self.assertEqual(self.count_queries(client, f'/users/{self.u1_id}'), few)
+            self.assertEqual(self.count_queries(client, '/gardens/save/show'), few_saved)
+
 #follow tests
     def test_add_follow(self):
         """testing add follow"""
@@ -183,6 +440,369 @@ class RoutesTestCase(TestCase):
             self.assertEqual(len(user.plants), 1)
             self.assertEqual(user.plants[0].id, 1234)
 
+    def test_save_plant_twice(self):
+        """saving an already saved plant keeps a single row"""
+
+        with app.test_client() as client:
+            with client.session_transaction() as change_session:
+                change_session['current_user'] = self.u1.id
+
+            plant = Plant(name='Sunflower', id=1234)
+            db.session.add(plant)
+            db.session.commit()
+
+            client.post('/plants/1234/save')
+            resp = client.post('/plants/1234/save', follow_redirects=True)
+
+            self.assertEqual(resp.status_code, 200)
+            self.assertEqual(User_plant.query.filter_by(user_id=1111, plant_id=1234).count(), 1)
+
+    def test_save_plant_xhr(self):
+        """XHR callers get a compact JSON answer saying whether anything changed"""
+
+        with app.test_client() as client:
+            with client.session_transaction() as change_session:
+                change_session['current_user'] = self.u1.id
+
+            db.session.add(Plant(name='Sunflower', id=1234))
+            db.session.commit()
+
+            xhr = {'X-Requested-With': 'XMLHttpRequest'}
+            first = client.post('/plants/1234/save', headers=xhr)
+            second = client.post('/plants/1234/save', headers=xhr)
+            removed = client.post('/plants/1234/delete', headers=xhr)
+
+            self.assertEqual(first.json, {'plant_id': 1234, 'saved': True, 'changed': True})
+            self.assertEqual(second.json, {'plant_id': 1234, 'saved': True, 'changed': False})
+            self.assertEqual(removed.json, {'plant_id': 1234, 'saved': False, 'changed': True})
+            self.assertEqual(User_plant.query.filter_by(user_id=1111).count(), 0)
+
+    def test_save_missing_plant(self):
+        with app.test_client() as client:
+            with client.session_transaction() as change_session:
+                change_session['current_user'] = self.u1.id
+
+            resp = client.post('/plants/4321/save')
+
+            self.assertEqual(resp.status_code, 404)
+
+    def test_follow_twice(self):
+        with app.test_client() as client:
+            with client.session_transaction() as change_session:
+                change_session['current_user'] = self.u1.id
+
+            client.post('/follows/add/2222')
+            resp = client.post('/follows/add/2222', headers={'Accept': 'application/json'})
+
+            self.assertEqual(resp.json, {'user_id': 2222, 'following': True, 'changed': False})
+            self.assertEqual(Follows.query.filter_by(user_followed=1111).count(), 1)
+
+    def test_bulk_add_plants_to_garden(self):
+        """one request adds many plants and reports each one"""
+
+        with app.test_client() as client:
+            with client.session_transaction() as change_session:
+                change_session['current_user'] = self.u1.id
+
+            db.session.add(Garden(user_id=1111, username='test1', name='mygarden', id=1234))
+            db.session.add_all([Plant(name='Sunflower', id=1), Plant(name='Tomato', id=2),
+                                Plant(name='Basil', id=3)])
+            db.session.commit()
+            db.session.add(Garden_plant(garden_id=1234, plant_id=2))
+            db.session.commit()
+
+            resp = client.post('/gardens/1234/plants',
+                               json={'plant_ids': [1, 2, 99], 'names': ['Basil', 'Kale']})
+
+            self.assertEqual(resp.status_code, 200)
+            self.assertEqual([(r['plant'], r['plant_id'], r['status']) for r in resp.json['results']],
+                             [(1, 1, 'added'), (2, 2, 'already_present'), (99, None, 'not_found'),
+                              ('Basil', 3, 'added'), ('Kale', None, 'not_found')])
+            self.assertEqual(Garden_plant.query.filter_by(garden_id=1234).count(), 3)
+
+    def test_bulk_remove_plants_from_garden(self):
+        with app.test_client() as client:
+            with client.session_transaction() as change_session:
+                change_session['current_user'] = self.u1.id
+
+            db.session.add(Garden(user_id=1111, username='test1', name='mygarden', id=1234))
+            db.session.add_all([Plant(name='Sunflower', id=1), Plant(name='Tomato', id=2)])
+            db.session.commit()
+            db.session.add(Garden_plant(garden_id=1234, plant_id=1))
+            db.session.commit()
+
+            resp = client.post('/gardens/1234/plants/delete', data={'names': ['Sunflower', 'Tomato']},
+                               follow_redirects=True)
+
+            self.assertEqual(resp.status_code, 200)
+            self.assertIn('1 removed, 1 not in garden', resp.get_data(as_text=True))
+            self.assertEqual(Garden_plant.query.filter_by(garden_id=1234).count(), 0)
+
+    def test_bulk_add_plants_not_owner(self):
+        with app.test_client() as client:
+            with client.session_transaction() as change_session:
+                change_session['current_user'] = self.u1.id
+
+            db.session.add(Garden(user_id=2222, username='test2', name='theirgarden', id=1234))
+            db.session.add(Plant(name='Sunflower', id=1))
+            db.session.commit()
+
+            resp = client.post('/gardens/1234/plants', json={'plant_ids': [1]})
+
+            self.assertEqual(resp.status_code, 403)
+            self.assertEqual(Garden_plant.query.count(), 0)
+
+    def test_bulk_add_plants_malformed(self):
+        """a JSON body has to be an object whose plant_ids and names are lists of ids and names"""
+
+        with app.test_client() as client:
+            with client.session_transaction() as change_session:
+                change_session['current_user'] = self.u1.id
+
+            db.session.add(Garden(user_id=1111, username='test1', name='mygarden', id=1234))
+            db.session.commit()
+
+            for body in ({'plant_ids': 5}, {'names': 'Basil'}, {'plant_ids': [[1]]},
+                         {'names': [{'name': 'Basil'}]}, {'plant_ids': [True]}):
+                resp = client.post('/gardens/1234/plants', json=body)
+                self.assertEqual(resp.status_code, 400, body)
+
+            # a JSON body that isn't an object, or isn't JSON at all
+            for data in ('[1, 2]', '"Basil"', '{"plant_ids": [1'):
+                resp = client.post('/gardens/1234/plants', data=data, content_type='application/json')
+                self.assertEqual(resp.status_code, 400, data)
+
+            self.assertEqual(Garden_plant.query.count(), 0)
+
+    def test_delete_plant_from_garden_not_owner(self):
+        """only the garden's owner can take plants out of it"""
+
+        with app.test_client() as client:
+            with client.session_transaction() as change_session:
+                change_session['current_user'] = self.u1.id
+
+            db.session.add(Garden(user_id=2222, username='test2', name='theirgarden', id=1234))
+            db.session.add(Plant(name='Sunflower', id=1))
+            db.session.commit()
+            db.session.add(Garden_plant(garden_id=1234, plant_id=1))
+            db.session.commit()
+
+            resp = client.post('/plants/1/1234/delete-plant', headers={'Accept': 'application/json'})
+            self.assertEqual(resp.status_code, 403)
+
+            resp = client.post('/plants/1/9999/delete-plant')
+            self.assertEqual(resp.status_code, 404)
+
+            self.assertEqual(Garden_plant.query.count(), 1)
+
+    def test_search_plants_local(self):
+        """local matches are ranked and served without calling OpenFarm"""
+
+        with app.test_client() as client:
+            with client.session_transaction() as change_session:
+                change_session['current_user'] = self.u1.id
+
+            db.session.add_all([Plant(name='Sunflower', binomial_name='Helianthus annuus'),
+                                Plant(name='Dwarf Sunflower', description='a short sunflower'),
+                                Plant(name='Tomato', description='red fruit')])
+            db.session.commit()
+
+            app.config['PLANT_SEARCH_MIN_LOCAL'] = 1
+            with patch('openfarm.search_crops') as search_crops:
+                resp = client.get('/plants/search/sunflower')
+            html = resp.get_data(as_text=True)
+
+            self.assertEqual(resp.status_code, 200)
+            search_crops.assert_not_called()
+            self.assertIn('Dwarf Sunflower', html)
+            self.assertNotIn('Tomato', html)
+            self.assertLess(html.index('>Sunflower<'), html.index('>Dwarf Sunflower<'))
+
+    def test_search_plants_remote_fallback(self):
+        """too few local matches are topped up from OpenFarm"""
+
+        with app.test_client() as client:
+            with client.session_transaction() as change_session:
+                change_session['current_user'] = self.u1.id
+
+            app.config['PLANT_SEARCH_MIN_LOCAL'] = 3
+            crops = {'data': [{'attributes': {'name': 'Plum', 'main_image_path': '/plum.jpg'}}]}
+            with patch('openfarm.search_crops', return_value=crops):
+                resp = client.get('/plants/search/plum')
+
+            self.assertEqual(resp.status_code, 200)
+            self.assertIn('/plum.jpg', resp.get_data(as_text=True))
+
+    def test_search_plants_upstream_down(self):
+        """when OpenFarm is unavailable the local results are shown"""
+
+        with app.test_client() as client:
+            with client.session_transaction() as change_session:
+                change_session['current_user'] = self.u1.id
+
+            db.session.add(Plant(name='Plum Tree'))
+            db.session.commit()
+
+            app.config['PLANT_SEARCH_MIN_LOCAL'] = 3
+            with patch('openfarm.search_crops', side_effect=UpstreamUnavailable):
+                resp = client.get('/plants/search/plum')
+
+            self.assertEqual(resp.status_code, 200)
+            self.assertIn('Plum Tree', resp.get_data(as_text=True))
+
+    def test_search_plants_upstream_down_queries(self):
+        """local results aren't loaded again one by one after the OpenFarm call"""
+
+        with app.test_client() as client:
+            with client.session_transaction() as change_session:
+                change_session['current_user'] = self.u1.id
+
+            app.config['PLANT_SEARCH_MIN_LOCAL'] = 3
+            counts = []
+            with patch('openfarm.fetch_crops', side_effect=UpstreamUnavailable):
+                # the user snapshot and the extension check are cached after this
+                client.get('/plants/search/plum')
+                for name in ('Plum Tree', 'Plum Jam'):
+                    db.session.add(Plant(name=name))
+                    db.session.commit()
+                    openfarm.crop_cache.clear()
+                    counts.append(self.count_queries(client, '/plants/search/plum'))
+
+            self.assertEqual(counts[0], counts[1])
+
+    def crop(self, name):
+        return {'attributes': {'name': name, 'binomial_name': None, 'description': None,
+                               'sowing_method': None, 'main_image_path': f'/{name}.jpg'}}
+
+    def test_crop_search_filter_is_encoded(self):
+        """'&' and '#' in a search stay in the filter instead of ending it"""
+
+        openfarm.crop_cache.clear()
+
+        with patch('openfarm.client.session.get') as get:
+            get.return_value.status_code = 200
+            get.return_value.json.return_value = {'data': []}
+            with app.test_request_context():
+                openfarm.search_crops('salt & pepper #2')
+
+        url, = get.call_args[0]
+        params = get.call_args[1]['params']
+        self.assertEqual(url, app.config['OPENFARM_URL'])
+        self.assertEqual(params, {'filter': '<salt & pepper #2>'})
+
+    def test_plant_details_added_from_openfarm_once(self):
+        """a new plant is fetched and stored once, later views are local"""
+
+        openfarm.crop_cache.clear()
+        crops = {'data': [self.crop('Plum Tree'), self.crop('Plum')]}
+
+        with app.test_client() as client:
+            with client.session_transaction() as change_session:
+                change_session['current_user'] = self.u1.id
+
+            with patch('openfarm.fetch_crops', return_value=crops) as fetch_crops:
+                for _ in range(2):
+                    resp = client.get('/plants/Plum')
+                    self.assertEqual(resp.status_code, 200)
+                    self.assertIn('/Plum.jpg', resp.get_data(as_text=True))
+
+        fetch_crops.assert_called_once()
+        self.assertEqual(Plant.query.filter_by(name='Plum').count(), 1)
+
+    def test_plant_details_miss_is_remembered(self):
+        """a name OpenFarm has no crop for isn't asked for again until CROP_MISS_TTL passes"""
+
+        with app.test_client() as client:
+            with client.session_transaction() as change_session:
+                change_session['current_user'] = self.u1.id
+
+            with patch('openfarm.fetch_crops', return_value={'data': [self.crop('Plum Tree')]}) as fetch_crops:
+                for _ in range(2):
+                    # drop the search results too, only crop_misses remembers
+                    openfarm.crop_cache.clear()
+                    resp = client.get('/plants/Plum')
+                    self.assertEqual(resp.status_code, 404)
+                fetch_crops.assert_called_once()
+
+                app.config['CROP_MISS_TTL'] = 0
+                openfarm.crop_cache.clear()
+                try:
+                    client.get('/plants/Plum')
+                finally:
+                    app.config['CROP_MISS_TTL'] = 24 * 60 * 60
+
+            self.assertEqual(fetch_crops.call_count, 2)
+            self.assertEqual(Crop_miss.query.count(), 1)
+
+    def test_plant_details_no_connection_held_while_fetching(self):
+        """the database connection goes back to the pool while OpenFarm answers"""
+
+        openfarm.crop_cache.clear()
+        checked_out = []
+
+        def fetch(url, search):
+            checked_out.append(db.engine.pool.checkedout())
+            return {'data': [self.crop('Plum')]}
+
+        with app.test_client() as client:
+            with client.session_transaction() as change_session:
+                change_session['current_user'] = self.u1.id
+
+            with patch('openfarm.fetch_crops', side_effect=fetch):
+                resp = client.get('/plants/Plum')
+
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(checked_out, [0])
+
+    def test_concurrent_plant_details_share_one_fetch(self):
+        """requests for the same new plant at once make one OpenFarm call"""
+
+        openfarm.crop_cache.clear()
+        release = threading.Event()
+        calls = []
+
+        def slow_fetch(url, search):
+            calls.append(search)
+            release.wait(5)
+            return {'data': [self.crop('Plum')]}
+
+        found = []
+
+        def view():
+            with app.test_request_context():
+                found.append(openfarm.find_plant('Plum').name)
+                db.session.remove()
+
+        with patch('openfarm.fetch_crops', side_effect=slow_fetch):
+            threads = [threading.Thread(target=view) for _ in range(5)]
+            for thread in threads:
+                thread.start()
+            for _ in range(100):
+                if openfarm.plant_lookups.shared == 4:
+                    break
+                time.sleep(0.01)
+            release.set()
+            for thread in threads:
+                thread.join()
+
+        openfarm.plant_lookups.shared = 0
+        self.assertEqual(found, ['Plum'] * 5)
+        self.assertEqual(calls, ['plum'])
+        self.assertEqual(Plant.query.filter_by(name='Plum').count(), 1)
+
+    def test_plant_details_upstream_down(self):
+        """when OpenFarm is unavailable a new plant redirects to the (url-encoded) local search"""
+
+        with app.test_client() as client:
+            with client.session_transaction() as change_session:
+                change_session['current_user'] = self.u1.id
+
+            with patch('openfarm.fetch_crops', side_effect=UpstreamUnavailable):
+                resp = client.get('/plants/Plum%20%26%20Pear%3F')
+
+            self.assertEqual(resp.status_code, 302)
+            self.assertEqual(resp.location, 'http://localhost/plants/search/Plum%20%26%20Pear%3F')
+
     def test_delete_plant(self):
         """testing deleting a saved plant"""
 
@@ -205,6 +825,64 @@ class RoutesTestCase(TestCase):
 
             self.assertEqual(len(user.plants), 0)
     
+    # weather tests
+
+    def test_weather_cached_per_location(self):
+        """users sharing a location share one forecast fetch"""
+
+        forecast = {'location': {'name': 'Baltimore', 'region': 'Maryland'},
+                    'current': {'temp_f': 70, 'condition': {'icon': '', 'text': 'Sunny'}},
+                    'forecast': {'forecastday': []}}
+
+        with patch('weather.fetch_forecast', return_value=forecast) as fetch_forecast:
+            # test2 and test3 both live in 'location'
+            for user_id in (self.u2_id, self.u3.id):
+                with app.test_client() as client:
+                    with client.session_transaction() as change_session:
+                        change_session['current_user'] = user_id
+
+                    resp = client.get('/weather')
+                    html = resp.get_data(as_text=True)
+
+                    self.assertEqual(resp.status_code, 200)
+                    self.assertIn('Weather for Baltimore, Maryland', html)
+
+        self.assertEqual(fetch_forecast.call_count, 1)
+
+    def test_weather_invalid_location_cached(self):
+        """an error response is cached like a forecast"""
+
+        with patch('weather.fetch_forecast', return_value={'error': {'code': 1006}}) as fetch_forecast:
+            with app.test_client() as client:
+                with client.session_transaction() as change_session:
+                    change_session['current_user'] = self.u2_id
+
+                client.get('/weather')
+                resp = client.get('/weather')
+
+            self.assertIn('Invalid location', resp.get_data(as_text=True))
+            self.assertEqual(fetch_forecast.call_count, 1)
+
+    def test_weather_api_error_not_cached(self):
+        """weatherapi errors other than an unknown location aren't cached or
+        shown as a bad location"""
+
+        quota = {'error': {'code': 2007, 'message': 'API key has exceeded calls per month quota.'}}
+
+        with patch('weather.client.get_json', return_value=quota) as get_json:
+            with app.test_client() as client:
+                with client.session_transaction() as change_session:
+                    change_session['current_user'] = self.u2_id
+
+                client.get('/weather')
+                resp = client.get('/weather')
+
+            html = resp.get_data(as_text=True)
+            self.assertIn('Weather is unavailable right now', html)
+            self.assertNotIn('Invalid location', html)
+            self.assertEqual(get_json.call_count, 2)
+            self.assertEqual(Forecast.query.filter_by(location='location').count(), 0)
+
     # garden tests
 
     def test_save_inspiration(self):
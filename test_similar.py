@@ -0,0 +1,102 @@
+# run these tests like: python -m unittest test_similar.py
+
+
+import os
+from unittest import TestCase
+
+from models import db, User, Plant, Garden, Lsh_bucket, Garden_signature
+
+os.environ['DATABASE_URL'] = "postgresql:///garden-test"
+os.environ['APP_CONFIG'] = 'test'
+
+from app import app
+from identity import user_cache
+from fragments import fragment_cache
+import similar
+
+
+class MinHashTestCase(TestCase):
+    """unit tests for signatures and buckets"""
+
+    def test_same_plants_same_buckets(self):
+        sig = similar.signature([3, 1, 2])
+
+        self.assertEqual(len(sig), similar.SIGNATURE_SIZE)
+        self.assertEqual(sig, similar.signature([1, 2, 3]))
+        self.assertEqual(similar.band_buckets(sig), similar.band_buckets(similar.signature([2, 3, 1])))
+
+    def test_estimates_jaccard(self):
+        # 50 shared plants out of 100
+        first = similar.signature(range(0, 75))
+        second = similar.signature(range(25, 100))
+
+        self.assertAlmostEqual(similar.estimated_similarity(first, second), 0.5, delta=0.2)
+        self.assertLess(similar.estimated_similarity(first, similar.signature(range(200, 300))), 0.1)
+
+
+class SimilarGardensTestCase(TestCase):
+    """tests for indexing gardens as their plants change"""
+
+    def setUp(self):
+        db.drop_all()
+        db.create_all()
+        user_cache.clear()
+        fragment_cache.clear()
+        similar.similar_cache.clear()
+
+        self.client = app.test_client()
+
+        u1 = User.signup("test1", "test1@test.com", "password", None, 'Baltimore')
+        u1.id = 1111
+        db.session.commit()
+
+        db.session.add_all([Plant(name=f'plant {n}', id=n) for n in range(1, 31)])
+        db.session.add_all([Garden(user_id=1111, username='test1', name='veggies', id=1),
+                            Garden(user_id=1111, username='test1', name='more veggies', id=2),
+                            Garden(user_id=1111, username='test1', name='flowers', id=3)])
+        db.session.commit()
+
+        with self.client.session_transaction() as change_session:
+            change_session['current_user'] = 1111
+
+    def tearDown(self):
+        db.session.rollback()
+
+    def plant(self, garden_id, plant_ids):
+        self.client.post(f'/gardens/{garden_id}/plants', json={'plant_ids': plant_ids})
+
+    def test_similar_gardens(self):
+        self.plant(1, list(range(1, 11)))
+        self.plant(2, list(range(1, 10)) + [11])
+        self.plant(3, list(range(20, 30)))
+
+        self.assertEqual(Lsh_bucket.query.filter_by(garden_id=1).count(), similar.BANDS)
+
+        with app.test_request_context():
+            found = similar.similar_gardens(1)
+        self.assertEqual([garden.id for garden in found], [2])
+        self.assertGreater(found[0].similarity, 0.5)
+
+        resp = self.client.get('/gardens/1')
+        self.assertIn(b'Similar gardens', resp.data)
+        self.assertIn(b'more veggies', resp.data)
+
+    def test_index_follows_removals(self):
+        self.plant(1, [1, 2, 3])
+        self.plant(2, [1, 2, 3])
+        self.client.post('/gardens/2/plants/delete', json={'plant_ids': [1, 2, 3]})
+
+        self.assertEqual(Lsh_bucket.query.filter_by(garden_id=2).count(), 0)
+        self.assertIsNone(Garden_signature.query.get(2))
+        with app.test_request_context():
+            self.assertEqual(similar.similar_gardens(1), [])
+
+    def test_index_all(self):
+        self.plant(1, [1, 2, 3])
+        db.session.execute(db.delete(Lsh_bucket))
+        db.session.commit()
+
+        with app.test_request_context():
+            self.assertEqual(similar.index_all(batch_size=2), 3)
+
+        self.assertEqual(Lsh_bucket.query.count(), similar.BANDS)
@@ -0,0 +1,129 @@
+# run these tests like: python -m unittest test_timeline.py
+
+
+import os
+from unittest import TestCase
+
+from models import db, User, Plant, Garden, Follows, Activity, Timeline_entry
+
+os.environ['DATABASE_URL'] = "postgresql:///garden-test"
+os.environ['APP_CONFIG'] = 'test'
+
+from app import app
+from identity import user_cache
+import timeline
+
+
+class TimelineTestCase(TestCase):
+    """tests for the activity feed"""
+
+    def setUp(self):
+        db.drop_all()
+        db.create_all()
+        user_cache.clear()
+
+        self.client = app.test_client()
+
+        u1 = User.signup("test1", "test1@test.com", "password", None, 'Baltimore')
+        u1.id = 1111
+        u2 = User.signup("test2", "test2@test.com", "password", None, 'location')
+        u2.id = 2222
+        u3 = User.signup("test3", "test3@test.com", "password", None, 'location')
+        u3.id = 3333
+        db.session.commit()
+
+        # test2 follows test1
+        db.session.add_all([Plant(name='Tomato', image='tomato.jpg', id=1),
+                            Plant(name='Basil', id=2),
+                            Follows(user_followed=2222, user_following=1111)])
+        db.session.commit()
+
+    def tearDown(self):
+        db.session.rollback()
+        app.config['FEED_FANOUT_LIMIT'] = 1000
+
+    def login(self, user_id):
+        with self.client.session_transaction() as change_session:
+            change_session['current_user'] = user_id
+
+    def plant_a_garden(self):
+        """test1 makes a garden, plants tomato in it and saves basil"""
+
+        self.login(1111)
+        self.client.post('/gardens', data={'name': 'veggies', 'description': ''})
+        garden_id = db.session.query(Garden.id).filter(Garden.name == 'veggies').scalar()
+        self.client.post('/gardens/%s/plants' % garden_id, json={'plant_ids': [1]})
+        self.client.post('/plants/2/save')
+        return garden_id
+
+    def test_fan_out_on_write(self):
+        garden_id = self.plant_a_garden()
+
+        with app.test_request_context():
+            feed = timeline.feed_page(2222)
+            self.assertEqual([(a.verb, a.garden_id, a.plant_id) for a in feed],
+                             [('saved_plant', None, 2),
+                              ('added_plant', garden_id, 1),
+                              ('created_garden', garden_id, None)])
+            # nobody follows test2 or test3
+            self.assertEqual(len(timeline.feed_page(3333)), 0)
+
+        self.assertEqual(Timeline_entry.query.filter_by(user_id=2222).count(), 3)
+
+        self.login(2222)
+        resp = self.client.get('/feed')
+        self.assertEqual(resp.status_code, 200)
+        self.assertIn(b'veggies', resp.data)
+        self.assertIn(b'Basil', resp.data)
+
+    def test_pull_for_big_accounts(self):
+        """over FEED_FANOUT_LIMIT followers, activities are read from activities, not copied"""
+
+        app.config['FEED_FANOUT_LIMIT'] = 0
+        self.plant_a_garden()
+
+        self.assertEqual(Timeline_entry.query.count(), 0)
+        self.assertFalse(any(fanned_out for fanned_out, in db.session.query(Activity.fanned_out)))
+        self.assertEqual([user_id for user_id, in db.session.query(User.id).filter(User.feed_pulled)],
+                         [1111])
+
+        with app.test_request_context():
+            self.assertEqual([a.verb for a in timeline.feed_page(2222)],
+                             ['saved_plant', 'added_plant', 'created_garden'])
+            self.assertEqual(len(timeline.feed_page(3333)), 0)
+
+            first = timeline.feed_page(2222, per_page=2)
+            second = timeline.feed_page(2222, after=first.next_cursor, per_page=2)
+        self.assertEqual([a.verb for a in second], ['created_garden'])
+        self.assertIsNone(second.next_cursor)
+
+    def test_pages(self):
+        self.plant_a_garden()
+
+        with app.test_request_context():
+            first = timeline.feed_page(2222, per_page=2)
+            second = timeline.feed_page(2222, after=first.next_cursor, per_page=2)
+
+        self.assertEqual([a.verb for a in first], ['saved_plant', 'added_plant'])
+        self.assertEqual([a.verb for a in second], ['created_garden'])
+        self.assertIsNone(second.next_cursor)
+
+    def test_follow_backfills_and_unfollow_forgets(self):
+        self.plant_a_garden()
+
+        self.login(3333)
+        self.client.post('/follows/add/1111')
+        self.assertEqual(Timeline_entry.query.filter_by(user_id=3333).count(), 3)
+
+        self.client.post('/follows/remove/1111')
+        self.assertEqual(Timeline_entry.query.filter_by(user_id=3333).count(), 0)
+
+    def test_api_feed(self):
+        self.plant_a_garden()
+
+        self.login(2222)
+        data = self.client.get('/api/v1/me/feed?limit=1').json
+
+        self.assertEqual(data['data'][0]['verb'], 'saved_plant')
+        self.assertEqual(data['data'][0]['plant_name'], 'Basil')
+        self.assertIsNotNone(data['next'])
@@ -0,0 +1,146 @@
+"""Activity feeds: new gardens, garden plants and saves by the people a user follows
+
+Fan-out on write. publish() stores an activity and, in the same
+transaction, copies its id into the timeline of every follower, so a feed
+page is one range scan of timeline_entries' (user_id, activity_id) primary
+key, however many people the reader follows.
+
+Users with more than FEED_FANOUT_LIMIT followers would make every write
+that many inserts, so their activities are stored with fanned_out=false
+and pulled instead, and the user is marked feed_pulled. Readers find the
+feed_pulled accounts they follow and read a page's worth of each one's
+pulled activities, newest first, from the (actor_id, id) partial index.
+A reader who follows none of them does no work for this side.
+"""
+
+from flask import current_app
+from sqlalchemy.dialects.postgresql import insert
+
+from models import db, Activity, Follows, Garden, Plant, Timeline_entry, User
+from pagination import Page
+
+CREATED_GARDEN = 'created_garden'
+ADDED_PLANT = 'added_plant'
+SAVED_PLANT = 'saved_plant'
+SAVED_GARDEN = 'saved_garden'
+
+
+def init_app(app):
+    """Read feed settings from app config"""
+
+    app.config.setdefault('FEED_FANOUT_LIMIT', 1000)
+    app.config.setdefault('FEED_BACKFILL', 20)
+
+
+def follower_count(user_id, limit):
+    """followers of user_id, counting no further than limit + 1"""
+
+    followers = db.select(Follows.id).where(Follows.user_following == user_id).limit(limit + 1)
+
+    return db.session.execute(db.select(db.func.count()).select_from(followers.subquery())).scalar()
+
+
+def publish(actor_id, verb, garden_id=None, plant_id=None):
+    """record one activity, see publish_all"""
+
+    publish_all(actor_id, verb, [(garden_id, plant_id)])
+
+
+def publish_all(actor_id, verb, items):
+    """record an activity per (garden_id, plant_id) in items and copy them to
+    the actor's followers' timelines. commits with the caller's transaction"""
+
+    if not items:
+        return
+
+    limit = current_app.config['FEED_FANOUT_LIMIT']
+    followers = follower_count(actor_id, limit)
+    fanned_out = followers <= limit
+
+    rows = [{'actor_id': actor_id, 'verb': verb, 'garden_id': garden_id,
+             'plant_id': plant_id, 'fanned_out': fanned_out}
+            for garden_id, plant_id in items]
+    ids = [row.id for row in db.session.execute(insert(Activity).values(rows).returning(Activity.id))]
+
+    if not fanned_out:
+        db.session.execute(db.update(User)
+                           .where(User.id == actor_id, db.not_(User.feed_pulled))
+                           .values(feed_pulled=True)
+                           .execution_options(synchronize_session=False))
+
+    if fanned_out and followers:
+        copies = (db.select(Follows.user_followed, Activity.id, Activity.actor_id)
+                  .join(Activity, Activity.actor_id == Follows.user_following)
+                  .where(Follows.user_following == actor_id, Activity.id.in_(ids)))
+        db.session.execute(insert(Timeline_entry)
+                           .from_select(['user_id', 'activity_id', 'actor_id'], copies)
+                           .on_conflict_do_nothing())
+
+
+def backfill(user_id, actor_id):
+    """copy actor's latest activities into user's timeline when user starts following them"""
+
+    recent = (db.select(db.literal(user_id), Activity.id, Activity.actor_id)
+              .where(Activity.actor_id == actor_id, Activity.fanned_out)
+              .order_by(Activity.id.desc())
+              .limit(current_app.config['FEED_BACKFILL']))
+
+    db.session.execute(insert(Timeline_entry)
+                       .from_select(['user_id', 'activity_id', 'actor_id'], recent)
+                       .on_conflict_do_nothing())
+
+
+def forget(user_id, actor_id):
+    """drop actor's activities from user's timeline when user unfollows them"""
+
+    db.session.execute(db.delete(Timeline_entry)
+                       .where(Timeline_entry.user_id == user_id,
+                              Timeline_entry.actor_id == actor_id))
+
+
+def feed_page(user_id, after=None, per_page=50):
+    """one page of user_id's feed, newest first, as a pagination.Page of rows.
+    pass a page's next_cursor as after for the page after it"""
+
+    pushed = (db.select(Timeline_entry.activity_id.label('id'))
+              .where(Timeline_entry.user_id == user_id))
+
+    # followed accounts whose activities weren't copied to us
+    pulled_from = (db.select(Follows.user_following.label('actor_id'))
+                   .join(User, User.id == Follows.user_following)
+                   .where(Follows.user_followed == user_id, User.feed_pulled)
+                   .subquery())
+    recent = (db.select(Activity.id)
+              .where(Activity.actor_id == pulled_from.c.actor_id, db.not_(Activity.fanned_out)))
+    if after is not None:
+        pushed = pushed.where(Timeline_entry.activity_id < after)
+        recent = recent.where(Activity.id < after)
+    # a page's worth from each of them
+    recent = recent.order_by(Activity.id.desc()).limit(per_page + 1).lateral()
+    pulled = db.select(recent.c.id).select_from(pulled_from).join(recent, db.true())
+
+    # each side stops after a page's worth, newest first
+    ids = db.union_all(pushed.order_by(Timeline_entry.activity_id.desc()).limit(per_page + 1),
+                       pulled.order_by(recent.c.id.desc()).limit(per_page + 1)).subquery()
+
+    items = (db.session
+             .query(Activity.id, Activity.verb, Activity.created_at,
+                    Activity.actor_id, User.username.label('actor_name'),
+                    User.image_url.label('actor_image'),
+                    Activity.garden_id, Garden.name.label('garden_name'),
+                    Activity.plant_id, Plant.name.label('plant_name'),
+                    Plant.image.label('plant_image'))
+             .join(User, User.id == Activity.actor_id)
+             .outerjoin(Garden, Garden.id == Activity.garden_id)
+             .outerjoin(Plant, Plant.id == Activity.plant_id)
+             .filter(Activity.id.in_(db.select(ids.c.id)))
+             .order_by(Activity.id.desc())
+             .limit(per_page + 1)
+             .all())
+
+    next_cursor = None
+    if len(items) > per_page:
+        items = items[:per_page]
+        next_cursor = items[-1].id
+
+    return Page(items, next_cursor)
@@ -0,0 +1,760 @@
+"""The app's pages, registered on the app by create_app"""
+
+from flask import Blueprint, current_app, render_template, request, flash, redirect, session, g, jsonify, make_response, abort, url_for
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import selectinload
+from collections import Counter
+
+from forms import SignupForm, LoginForm, EditUserForm, SearchPlantForm, AddGardenForm, AddPlantToGardenForm
+from models import db, User, Garden, Plant, Garden_plant, Saved_gardens, User_plant, Follows
+from models import add_link, remove_link, add_garden_plant, add_garden_plants, remove_garden_plants, find_plants
+from models import bump_version, bump_versions
+import conditional
+import identity
+import openfarm
+import recommend
+import similar
+import timeline
+import weather
+from http_client import UpstreamUnavailable
+from passwords import HashingBusy
+import search as local_search
+from pagination import paginate
+
+views = Blueprint('views', __name__)
+
+
+# global user variable
+current_user = "current_user"
+# the user's version when they logged in or last edited their profile,
+# part of the key their cached snapshot is found under (see identity)
+profile_version = "profile_version"
+
+
+@views.app_errorhandler(HashingBusy)
+def password_hashing_busy(err):
+    """too many logins/signups at once, ask the user to retry"""
+
+    err = 'The server is busy right now. Please try again in a moment.'
+    return render_template("error.html", err=err), 503, {'Retry-After': '5'}
+
+
+def wants_json():
+    """XHR and JSON callers get a compact response instead of a page"""
+
+    return (request.is_json
+            or request.headers.get('X-Requested-With') == 'XMLHttpRequest'
+            or request.accept_mimetypes.best == 'application/json')
+
+
+# login/logout routes
+@views.before_app_request
+def add_user_to_g():
+    """If user is logged in, add current user to global variable"""
+
+    if current_user in session:
+        g.user = identity.get_current_user(session[current_user], session.get(profile_version))
+
+    else:
+        g.user = None
+
+
+@views.route('/signup', methods=["GET", "POST"])
+def signup():
+    """User signup"""
+
+    form = SignupForm()
+
+    if form.validate_on_submit():
+        try:
+            user = User.signup(
+                username=form.username.data,
+                password=form.password.data,
+                email=form.email.data,
+                location=form.location.data,
+                image_url=form.image_url.data or '/static/7100-1_1.jpg',
+            )
+            db.session.commit()
+
+        except IntegrityError:
+            flash("Username or email already taken", 'danger')
+            return render_template('users/signup.html', form=form)
+
+        # add current user to session
+        session[current_user] = user.id
+
+        return redirect("/")
+
+    else:
+        return render_template('users/signup.html', form=form)
+
+
+@views.route('/login', methods=["GET", "POST"])
+def login():
+    """Handle user login."""
+
+    form = LoginForm()
+
+    if form.validate_on_submit():
+        user = User.authenticate(form.username.data,
+                                 form.password.data)
+
+        if user:
+            # add current user to session
+            session[current_user] = user.id
+            session[profile_version] = user.version
+
+            flash(f"Hello, {user.username}!", "success")
+            return redirect("/")
+
+        flash("Invalid Login Information", 'danger')
+
+    return render_template('home-login.html', form=form)
+
+
+@views.route('/logout')
+def logout():
+    """logout user and remove current_user"""
+
+    if not g.user:
+        flash("Access Unauthorized")
+        return redirect("/")
+
+    # delete user from session
+    del session[current_user]
+    session.pop(profile_version, None)
+
+    flash("You have been logged out")
+    return redirect("/login")
+
+# Homepage
+@views.route('/', methods=['GET', 'POST'])
+def homepage():
+    """homepage:
+            if not logged in: home-login.html
+            if logged in: home.html, a page of plants or gardens
+    """
+    
+    if g.user:
+        if 'home-gardens' in request.form or request.args.get('view') == 'gardens':
+
+            gardens = paginate(Garden.query, Garden.id,
+                               after=request.args.get('after', type=int),
+                               per_page=current_app.config['PAGE_SIZE'])
+            return render_template('home.html', gardens=gardens, view='gardens')
+
+        else:
+            plants = paginate(Plant.query, Plant.id,
+                              after=request.args.get('after', type=int),
+                              per_page=current_app.config['PAGE_SIZE'])
+        return render_template('home.html', plants=plants, view='plants')
+
+    else:
+        form = LoginForm()
+        return render_template('home-login.html', form=form)
+
+@views.route('/search', methods=['POST', 'GET'])
+def searchbar():
+    """handle searchbar for users, plants"""
+
+    search = request.form.get('global-search') or 'none'
+ 
+    if request.form.get('options')== 'Users':
+        return redirect (f'/users/search/{search}')
+
+    if request.form.get('options')== 'Plants':
+        return redirect (f'/plants/search/{search}')
+
+    flash("Search Failed, please try again")
+    redirect('/')
+
+# User Routes including: profile, delete user, edit user
+
+@views.route('/users/profile/edit', methods=["GET", "POST"])
+def update_user():
+    """Update profile for current user"""
+
+    if not g.user:
+        flash("Access Unauthorized")
+        return redirect("/")
+
+    user = g.user.orm
+    form = EditUserForm(obj=user)
+
+    if form.validate_on_submit():
+        if User.authenticate(user.username, form.password.data):
+            user.username = form.username.data
+            user.email = form.email.data
+            user.image_url = form.image_url.data or "/static/unknown-image.webp"
+            user.location = form.location.data
+            bump_version(User, user.id)
+
+            db.session.commit()
+            # snapshots other workers cached are under the old version
+            session[profile_version] = user.version
+            return redirect(f"/users/{user.id}")
+
+        flash("Incorrect password, please try again")
+
+    return render_template('users/edit.html', form=form, user_id=user.id)
+
+
+@views.route('/users/<int:user_id>')
+def user_profile(user_id):
+    """Redirect to any users profile"""
+
+    cached = conditional.not_modified(conditional.profile_versions(user_id))
+    if cached:
+        return cached
+
+    # saved plants and inspirations load in one query each, covers come with the gardens
+    user = (User
+            .query
+            .options(selectinload(User.plants), selectinload(User.gardens))
+            .get_or_404(user_id))
+    gardens = Garden.query.filter(Garden.user_id == user_id).all()
+
+    return render_template("/users/profile.html", user=user, gardens=gardens)
+
+@views.route('/users/search/<search>')
+def search_users(search):
+    """Lists the best matches for search or a page of all users"""
+
+    if search == 'none':
+        users = paginate(User.query, User.id,
+                         after=request.args.get('after', type=int),
+                         per_page=current_app.config['PAGE_SIZE'])
+    else:
+        users = local_search.search_users(search, limit=current_app.config['USER_SEARCH_LIMIT'])
+
+    if g.user:
+        # one query answers every card's follow button
+        g.user.followed_user_ids([user.id for user in users])
+
+    return render_template('users/list-users.html', users=users, search=search)
+
+# Routes for plants
+
+@views.route('/plants')
+def users_plants():
+    """list a users saved plants"""
+
+    suggestions = recommend.suggestions_for_user(g.user.id) if g.user else []
+
+    return render_template("plants/saved-plants.html", suggestions=suggestions)
+
+
+@views.route('/plants/search/<search>', methods = ['GET', 'POST'])
+def search_plants(search):
+    """search for plants, locally first and on OpenFarm only if we have too few"""
+
+    if search == 'none':
+        # alphabetical, names are unique so they work as the cursor
+        plants = paginate(Plant.query, Plant.name,
+                          after=request.args.get('after'),
+                          per_page=current_app.config['PAGE_SIZE'])
+
+        return render_template("plants/search-plants.html", plants=plants, search=search)
+
+    plants = local_search.search_plants(search, limit=current_app.config['PLANT_SEARCH_LIMIT'])
+
+    if len(plants) < current_app.config['PLANT_SEARCH_MIN_LOCAL']:
+        # the cards only read columns loaded above, the plants outlive
+        # the session handing back its connection during the OpenFarm call
+        try:
+            plant_results = openfarm.search_crops(search)
+        except UpstreamUnavailable:
+            # OpenFarm is down, show what we have locally
+            return render_template("plants/search-plants.html", plants=plants, search=search)
+
+        local_names = {plant.name for plant in plants}
+
+        # api results only need what the plant cards show
+        plants += [{'name': result['attributes']['name'],
+                    'image': result['attributes']['main_image_path']}
+                   for result in plant_results['data']
+                   if result['attributes']['name'] not in local_names]
+
+    return render_template("plants/search-plants.html", plants=plants, search=search)
+
+
+@views.route('/plants/<plant_name>')
+def plant_details(plant_name):
+    """show a single plants details"""
+
+    cached = conditional.not_modified(conditional.plant_versions(plant_name))
+    if cached:
+        return cached
+
+    # check if name in local db
+    plant = Plant.query.filter(Plant.name == plant_name).first()
+
+    # If it's not, add it from OpenFarm
+    if plant == None:
+        try:
+            plant = openfarm.find_plant(plant_name)
+        except UpstreamUnavailable:
+            flash("Plant details are unavailable right now, showing similar saved plants")
+            return redirect(url_for('views.search_plants', search=plant_name))
+
+        if plant is None:
+            # OpenFarm has no crop by that name either
+            abort(404)
+
+    form = AddPlantToGardenForm()
+    form.garden.choices = [(g.id, g.name) for g in Garden.query.filter(Garden.user_id==g.user.id)]
+
+    user = User.query.get_or_404(g.user.id)
+    suggestions = recommend.suggestions_for_plant(plant.id)
+
+    return render_template("plants/plant-details.html", plant=plant, user=user, form=form,
+                           suggestions=suggestions)
+
+@views.route('/plants/<int:plant_id>/save', methods=['GET', 'POST'])
+def save_plant(plant_id):
+    """save a plant"""
+
+    if not g.user:
+        flash("Access Unauthorized")
+        return redirect("/")
+
+    try:
+        changed = add_link(User_plant, user_id=g.user.id, plant_id=plant_id)
+        if changed:
+            recommend.record_user_plants(g.user.id, [plant_id], 1)
+            timeline.publish(g.user.id, timeline.SAVED_PLANT, plant_id=plant_id)
+        db.session.commit()
+    except IntegrityError:
+        # no such plant
+        db.session.rollback()
+        abort(404)
+
+    if wants_json():
+        return jsonify(plant_id=plant_id, saved=True, changed=changed)
+
+    return redirect("/plants")
+
+@views.route('/plants/<int:plant_id>/delete', methods=['GET', 'POST'])
+def delete_plant(plant_id):
+    """delete a plant from saved"""
+
+    if not g.user:
+        flash("Access Unauthorized")
+        return redirect("/")
+
+    changed = remove_link(User_plant, user_id=g.user.id, plant_id=plant_id)
+    if changed:
+        recommend.record_user_plants(g.user.id, [plant_id], -1)
+    db.session.commit()
+
+    if wants_json():
+        return jsonify(plant_id=plant_id, saved=False, changed=changed)
+
+    return redirect("/plants")
+
+@views.route('/plants/<int:plant_id>/add-plant', methods=['GET', 'POST'])
+def add_plant_to_garden(plant_id):
+    """add a plant to one of the user's gardens using a dropdown menu"""
+
+    if not g.user:
+        flash("Access Unauthorized")
+        return redirect("/")
+
+    form = AddPlantToGardenForm()
+
+    if form.validate_on_submit():
+
+        garden_id = form.garden.data
+        try:
+            changed = add_garden_plant(g.user.id, garden_id, plant_id)
+            if changed:
+                garden_plants_changed(garden_id, [plant_id], 1)
+                timeline.publish(g.user.id, timeline.ADDED_PLANT, garden_id, plant_id)
+            db.session.commit()
+        except IntegrityError:
+            # no such plant
+            db.session.rollback()
+            abort(404)
+
+        if wants_json():
+            return jsonify(garden_id=garden_id, plant_id=plant_id, changed=changed)
+
+        return redirect(f"/gardens/{garden_id}")
+
+    else:
+        if wants_json():
+            return jsonify(errors=form.errors), 400
+
+        plant = Plant.query.get_or_404(plant_id)
+        return redirect(f'/plants/{plant.name}')
+
+@views.route('/plants/<int:plant_id>/<int:garden_id>/delete-plant', methods=['GET', 'POST'])
+def delete_plant_from_garden(plant_id, garden_id):
+    """delete a plant from a garden"""
+
+    if not g.user:
+        flash("Access Unauthorized")
+        return redirect("/")
+
+    owner = db.session.query(Garden.user_id).filter(Garden.id == garden_id).scalar()
+    if owner is None:
+        abort(404)
+
+    if owner != g.user.id:
+        if wants_json():
+            return jsonify(error="Access unauthorized"), 403
+        flash("Access unauthorized", "danger")
+        return redirect("/")
+
+    removed = remove_garden_plants(garden_id, [plant_id])
+    garden_plants_changed(garden_id, removed, -1)
+    db.session.commit()
+
+    return redirect(f"/gardens/{garden_id}")
+
+def garden_plants_changed(garden_id, plant_ids, delta):
+    """update what is derived from a garden's plants after plant_ids were
+    added (delta=1) or removed (delta=-1)"""
+
+    if plant_ids:
+        recommend.record_garden_plants(garden_id, plant_ids, delta)
+        similar.index_garden(garden_id)
+
+def bulk_plant_items():
+    """("id", id) and ("name", name) items from a JSON body or repeated form fields, in order.
+    None when a JSON body isn't an object or plant_ids or names isn't a list of ids and names"""
+
+    if request.is_json:
+        data = request.get_json(silent=True)
+        if not isinstance(data, dict):
+            return None
+        ids, names = data.get('plant_ids') or [], data.get('names') or []
+        for values in (ids, names):
+            if not isinstance(values, list) or not all(
+                    isinstance(value, (int, str)) and not isinstance(value, bool) for value in values):
+                return None
+    else:
+        ids, names = request.form.getlist('plant_ids'), request.form.getlist('names')
+
+    items = []
+    for plant_id in ids:
+        if isinstance(plant_id, str) and plant_id.isdigit():
+            plant_id = int(plant_id)
+        items.append(('id', plant_id))
+    items.extend(('name', name) for name in names)
+
+    return items
+
+
+def bulk_garden_plants(garden_id, change, changed_status, unchanged_status):
+    """check ownership once, apply `change` to every named plant in one statement
+    and report what happened to each item"""
+
+    if not g.user:
+        flash("Access Unauthorized")
+        return redirect("/")
+
+    owner = db.session.query(Garden.user_id).filter(Garden.id == garden_id).scalar()
+    if owner is None:
+        abort(404)
+
+    if owner != g.user.id:
+        if wants_json():
+            return jsonify(error="Access unauthorized"), 403
+        flash("Access unauthorized", "danger")
+        return redirect("/")
+
+    items = bulk_plant_items()
+    if items is None:
+        if wants_json():
+            return jsonify(error="plant_ids and names must be lists of plant ids and names"), 400
+        flash("plant_ids and names must be lists of plant ids and names", "danger")
+        return redirect(f"/gardens/{garden_id}")
+
+    limit = current_app.config['BULK_PLANTS_MAX']
+    if len(items) > limit:
+        if wants_json():
+            return jsonify(error=f"At most {limit} plants per request"), 400
+        flash(f"At most {limit} plants per request", "danger")
+        return redirect(f"/gardens/{garden_id}")
+
+    found = find_plants([value for kind, value in items if kind == 'id' and isinstance(value, int)],
+                        [value for kind, value in items if kind == 'name' and isinstance(value, str)])
+    lookup = {'id': {plant_id: plant_id for plant_id, name in found},
+              'name': {name: plant_id for plant_id, name in found}}
+
+    try:
+        changed = change(garden_id, {plant_id for plant_id, name in found})
+        db.session.commit()
+    except IntegrityError:
+        # the garden or a plant was deleted underneath us
+        db.session.rollback()
+        abort(404)
+
+    results = []
+    for kind, value in items:
+        plant_id = lookup[kind].get(value) if isinstance(value, (int, str)) else None
+        if plant_id is None:
+            status = 'not_found'
+        elif plant_id in changed:
+            status = changed_status
+        else:
+            status = unchanged_status
+        results.append({'plant': value, 'plant_id': plant_id, 'status': status})
+
+    if wants_json():
+        return jsonify(garden_id=garden_id, results=results)
+
+    counts = Counter(result['status'] for result in results)
+    flash(", ".join(f"{count} {status.replace('_', ' ')}" for status, count in counts.items()))
+    return redirect(f"/gardens/{garden_id}")
+
+# routes for gardens
+
+@views.route('/gardens', methods=['GET', 'POST'])
+def users_gardens():
+    """list a users created gardens and handle adding a new garden"""
+
+    if not g.user:
+        flash("Access Unauthorized")
+        return redirect("/")
+
+    form = AddGardenForm()
+
+    if form.validate_on_submit():
+        name = request.form['name']
+        description = request.form['description']
+        user_id = g.user.id
+
+        garden = Garden(name=name, description=description, user_id=user_id)
+
+        db.session.add(garden)
+        db.session.flush()
+        bump_version(User, user_id)
+        timeline.publish(user_id, timeline.CREATED_GARDEN, garden.id)
+        db.session.commit()
+        gardens = Garden.query.filter(Garden.user_id == g.user.id)
+
+        return redirect("/gardens")
+
+    gardens = Garden.query.filter(Garden.user_id == g.user.id)
+    return render_template("gardens/my-gardens.html", form=form, gardens=gardens)
+
+
+@views.route('/gardens/<int:garden_id>')
+def garden_details(garden_id):
+    """view the details of a garden and its plants"""
+
+    cached = conditional.not_modified(conditional.garden_versions(garden_id))
+    if cached:
+        return cached
+
+    garden = (Garden
+              .query
+              .options(selectinload(Garden.plants))
+              .get_or_404(garden_id))
+    similar_gardens = similar.similar_gardens(garden_id)
+
+    return render_template("gardens/garden-details.html", garden=garden,
+                           similar_gardens=similar_gardens)
+
+@views.route('/gardens/<int:garden_id>/plants', methods=['POST'])
+def add_plants_to_garden(garden_id):
+    """add many plants to a garden at once, by id or name"""
+
+    def add_and_publish(garden_id, plant_ids):
+        added = add_garden_plants(garden_id, plant_ids)
+        garden_plants_changed(garden_id, added, 1)
+        timeline.publish_all(g.user.id, timeline.ADDED_PLANT,
+                             [(garden_id, plant_id) for plant_id in sorted(added)])
+        return added
+
+    return bulk_garden_plants(garden_id, add_and_publish, 'added', 'already_present')
+
+@views.route('/gardens/<int:garden_id>/plants/delete', methods=['POST'])
+def delete_plants_from_garden(garden_id):
+    """remove many plants from a garden at once, by id or name"""
+
+    def remove_and_record(garden_id, plant_ids):
+        removed = remove_garden_plants(garden_id, plant_ids)
+        garden_plants_changed(garden_id, removed, -1)
+        return removed
+
+    return bulk_garden_plants(garden_id, remove_and_record, 'removed', 'not_in_garden')
+
+@views.route('/gardens/<int:garden_id>/delete', methods=["GET", "POST"])
+def delete_garden(garden_id):
+    """delete a users garden"""
+
+    if not g.user:
+        flash("Access Unauthorized")
+        return redirect("/")
+
+    user = Garden.query.get_or_404(garden_id).user_id
+
+    if g.user == None or g.user.id != user:
+        flash("Access unauthorized", "danger")
+        return redirect("/")
+
+    else:
+        garden = Garden.query.get(garden_id)
+        # it leaves the owner's profile and the inspirations of everyone who saved it
+        bump_version(User, user)
+        bump_versions(User, db.select(Saved_gardens.user_saved)
+                                .where(Saved_gardens.garden_id == garden_id))
+        # its plants stop going together
+        recommend.record_garden_plants(garden_id, [plant.id for plant in garden.plants], -1)
+        db.session.delete(garden)
+        db.session.commit()
+    
+    return redirect("/gardens")
+
+@views.route('/gardens/<int:garden_id>/save')
+def save_gardens(garden_id):
+    """save another users garden for later inspiration"""
+
+    if not g.user:
+        flash("Access Unauthorized")
+        return redirect("/")
+
+    try:
+        changed = add_link(Saved_gardens, user_saved=g.user.id, garden_id=garden_id)
+        if changed:
+            timeline.publish(g.user.id, timeline.SAVED_GARDEN, garden_id)
+        db.session.commit()
+    except IntegrityError:
+        # no such garden
+        db.session.rollback()
+        abort(404)
+
+    if wants_json():
+        return jsonify(garden_id=garden_id, saved=True, changed=changed)
+
+    return redirect("/gardens/save/show")
+
+@views.route('/gardens/<int:garden_id>/delete-save')
+def delete_saved_gardens(garden_id):
+    """delete another users garden for later inspiration"""
+
+    if not g.user:
+        flash("Access Unauthorized")
+        return redirect("/")
+
+    changed = remove_link(Saved_gardens, user_saved=g.user.id, garden_id=garden_id)
+    db.session.commit()
+
+    if wants_json():
+        return jsonify(garden_id=garden_id, saved=False, changed=changed)
+
+    return redirect("/gardens/save/show")
+
+@views.route('/gardens/save/show')
+def show_saved_gardens():
+    """shows a list of saved gardens"""
+
+    if not g.user:
+        flash("Access Unauthorized")
+        return redirect("/")
+
+    gardens = (Garden
+               .query
+               .join(Saved_gardens, Saved_gardens.garden_id == Garden.id)
+               .filter(Saved_gardens.user_saved == g.user.id)
+               .order_by(Saved_gardens.id)
+               .all())
+
+    return render_template("gardens/inspirations.html", gardens=gardens)
+
+# follows routes
+
+@views.route('/follows/<int:user_id>')
+def show_follows(user_id):
+    """shows a list of follows a user has"""
+
+    user = User.query.get_or_404(user_id)
+    follows = user.followed_users
+
+    if g.user:
+        g.user.followed_user_ids([follow.id for follow in follows])
+
+    return render_template("/users/list-follows.html", follows=follows, user=user)
+
+@views.route('/feed')
+def show_feed():
+    """what the people the user follows have been planting, newest first"""
+
+    if not g.user:
+        flash("Access Unauthorized")
+        return redirect("/")
+
+    activities = timeline.feed_page(g.user.id,
+                                    after=request.args.get('after', type=int),
+                                    per_page=current_app.config['PAGE_SIZE'])
+
+    return render_template("users/feed.html", activities=activities)
+
+@views.route('/follows/add/<int:user_id>', methods=['POST'])
+def add_follow(user_id):
+    """follow another user"""
+
+    if not g.user:
+        flash("Access Unauthorized")
+        return redirect("/")
+
+    try:
+        changed = add_link(Follows, user_followed=g.user.id, user_following=user_id)
+        if changed:
+            timeline.backfill(g.user.id, user_id)
+        db.session.commit()
+    except IntegrityError:
+        # no such user
+        db.session.rollback()
+        abort(404)
+
+    if wants_json():
+        return jsonify(user_id=user_id, following=True, changed=changed)
+
+    return redirect(f"/follows/{g.user.id}")
+
+@views.route('/follows/remove/<int:user_id>', methods=['POST'])
+def remove_follow(user_id):
+    """unfollow another user"""
+
+    if not g.user:
+        flash("Access Unauthorized")
+        return redirect("/")
+
+    changed = remove_link(Follows, user_followed=g.user.id, user_following=user_id)
+    if changed:
+        timeline.forget(g.user.id, user_id)
+    db.session.commit()
+
+    if wants_json():
+        return jsonify(user_id=user_id, following=False, changed=changed)
+
+    return redirect(f"/follows/{g.user.id}")
+
+# Routes for weather
+
+@views.route('/weather')
+def weather_page():
+    """Show page for weather prediction"""
+
+    if not g.user:
+        flash("Access Unauthorized")
+        return redirect("/")
+
+    try:
+        api_results = weather.get_forecast(g.user.location)
+    except UpstreamUnavailable:
+        err = 'Weather is unavailable right now. Please check back later.'
+        return render_template("weather-err.html", err=err)
+
+    if 'error' in api_results:
+        err = 'Invalid location. Please go to user profile and edit location.'
+        return render_template("weather-err.html", err=err)
+
+    return render_template("weather.html", api_results=api_results)
+
+
+
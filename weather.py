@@ -0,0 +1,115 @@
+"""Client for the weatherapi.com forecast API
+
+Forecasts are cached per location in the forecasts table, so every
+gunicorn worker shares one copy and a location is fetched at most once
+per WEATHER_CACHE_TTL. "No matching location" errors are cached the same
+way; any other weatherapi error (bad key, quota, ...) is treated as the
+API being down, so it is neither stored nor shown as a bad location.
+
+Requests in one worker that miss on the same location share one lookup,
+and workers take turns through models.fetch_once, neither holding a
+database connection while weatherapi answers.
+"""
+
+from datetime import timedelta
+
+from flask import current_app
+from sqlalchemy import func
+from sqlalchemy.dialects.postgresql import insert
+
+from cache import SingleFlight
+from http_client import client, UpstreamUnavailable
+from metrics import cache_lookups
+from models import db, Forecast, fetch_once, release_connection
+
+WEATHER_URL = 'http://api.weatherapi.com/v1/forecast.json'
+WEATHER_API_KEY = '1db06177940b420fa9c140429212707'
+
+# weatherapi's error code for "No matching location found."
+UNKNOWN_LOCATION = 1006
+
+# forecast lookups running in this worker, by location
+forecast_lookups = SingleFlight()
+
+
+def init_app(app):
+    """Read weatherapi settings from app config"""
+
+    app.config.setdefault('WEATHER_URL', WEATHER_URL)
+    app.config.setdefault('WEATHER_API_KEY', WEATHER_API_KEY)
+    app.config.setdefault('WEATHER_CACHE_TTL', 30 * 60)
+
+
+def normalize_location(location):
+    """'  Baltimore ' and 'baltimore' share one cache entry"""
+
+    return ' '.join(location.split()).lower()
+
+
+def fetch_forecast(url, key, location):
+    """call the forecast API directly, bypassing the cache.
+    raises http_client.UpstreamUnavailable when weatherapi.com is down or
+    answers with an error other than an unknown location"""
+
+    params = {'key': key, 'q': location, 'days': 5, 'aqi': 'no', 'alerts': 'no'}
+    payload = client.get_json(url, params=params, upstream='weatherapi')
+
+    error = payload.get('error')
+    if error and error.get('code') != UNKNOWN_LOCATION:
+        raise UpstreamUnavailable(f"weatherapi error {error.get('code')}: {error.get('message')}")
+
+    return payload
+
+
+def cached_forecast(location, ttl):
+    """the cached payload for location if it is younger than ttl seconds"""
+
+    return (db.session
+            .query(Forecast.payload)
+            .filter(Forecast.location == location,
+                    Forecast.fetched_at > func.now() - timedelta(seconds=ttl))
+            .scalar())
+
+
+def get_forecast(location):
+    """5 day forecast for location, fetched at most once per cache window"""
+
+    config = current_app.config
+    location = normalize_location(location)
+
+    payload = cached_forecast(location, config['WEATHER_CACHE_TTL'])
+    if payload is not None:
+        cache_lookups.labels('forecasts', 'hit').inc()
+        return payload
+
+    # don't hold a database connection while waiting on another request's lookup
+    release_connection()
+    return forecast_lookups.do(location, lambda: load_forecast(location, config))
+
+
+def load_forecast(location, config):
+    """the forecast for location from the table, or from weatherapi if no
+    worker has fetched it within the cache window"""
+
+    fetched = []
+
+    def fetch():
+        fetched.append(True)
+        return fetch_forecast(config['WEATHER_URL'], config['WEATHER_API_KEY'], location)
+
+    def store(payload):
+        db.session.execute(insert(Forecast)
+                           .values(location=location, payload=payload)
+                           .on_conflict_do_update(index_elements=[Forecast.location],
+                                                  set_={'payload': payload,
+                                                        'fetched_at': func.now()}))
+        return payload
+
+    payload = fetch_once(f'forecast:{location}',
+                         lambda: cached_forecast(location, config['WEATHER_CACHE_TTL']),
+                         fetch, store, lease=config['FETCH_CLAIM_TTL'])
+
+    # otherwise another worker fetched it while we waited
+    cache_lookups.labels('forecasts', 'miss' if fetched else 'hit').inc()
+
+    return payload